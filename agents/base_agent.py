@@ -3,6 +3,7 @@ Enhanced Agent class with Gemini 2.0 Flash for all agents
 All agents now use Gemini instead of DeepSeek
 """
 import time
+import asyncio
 import numpy
 import json
 import requests
@@ -13,19 +14,31 @@ from pathlib import Path # Added
 from utils.general_utils import Logger
 from utils.database import Database
 from utils.local_llm_client import LocalLLMClient # CORRECTED
-from prompts.general_prompts import get_agent_prompt
+from utils.agent_resources import get_local_llm_client, get_gemini_config, get_model_config
+from utils import http_transport
+from utils.rate_limiter import RateLimitConfig, get_rate_limiter, estimate_tokens
+from utils.stream_parser import IncrementalResponseParser, iter_sse_json
+from utils.latency_tracker import get_latency_tracker
+from utils.circuit_breaker import get_circuit_breakers
+from utils.prompt_budget import PromptBudgetConfig, count_tokens, input_token_budget, fit_prompt
+from utils.llm_cache import LLMResponseCache, ResponseCacheConfig, get_response_cache, is_cacheable_response
+from utils.incremental import (
+    IncrementalConfig, PROMPT_CONTEXT_FIELDS, context_slice, input_fingerprint,
+    context_delta, apply_context_delta, get_output_store
+)
 from utils.tools import ToolKit
 from configs.global_config import MODEL_STRATEGY_CONFIG, GeminiConfig, ModelConfig
 
 import socket
 import threading
+from concurrent.futures import ThreadPoolExecutor, wait as wait_futures, FIRST_COMPLETED
 # from models import ProjectAnalysis, AgentOutput # Removed as ProjectAnalysis is part of context_handler
 from pydantic import ValidationError # Already present
 from utils.models import (
     PlatformRequirements, TechProposal, PlannerOutputModel,
     APIDesignerOutputModel, ArchitectOutputModel, MobileOutputModel
 )
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
 # Import from context_handler
 from utils.context_handler import ProjectContext, AnalysisOutput, TechStack, load_context, save_context
@@ -35,6 +48,10 @@ from utils.validation_utils import validate_tech_stack, get_tech_stack_validatio
 CONTEXT_JSON_FILE = Path("project_context.json")
 
 class Agent:
+    # ProjectContext fields this agent reads; together with its crew inputs, prompt template and
+    # model settings they form the input fingerprint used to skip unchanged agents (utils/incremental.py)
+    INPUT_CONTEXT_FIELDS = PROMPT_CONTEXT_FIELDS
+
     def __init__(self, name, role, logger: Logger, model_type='gemini', db: Database = None):
         self.name = name
         self.role = role
@@ -45,8 +62,8 @@ class Agent:
 
         self.db = db
 
-        self.gemini_config = GeminiConfig()
-        self.model_config = ModelConfig()
+        self.gemini_config = get_gemini_config()
+        self.model_config = get_model_config()
         self.generation_config = GeminiConfig.get_generation_config(name)
 
         self.strategy_config = MODEL_STRATEGY_CONFIG
@@ -57,12 +74,17 @@ class Agent:
 
         self.current_model = self.primary_model_name
 
-        self.local_client = LocalLLMClient(logger=self.logger) # Pass logger
+        self.local_client = get_local_llm_client(self.logger) # One client shared by all agents
+        # Per-agent switch for the persistent response cache (see utils/llm_cache.py)
+        self.use_response_cache = not ResponseCacheConfig.is_bypassed(self.name)
+        self._tools_executed = False # Set when a tool ran during the last call; such responses are not cached
+        self._task_prompt_source = None # (prompt, prompt_context, prefix) of the last _build_task_prompt
+        self.use_incremental = not IncrementalConfig.is_bypassed(self.name)
         
         if not GeminiConfig.validate_api_key():
             self.logger.log(f"Warning: Gemini API key not properly configured for {name}", role, level="WARNING")
 
-    def perform_task(self, project_context: ProjectContext) -> dict:
+    def _build_task_prompt(self, project_context: ProjectContext) -> str:
         analysis_data = {}
         if project_context.analysis:
             analysis_data = project_context.analysis.model_dump()
@@ -104,14 +126,40 @@ class Agent:
         self.logger.log(f"[{self.name}] Constructed prompt_context: {json.dumps(prompt_context, indent=2, default=str)}", self.role)
         self.logger.log(f"[{self.name}] About to call get_agent_prompt.", self.role)
 
-        generated_prompt_str = get_agent_prompt(self.name, prompt_context)
+        from prompts.general_prompts import get_agent_prompt # Prompt templates load with the first prompt built
+        tech_stack_prompt_segment = ""
+        if self.name in ["planner", "architect", "api_designer"]:
+            tech_stack_prompt_segment = get_tech_stack_validation_prompt_segment(project_context) + "\n\n--- Original Prompt Begins ---\n\n"
+
+        if PromptBudgetConfig.ENABLED:
+            generated_prompt_str = self._fit_task_prompt(self.primary_model_name, prompt_context, tech_stack_prompt_segment)
+        else:
+            generated_prompt_str = get_agent_prompt(self.name, prompt_context)
         
         self.logger.log(f"[{self.name}] Returned from get_agent_prompt. Prompt length: {len(generated_prompt_str)}. First 200 chars: {generated_prompt_str[:200]}", self.role)
 
-        if self.name in ["planner", "architect", "api_designer"]:
-            tech_stack_prompt_segment = get_tech_stack_validation_prompt_segment(project_context)
-            generated_prompt_str = tech_stack_prompt_segment + "\n\n--- Original Prompt Begins ---\n\n" + generated_prompt_str
+        if tech_stack_prompt_segment:
+            generated_prompt_str = tech_stack_prompt_segment + generated_prompt_str
             self.logger.log(f"[{self.name}] Prepended tech stack validation prompt segment.", self.role)
+        # Kept so a fallback or hedge model with a smaller window can re-fit the prompt (see _fit_prompt_to_model)
+        self._task_prompt_source = (generated_prompt_str, prompt_context, tech_stack_prompt_segment)
+        return generated_prompt_str
+
+    def _fit_task_prompt(self, model_name: str, prompt_context: Dict[str, Any], prefix: str = "") -> str:
+        """The agent prompt for prompt_context, with low-priority sections trimmed to fit model_name's budget (prefix excluded)"""
+        from prompts.general_prompts import get_agent_prompt
+        budget = input_token_budget(model_name, self.name) - count_tokens(prefix)
+        prompt, trimmed = fit_prompt(lambda context: get_agent_prompt(self.name, context), prompt_context, budget)
+        if trimmed:
+            self.logger.log(f"[{self.name}] Prompt over the {budget}-token budget for {model_name}; trimmed sections (tokens): {trimmed}", self.role, level="WARNING")
+        return prompt
+
+    def perform_task(self, project_context: ProjectContext) -> dict:
+        store, fingerprint, recorded = self._incremental_lookup(project_context)
+        if recorded is not None:
+            return recorded
+        context_before = project_context.model_dump(mode="json") if store else None
+        generated_prompt_str = self._build_task_prompt(project_context)
 
         self.logger.log(f"[{self.name}] Starting task with {self.current_model}", self.role)
         start = time.time()
@@ -125,15 +173,315 @@ class Agent:
         self.logger.log(f"[{self.name}] Completed in {duration:.2f}s", self.role)
 
         parsed_result = self._parse_response(response_content, project_context)
-        self.add_to_memory(response_content)
+        self.add_to_memory(response_content, project=project_context.project_name)
+        self._incremental_store(store, fingerprint, context_before, project_context, parsed_result)
+        return parsed_result
+
+    async def aperform_task(self, project_context: ProjectContext) -> dict:
+        """Async perform_task: the model call awaits instead of blocking the event loop."""
+        store, fingerprint, recorded = self._incremental_lookup(project_context)
+        if recorded is not None:
+            return recorded
+        context_before = project_context.model_dump(mode="json") if store else None
+        generated_prompt_str = self._build_task_prompt(project_context)
+
+        self.logger.log(f"[{self.name}] Starting async task with {self.current_model}", self.role)
+        start = time.time()
+
+        if self.tools:
+            response_content = await self._acall_model_with_tools(generated_prompt_str)
+        else:
+            response_content = await self._acall_model(generated_prompt_str)
+
+        duration = time.time() - start
+        self.logger.log(f"[{self.name}] Completed in {duration:.2f}s", self.role)
+
+        parsed_result = self._parse_response(response_content, project_context)
+        self.add_to_memory(response_content, project=project_context.project_name)
+        self._incremental_store(store, fingerprint, context_before, project_context, parsed_result)
         return parsed_result
 
+    def _input_fingerprint(self, project_context: ProjectContext, crew_inputs: Optional[Dict[str, Any]] = None) -> str:
+        from prompts.general_prompts import AGENT_PROMPTS
+        model_settings = {
+            "model": self.primary_model_name,
+            "generationConfig": self.generation_config,
+            "tools": self.tools,
+        }
+        return input_fingerprint(
+            self.name, context_slice(project_context, self.INPUT_CONTEXT_FIELDS), crew_inputs,
+            AGENT_PROMPTS.get(self.name), model_settings
+        )
+
+    def _incremental_lookup(self, project_context: ProjectContext, crew_inputs: Optional[Dict[str, Any]] = None):
+        """Return (store, fingerprint, recorded_result). A recorded result means the inputs are unchanged since
+        it was produced: its ProjectContext changes are replayed and the agent doesn't need to run."""
+        store = get_output_store() if self.use_incremental else None
+        if store is None:
+            return None, None, None
+        fingerprint = self._input_fingerprint(project_context, crew_inputs)
+        recorded = store.get(fingerprint)
+        if recorded is None:
+            return store, fingerprint, None
+        apply_context_delta(project_context, recorded["context_delta"])
+        self.logger.log(f"[{self.name}] Inputs unchanged (fingerprint {fingerprint[:12]}); reusing the recorded output", self.role)
+        return store, fingerprint, recorded["result"]
+
+    def _incremental_store(self, store, fingerprint: str, context_before: Optional[Dict[str, Any]],
+                           project_context: ProjectContext, result: dict):
+        """Record a successful output. Results that ran tools (side effects) or came from a fallback model are not kept."""
+        if store is None or self._tools_executed or self.current_model != self.primary_model_name:
+            return
+        if not isinstance(result, dict) or result.get("status") != "complete":
+            return
+        store.put(fingerprint, self.name, result, context_delta(context_before, project_context.model_dump(mode="json")))
+
     def reserve_port(self, port: int = 0) -> int:
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
             s.bind(('', port))
             return s.getsockname()[1]
 
+    def _response_cache_key(self, model_name: str, prompt: str, uses_tools: bool, contents: Optional[List[Dict[str, Any]]] = None) -> str:
+        return LLMResponseCache.make_key(
+            model_name, self.generation_config, GeminiConfig.SAFETY_SETTINGS,
+            self.tools if uses_tools else None, prompt, contents
+        )
+
+    def _cache_lookup(self, model_name: str, prompt: str, uses_tools: bool, contents: Optional[List[Dict[str, Any]]] = None):
+        """Return (cache, key, cached_response); cache is None when caching is off for this agent."""
+        cache = get_response_cache() if self.use_response_cache else None
+        if cache is None:
+            return None, None, None
+        key = self._response_cache_key(model_name, prompt, uses_tools, contents)
+        cached = cache.get(key)
+        if cached is not None:
+            self.logger.log(f"[{self.name}] Response cache hit for {model_name}", self.role)
+        return cache, key, cached
+
+    def _cache_store(self, cache, key: str, model_name: str, response: str):
+        if cache is not None and not self._tools_executed and is_cacheable_response(response):
+            cache.put(key, model_name, response)
+
+    def _fit_prompt_to_model(self, model_name: str, prompt: str, contents: Optional[List[Dict[str, Any]]] = None) -> Tuple[str, Optional[str]]:
+        """(prompt to send, error). A task prompt over model_name's budget (e.g. on fallback to a local model)
+        is re-fitted to that budget; the error is set only if the request still can't fit, so it fails before sending."""
+        if not PromptBudgetConfig.ENABLED:
+            return prompt, None
+        tokens = count_tokens(json.dumps(contents, default=str)) if contents else count_tokens(prompt)
+        budget = input_token_budget(model_name, self.name)
+        if tokens <= budget:
+            return prompt, None
+        source = self._task_prompt_source
+        if not contents and source is not None and source[0] == prompt:
+            _, prompt_context, prefix = source
+            refitted = prefix + self._fit_task_prompt(model_name, prompt_context, prefix)
+            if count_tokens(refitted) <= budget:
+                return refitted, None
+            tokens = count_tokens(refitted)
+        self.logger.log(f"[{self.name}] Prompt of ~{tokens} tokens exceeds the {budget}-token input budget of {model_name}; not sending", self.role, level="ERROR")
+        return prompt, f"Error: Prompt of ~{tokens} tokens exceeds the {budget}-token input budget of {model_name}"
+
     def _invoke_model(self, model_name: str, prompt: str, uses_tools: bool, contents: Optional[List[Dict[str, Any]]] = None) -> str:
+        prompt, budget_error = self._fit_prompt_to_model(model_name, prompt, contents)
+        if budget_error:
+            return budget_error
+        cache, key, cached = self._cache_lookup(model_name, prompt, uses_tools, contents)
+        if cached is not None:
+            self.current_model = model_name
+            return cached
+        self._tools_executed = False
+        start = time.time()
+        try:
+            response = self._invoke_model_uncached(model_name, prompt, uses_tools, contents=contents)
+        except Exception as e:
+            self._record_health(model_name, e)
+            raise
+        self._record_health(model_name, response)
+        self._record_latency(model_name, time.time() - start, response)
+        self._cache_store(cache, key, model_name, response)
+        return response
+
+    async def _ainvoke_model(self, model_name: str, prompt: str, uses_tools: bool, contents: Optional[List[Dict[str, Any]]] = None) -> str:
+        prompt, budget_error = self._fit_prompt_to_model(model_name, prompt, contents)
+        if budget_error:
+            return budget_error
+        cache, key, cached = self._cache_lookup(model_name, prompt, uses_tools, contents)
+        if cached is not None:
+            self.current_model = model_name
+            return cached
+        self._tools_executed = False
+        start = time.time()
+        try:
+            response = await self._ainvoke_model_uncached(model_name, prompt, uses_tools, contents=contents)
+        except Exception as e:
+            self._record_health(model_name, e)
+            raise
+        self._record_health(model_name, response)
+        self._record_latency(model_name, time.time() - start, response)
+        self._cache_store(cache, key, model_name, response)
+        return response
+
+    def _breaker_key(self, model_name: str) -> str:
+        # Local models are tracked per endpoint, since several names can share one server
+        return self.strategy_config.LOCAL_MODEL_ENDPOINTS.get(model_name, model_name)
+
+    def _record_health(self, model_name: str, outcome):
+        """Feed a call outcome (response text or exception) to the model's circuit breaker.
+        Only availability problems count as failures; safety blocks and bad output don't."""
+        breaker = get_circuit_breakers().get(self._breaker_key(model_name))
+        text = str(outcome)
+        if model_name in self.strategy_config.LOCAL_MODEL_ENDPOINTS:
+            unhealthy = text.startswith("Error:")
+        else:
+            unhealthy = isinstance(outcome, Exception) and (self._is_network_or_overload_error(outcome) or text.startswith("HTTP 5"))
+        if unhealthy:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    def _is_model_available(self, model_name: str) -> bool:
+        return get_circuit_breakers().get(self._breaker_key(model_name)).is_available()
+
+    def _route_model(self, primary_model: str) -> str:
+        """Pick the first model whose breaker lets a call through: the primary, then the local
+        fallback, then the rest of ModelConfig.FALLBACK_ORDER. Falls back to the primary when
+        every breaker is open."""
+        candidates = [primary_model]
+        if self.strategy_config.ENABLE_LOCAL_FALLBACK:
+            candidates.append(self.strategy_config.LOCAL_FALLBACK_MODEL_NAME)
+        candidates += [m for m in self.model_config.FALLBACK_ORDER
+                       if m.startswith("gemini-") or m in self.strategy_config.LOCAL_MODEL_ENDPOINTS]
+        breakers = get_circuit_breakers()
+        seen = set()
+        for model_name in candidates:
+            if model_name in seen:
+                continue
+            seen.add(model_name)
+            if breakers.get(self._breaker_key(model_name)).allow_request():
+                if model_name != primary_model:
+                    self.logger.log(f"[{self.name}] Circuit open for {primary_model}; routing to {model_name}", self.role, level="WARNING")
+                return model_name
+        self.logger.log(f"[{self.name}] All model circuits are open; trying {primary_model} anyway", self.role, level="WARNING")
+        return primary_model
+
+    def _record_latency(self, model_name: str, seconds: float, response: str):
+        if not self._is_failed_response(response):
+            get_latency_tracker().record(f"{self.name}:{model_name}", seconds)
+
+    def _hedge_delay(self, uses_tools: bool) -> Optional[float]:
+        """Seconds to give the primary before racing the local fallback, or None if this call can't be hedged.
+        Tool turns are never hedged because tools have side effects."""
+        strategy = self.strategy_config
+        if not strategy.ENABLE_HEDGED_REQUESTS or uses_tools or not self.current_model.startswith("gemini-") \
+                or strategy.LOCAL_FALLBACK_MODEL_NAME not in strategy.LOCAL_MODEL_ENDPOINTS \
+                or not self._is_model_available(strategy.LOCAL_FALLBACK_MODEL_NAME):
+            return None
+        tracker = get_latency_tracker()
+        key = f"{self.name}:{self.current_model}"
+        if tracker.count(key) < strategy.HEDGE_MIN_SAMPLES:
+            return strategy.HEDGE_DEFAULT_DELAY_SECONDS
+        return max(strategy.HEDGE_MIN_DELAY_SECONDS, tracker.percentile(key, strategy.HEDGE_LATENCY_PERCENTILE))
+
+    def _invoke_hedge(self, prompt: str) -> str:
+        # Goes straight to the local client so the in-flight primary's current_model is left alone
+        model_name = self.strategy_config.LOCAL_FALLBACK_MODEL_NAME
+        prompt, budget_error = self._fit_prompt_to_model(model_name, prompt)
+        if budget_error:
+            return budget_error
+        response = self.local_client.generate(
+            base_api_url=self.strategy_config.LOCAL_MODEL_ENDPOINTS[model_name], prompt=prompt, model_name=model_name
+        )
+        self._record_health(model_name, response)
+        return response
+
+    async def _ainvoke_hedge(self, prompt: str) -> str:
+        model_name = self.strategy_config.LOCAL_FALLBACK_MODEL_NAME
+        prompt, budget_error = self._fit_prompt_to_model(model_name, prompt)
+        if budget_error:
+            return budget_error
+        response = await self.local_client.agenerate(
+            base_api_url=self.strategy_config.LOCAL_MODEL_ENDPOINTS[model_name], prompt=prompt, model_name=model_name
+        )
+        self._record_health(model_name, response)
+        return response
+
+    def _invoke_primary(self, prompt: str, uses_tools: bool, contents: Optional[List[Dict[str, Any]]] = None) -> str:
+        """_invoke_model on the primary model, hedged with the local fallback when enabled."""
+        delay = self._hedge_delay(uses_tools)
+        if delay is None:
+            return self._invoke_model(self.current_model, prompt, uses_tools, contents=contents)
+
+        primary_model = self.current_model
+        hedge_model = self.strategy_config.LOCAL_FALLBACK_MODEL_NAME
+        executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix=f"{self.name}-hedge")
+        try:
+            primary = executor.submit(self._invoke_model, primary_model, prompt, uses_tools, contents)
+            done, _ = wait_futures([primary], timeout=delay)
+            if done:
+                return primary.result()
+
+            self.logger.log(f"[{self.name}] {primary_model} has not answered after {delay:.1f}s; hedging with {hedge_model}", self.role)
+            hedge = executor.submit(self._invoke_hedge, prompt)
+            pending = {primary: primary_model, hedge: hedge_model}
+            while pending:
+                done, _ = wait_futures(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    model_name = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        self.logger.log(f"[{self.name}] Hedged call to {model_name} failed: {e}", self.role, level="WARNING")
+                        continue
+                    if self._is_failed_response(result):
+                        continue
+                    # The loser's HTTP call can't be interrupted from here; its result is discarded
+                    for other in pending:
+                        other.cancel()
+                    self.current_model = model_name
+                    self.logger.log(f"[{self.name}] Hedged request won by {model_name}", self.role)
+                    return result
+            # Both failed: surface the primary's outcome so the normal fallback handling applies
+            self.current_model = primary_model
+            return primary.result()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _ainvoke_primary(self, prompt: str, uses_tools: bool, contents: Optional[List[Dict[str, Any]]] = None) -> str:
+        """Async _invoke_primary; the losing request is cancelled outright."""
+        delay = self._hedge_delay(uses_tools)
+        if delay is None:
+            return await self._ainvoke_model(self.current_model, prompt, uses_tools, contents=contents)
+
+        primary_model = self.current_model
+        hedge_model = self.strategy_config.LOCAL_FALLBACK_MODEL_NAME
+        primary = asyncio.ensure_future(self._ainvoke_model(primary_model, prompt, uses_tools, contents=contents))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        self.logger.log(f"[{self.name}] {primary_model} has not answered after {delay:.1f}s; hedging with {hedge_model}", self.role)
+        hedge = asyncio.ensure_future(self._ainvoke_hedge(prompt))
+        pending = {primary: primary_model, hedge: hedge_model}
+        try:
+            while pending:
+                done, _ = await asyncio.wait(set(pending), return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    model_name = pending.pop(task)
+                    if task.exception() is not None:
+                        self.logger.log(f"[{self.name}] Hedged call to {model_name} failed: {task.exception()}", self.role, level="WARNING")
+                        continue
+                    if self._is_failed_response(task.result()):
+                        continue
+                    self.current_model = model_name
+                    self.logger.log(f"[{self.name}] Hedged request won by {model_name}", self.role)
+                    return task.result()
+            self.current_model = primary_model
+            return primary.result()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _invoke_model_uncached(self, model_name: str, prompt: str, uses_tools: bool, contents: Optional[List[Dict[str, Any]]] = None) -> str:
         self.logger.log(f"[{self.name}] Invoking model: {model_name}", self.role)
         self.current_model = model_name
 
@@ -144,6 +492,8 @@ class Agent:
                 # This logic might need refinement based on how conversation history is managed by the caller.
                 # For now, assuming 'perform_task' doesn't manage this level of history for _call_gemini_with_tools.
                 return self._call_gemini_with_tools(prompt, contents=contents)
+            elif self.strategy_config.ENABLE_STREAMING:
+                return self._call_gemini_stream(prompt)
             else:
                 return self._call_gemini(prompt) # _call_gemini typically doesn't need prior contents for simple generation
         elif model_name in self.strategy_config.LOCAL_MODEL_ENDPOINTS:
@@ -152,21 +502,53 @@ class Agent:
                 self.logger.log(f"[{self.name}] Tool use with local model {model_name} requested but not yet implemented. Falling back to text generation.", self.role, level="WARNING")
                 return self.local_client.generate(base_api_url=endpoint_url, prompt=prompt, model_name=model_name)
             else:
-                return self.local_client.generate(base_api_url=endpoint_url, prompt=prompt, model_name=model_name)
+                return self.local_client.generate(
+                    base_api_url=endpoint_url, prompt=prompt, model_name=model_name,
+                    stream=self.strategy_config.ENABLE_STREAMING, early_stop=self.strategy_config.STREAM_EARLY_STOP
+                )
+        else:
+            self.logger.log(f"[{self.name}] Unknown model_name: {model_name}. Cannot invoke.", self.role, level="ERROR")
+            return f"Error: Unknown model_name {model_name}"
+
+    async def _ainvoke_model_uncached(self, model_name: str, prompt: str, uses_tools: bool, contents: Optional[List[Dict[str, Any]]] = None) -> str:
+        self.logger.log(f"[{self.name}] Invoking model (async): {model_name}", self.role)
+        self.current_model = model_name
+
+        if model_name.startswith("gemini-"):
+            if uses_tools:
+                return await self._acall_gemini_with_tools(prompt, contents=contents)
+            return await self._acall_gemini(prompt)
+        elif model_name in self.strategy_config.LOCAL_MODEL_ENDPOINTS:
+            endpoint_url = self.strategy_config.LOCAL_MODEL_ENDPOINTS[model_name]
+            if uses_tools:
+                self.logger.log(f"[{self.name}] Tool use with local model {model_name} requested but not yet implemented. Falling back to text generation.", self.role, level="WARNING")
+            return await self.local_client.agenerate(base_api_url=endpoint_url, prompt=prompt, model_name=model_name)
         else:
             self.logger.log(f"[{self.name}] Unknown model_name: {model_name}. Cannot invoke.", self.role, level="ERROR")
             return f"Error: Unknown model_name {model_name}"
 
+    @staticmethod
+    def _is_failed_response(response: str) -> bool:
+        return response.startswith("Error:") or "Rate limit exceeded" in response or "overloaded" in response or "503" in response
+
+    @staticmethod
+    def _is_network_or_overload_error(error: Exception) -> bool:
+        return "Rate limit exceeded" in str(error) or \
+               "overloaded" in str(error) or \
+               "503" in str(error) or \
+               "ConnectionError" in str(error) or \
+               "Request failed" in str(error)
+
     def _execute_task_with_retry_and_fallback(self, prompt: str, uses_tools: bool, contents: Optional[List[Dict[str, Any]]] = None) -> str:
-        primary_model_to_try = self.primary_model_name
+        primary_model_to_try = self._route_model(self.primary_model_name)
         self.current_model = primary_model_to_try
 
         try:
             self.logger.log(f"[{self.name}] Primary attempt with {self.current_model}", self.role)
             # Pass contents down to _invoke_model
-            response = self._invoke_model(self.current_model, prompt, uses_tools, contents=contents)
+            response = self._invoke_primary(prompt, uses_tools, contents=contents)
 
-            if response.startswith("Error:") or "Rate limit exceeded" in response or "overloaded" in response or "503" in response:
+            if self._is_failed_response(response):
                 raise Exception(response)
 
             return response
@@ -174,13 +556,9 @@ class Agent:
             self.logger.log(f"[{self.name}] Primary attempt with {self.current_model} failed: {e}", self.role, level="WARNING")
 
             if self.strategy_config.ENABLE_LOCAL_FALLBACK and self.current_model.startswith("gemini-"):
-                is_network_or_overload_error = "Rate limit exceeded" in str(e) or \
-                                                "overloaded" in str(e) or \
-                                                "503" in str(e) or \
-                                                "ConnectionError" in str(e) or \
-                                                "Request failed" in str(e)
-
-                if is_network_or_overload_error:
+                if self._is_network_or_overload_error(e) and not self._is_model_available(self.strategy_config.LOCAL_FALLBACK_MODEL_NAME):
+                    return f"Error: Primary model failed ({e}) and local fallback {self.strategy_config.LOCAL_FALLBACK_MODEL_NAME} is unavailable (circuit open)"
+                if self._is_network_or_overload_error(e):
                     self.logger.log(f"[{self.name}] Attempting fallback to local model {self.strategy_config.LOCAL_FALLBACK_MODEL_NAME}", self.role)
                     self.current_model = self.strategy_config.LOCAL_FALLBACK_MODEL_NAME
                     try:
@@ -193,12 +571,44 @@ class Agent:
             else:
                 return f"Error: Primary model {self.primary_model_name} failed: {e}"
 
+    async def _aexecute_task_with_retry_and_fallback(self, prompt: str, uses_tools: bool, contents: Optional[List[Dict[str, Any]]] = None) -> str:
+        self.current_model = self._route_model(self.primary_model_name)
+
+        try:
+            self.logger.log(f"[{self.name}] Primary attempt (async) with {self.current_model}", self.role)
+            response = await self._ainvoke_primary(prompt, uses_tools, contents=contents)
+
+            if self._is_failed_response(response):
+                raise Exception(response)
+
+            return response
+        except Exception as e:
+            self.logger.log(f"[{self.name}] Primary attempt with {self.current_model} failed: {e}", self.role, level="WARNING")
+
+            if self.strategy_config.ENABLE_LOCAL_FALLBACK and self.current_model.startswith("gemini-") and self._is_network_or_overload_error(e):
+                if not self._is_model_available(self.strategy_config.LOCAL_FALLBACK_MODEL_NAME):
+                    return f"Error: Primary model failed ({e}) and local fallback {self.strategy_config.LOCAL_FALLBACK_MODEL_NAME} is unavailable (circuit open)"
+                self.logger.log(f"[{self.name}] Attempting fallback to local model {self.strategy_config.LOCAL_FALLBACK_MODEL_NAME}", self.role)
+                self.current_model = self.strategy_config.LOCAL_FALLBACK_MODEL_NAME
+                try:
+                    return await self._ainvoke_model(self.current_model, prompt, uses_tools)
+                except Exception as fallback_e:
+                    self.logger.log(f"[{self.name}] Local fallback attempt with {self.current_model} also failed: {fallback_e}", self.role, level="ERROR")
+                    return f"Error: Primary model failed ({e}) and local fallback also failed ({fallback_e})"
+            return f"Error: Primary model {self.primary_model_name} failed: {e}"
+
     def _call_model(self, prompt: str) -> str:
         return self._execute_task_with_retry_and_fallback(prompt, uses_tools=False)
 
     def _call_model_with_tools(self, prompt: str) -> str:
         return self._execute_task_with_retry_and_fallback(prompt, uses_tools=True)
 
+    async def _acall_model(self, prompt: str) -> str:
+        return await self._aexecute_task_with_retry_and_fallback(prompt, uses_tools=False)
+
+    async def _acall_model_with_tools(self, prompt: str) -> str:
+        return await self._aexecute_task_with_retry_and_fallback(prompt, uses_tools=True)
+
     def _call_gemini_with_retry(self, prompt: str, max_retries: int = 2) -> str:
         for attempt in range(max_retries + 1):
             try:
@@ -215,6 +625,22 @@ class Agent:
                     return f"Error: All Gemini model attempts failed: {str(e)}"
         return f"Error: All Gemini model attempts failed (exhausted retries)." # Should be unreachable due to else above
 
+    async def _acall_gemini_with_retry(self, prompt: str, max_retries: int = 2) -> str:
+        for attempt in range(max_retries + 1):
+            try:
+                return await self._acall_gemini(prompt)
+            except Exception as e:
+                self.logger.log(f"[{self.name}] Attempt {attempt + 1} failed: {e}", self.role, level="WARNING")
+
+                if attempt < max_retries:
+                    old_model = self.current_model
+                    self.current_model = self.model_config.get_fallback_model(self.current_model)
+                    self.logger.log(f"[{self.name}] Falling back from {old_model} to {self.current_model}", self.role)
+                    await asyncio.sleep(1)
+                else:
+                    return f"Error: All Gemini model attempts failed: {str(e)}"
+        return f"Error: All Gemini model attempts failed (exhausted retries)."
+
     def _call_gemini_with_tools_retry(self, prompt: str, max_retries: int = 2) -> str:
         for attempt in range(max_retries + 1):
             try:
@@ -231,211 +657,372 @@ class Agent:
                     return f"Error: All Gemini tool attempts failed: {str(e)}"
         return f"Error: All Gemini tool attempts failed (exhausted retries)." # Should be unreachable
 
-    def _call_gemini(self, prompt: str) -> str:
+    def _estimate_request_tokens(self, payload: Dict[str, Any]) -> int:
+        """Prompt plus the output budget, reserved from the model's TPM bucket up front."""
+        return estimate_tokens(json.dumps(payload.get('contents', []))) + int(self.generation_config.get('maxOutputTokens', 0))
+
+    def _should_retry_throttled(self, response, attempt: int) -> bool:
+        """On 429/503 tell the shared limiter (so other agents back off too) and decide
+        whether to wait it out here or let the caller fall back."""
+        if response.status_code not in (429, 503):
+            return False
+        delay = get_rate_limiter().report_throttle(self.current_model, response, attempt)
+        if attempt < RateLimitConfig.MAX_THROTTLE_RETRIES and delay <= RateLimitConfig.MAX_INLINE_WAIT_SECONDS:
+            self.logger.log(f"[{self.name}] {self.current_model} throttled (HTTP {response.status_code}); retrying after {delay:.1f}s", self.role, level="WARNING")
+            return True
+        return False
+
+    def _gemini_request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """POST one generateContent request for the current model and return the decoded body."""
         url = f"{GeminiConfig.BASE_URL}/{self.current_model}:generateContent"
-        payload = {
-            'contents': [{'parts': [{'text': prompt}]}],
-            'generationConfig': self.generation_config,
-            'safetySettings': GeminiConfig.SAFETY_SETTINGS
-        }
         headers = {'Content-Type': 'application/json'}
-        
-        try:
-            response = requests.post(
-                url, params={'key': GeminiConfig.API_KEY}, headers=headers, json=payload, timeout=90
+        limiter = get_rate_limiter()
+        estimated_tokens = self._estimate_request_tokens(payload)
+        attempt = 0
+        while True:
+            limiter.acquire(self.current_model, estimated_tokens)
+            response = http_transport.post(
+                url, params={'key': GeminiConfig.API_KEY}, headers=headers, json=payload, timeout=GeminiConfig.TIMEOUT
             )
+            if self._should_retry_throttled(response, attempt):
+                attempt += 1
+                continue
             response.raise_for_status()
             data = response.json()
-            
-            if 'usageMetadata' in data:
-                usage = data['usageMetadata']
-                self.logger.log(f"[{self.name}] Tokens: {usage.get('totalTokenCount', 0)} "
-                              f"(prompt: {usage.get('promptTokenCount', 0)}, "
-                              f"response: {usage.get('candidatesTokenCount', 0)})", self.role)
-            
-            candidates = data.get('candidates', [])
-            if candidates and 'content' in candidates[0]:
-                parts = candidates[0]['content'].get('parts', [])
-                if parts and 'text' in parts[0]:
-                    response_text = parts[0]['text'].strip()
-                    finish_reason = candidates[0].get('finishReason', 'UNKNOWN')
-                    if finish_reason != 'STOP':
-                        self.logger.log(f"[{self.name}] Finish reason: {finish_reason}", self.role, level="WARNING")
-                    return response_text
-            
-            if candidates and candidates[0].get('finishReason') == 'SAFETY':
-                return "Response blocked by safety filters. Please rephrase your request."
-            
-            self.logger.log(f"[{self.name}] Empty response from {self.current_model}", self.role, level="WARNING")
-            return "No response generated"
-            
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 429: raise Exception(f"Rate limit exceeded for {self.current_model}")
-            elif e.response.status_code == 403: raise Exception(f"API key invalid or quota exceeded for {self.current_model}")
-            else: raise Exception(f"HTTP {e.response.status_code}: {e.response.text}")
-        except requests.exceptions.RequestException as e: raise Exception(f"Request failed for {self.current_model}: {str(e)}")
-        except Exception as e: raise Exception(f"Processing error for {self.current_model}: {str(e)}")
+            limiter.record_usage(self.current_model, estimated_tokens, data.get('usageMetadata', {}).get('totalTokenCount'))
+            return data
 
-    def _call_gemini_with_tools(self, prompt: str, contents: Optional[List[Dict[str, Any]]] = None) -> str:
+    async def _agemini_request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         url = f"{GeminiConfig.BASE_URL}/{self.current_model}:generateContent"
+        headers = {'Content-Type': 'application/json'}
+        limiter = get_rate_limiter()
+        estimated_tokens = self._estimate_request_tokens(payload)
+        attempt = 0
+        while True:
+            await limiter.aacquire(self.current_model, estimated_tokens)
+            response = await http_transport.apost(
+                url, params={'key': GeminiConfig.API_KEY}, headers=headers, json=payload, timeout=GeminiConfig.TIMEOUT
+            )
+            if self._should_retry_throttled(response, attempt):
+                attempt += 1
+                continue
+            response.raise_for_status()
+            data = response.json()
+            limiter.record_usage(self.current_model, estimated_tokens, data.get('usageMetadata', {}).get('totalTokenCount'))
+            return data
 
-        if contents is None:
-            current_contents = [{'role': 'user', 'parts': [{'text': prompt}]}]
-        else:
-            current_contents = contents # Use provided history
+    def _gemini_text_payload(self, prompt: str) -> Dict[str, Any]:
+        return {
+            'contents': [{'parts': [{'text': prompt}]}],
+            'generationConfig': self.generation_config,
+            'safetySettings': GeminiConfig.SAFETY_SETTINGS
+        }
 
+    def _gemini_tools_payload(self, contents: List[Dict[str, Any]], allow_function_calls: bool = True) -> Dict[str, Any]:
         payload = {
-            'contents': current_contents,
+            'contents': contents,
             'generationConfig': self.generation_config,
             'safetySettings': GeminiConfig.SAFETY_SETTINGS,
             'tools': [{'functionDeclarations': self.tools}]
         }
-        headers = {'Content-Type': 'application/json'}
+        if not allow_function_calls:
+            # Tool budget spent: tools stay declared (the history references them) but the model must answer in text
+            payload['toolConfig'] = {'functionCallingConfig': {'mode': 'NONE'}}
+        return payload
+
+    def _extract_gemini_text(self, data: Dict[str, Any]) -> str:
+        if 'usageMetadata' in data:
+            usage = data['usageMetadata']
+            self.logger.log(f"[{self.name}] Tokens: {usage.get('totalTokenCount', 0)} "
+                          f"(prompt: {usage.get('promptTokenCount', 0)}, "
+                          f"response: {usage.get('candidatesTokenCount', 0)})", self.role)
         
-        self.logger.log(f"[{self.name}] Initial Gemini API call with tools. Model: {self.current_model}. Contents: {json.dumps(current_contents, indent=2)}", self.role)
+        candidates = data.get('candidates', [])
+        if candidates and 'content' in candidates[0]:
+            parts = candidates[0]['content'].get('parts', [])
+            if parts and 'text' in parts[0]:
+                response_text = parts[0]['text'].strip()
+                finish_reason = candidates[0].get('finishReason', 'UNKNOWN')
+                if finish_reason != 'STOP':
+                    self.logger.log(f"[{self.name}] Finish reason: {finish_reason}", self.role, level="WARNING")
+                return response_text
+        
+        if candidates and candidates[0].get('finishReason') == 'SAFETY':
+            return "Response blocked by safety filters. Please rephrase your request."
+        
+        self.logger.log(f"[{self.name}] Empty response from {self.current_model}", self.role, level="WARNING")
+        return "No response generated"
+
+    def _raise_gemini_error(self, e: Exception):
+        """Map transport/HTTP errors onto the messages the fallback logic matches on."""
+        if isinstance(e, requests.exceptions.HTTPError):
+            if e.response.status_code == 429: raise Exception(f"Rate limit exceeded for {self.current_model}")
+            elif e.response.status_code == 403: raise Exception(f"API key invalid or quota exceeded for {self.current_model}")
+            else: raise Exception(f"HTTP {e.response.status_code}: {e.response.text}")
+        if isinstance(e, requests.exceptions.RequestException): raise Exception(f"Request failed for {self.current_model}: {str(e)}")
+        raise Exception(f"Processing error for {self.current_model}: {str(e)}")
 
+    def _call_gemini(self, prompt: str) -> str:
         try:
-            # First API Call
-            response1 = requests.post(
-                url, params={'key': GeminiConfig.API_KEY}, headers=headers, json=payload, timeout=90
-            )
-            response1.raise_for_status()
-            data1 = response1.json()
-            
-            self.logger.log(f"[{self.name}] First API call response: {json.dumps(data1, indent=2)}", self.role)
-
-            if 'usageMetadata' in data1:
-                usage = data1['usageMetadata']
-                self.logger.log(f"[{self.name}] Tools Tokens (1st call): {usage.get('totalTokenCount', 0)}", self.role)
-            
-            candidates1 = data1.get('candidates', [])
-            if not candidates1:
-                self.logger.log(f"[{self.name}] No candidates in first API response.", self.role, level="WARNING")
-                return "No response generated (no candidates)"
-
-            # Append model's first response to contents
-            # IMPORTANT: Ensure this is the actual model response content, not the whole API response data.
-            # Based on Gemini API, the model's response that might contain a functionCall is candidates[0]['content']
-            if 'content' in candidates1[0]:
-                 model_response_content = candidates1[0]['content']
-                 # Ensure 'role' is set to 'model' for this part of the history
-                 if 'role' not in model_response_content:
-                     model_response_content['role'] = 'model' # Gemini API expects 'model' role for its responses
-                 current_contents.append(model_response_content)
-            else:
-                self.logger.log(f"[{self.name}] No 'content' in candidate of first API response. Cannot append to history.", self.role, level="WARNING")
-                # Decide how to handle this - potentially return an error or a direct text response if available
+            data = self._gemini_request(self._gemini_text_payload(prompt))
+            return self._extract_gemini_text(data)
+        except Exception as e:
+            self._raise_gemini_error(e)
 
+    async def _acall_gemini(self, prompt: str) -> str:
+        try:
+            data = await self._agemini_request(self._gemini_text_payload(prompt))
+            return self._extract_gemini_text(data)
+        except Exception as e:
+            self._raise_gemini_error(e)
 
-            parts1 = candidates1[0].get('content', {}).get('parts', [])
+    def _call_gemini_stream(self, prompt: str) -> str:
+        """_call_gemini over streamGenerateContent. Text is fed to an IncrementalResponseParser
+        and, with STREAM_EARLY_STOP, reading stops once the JSON payload has closed."""
+        url = f"{GeminiConfig.BASE_URL}/{self.current_model}:streamGenerateContent"
+        headers = {'Content-Type': 'application/json'}
+        payload = self._gemini_text_payload(prompt)
+        limiter = get_rate_limiter()
+        estimated_tokens = self._estimate_request_tokens(payload)
+        parser = IncrementalResponseParser()
+        finish_reason = None
+        usage = {}
+        try:
+            attempt = 0
+            while True:
+                limiter.acquire(self.current_model, estimated_tokens)
+                response = http_transport.post(
+                    url, params={'key': GeminiConfig.API_KEY, 'alt': 'sse'}, headers=headers, json=payload,
+                    timeout=GeminiConfig.TIMEOUT, stream=True
+                )
+                if self._should_retry_throttled(response, attempt):
+                    response.close()
+                    attempt += 1
+                    continue
+                break
 
-            function_call_part = None
-            for part in parts1:
-                if 'functionCall' in part:
-                    function_call_part = part
-                    break
+            start = time.time()
+            first_chunk_at = None
+            try:
+                response.raise_for_status()
+                for event in iter_sse_json(response.iter_lines()):
+                    usage = event.get('usageMetadata', usage)
+                    candidates = event.get('candidates', [])
+                    if not candidates:
+                        continue
+                    finish_reason = candidates[0].get('finishReason', finish_reason)
+                    for part in candidates[0].get('content', {}).get('parts', []):
+                        if 'text' in part:
+                            if first_chunk_at is None:
+                                first_chunk_at = time.time() - start
+                            parser.feed(part['text'])
+                    if parser.complete and self.strategy_config.STREAM_EARLY_STOP:
+                        self.logger.log(f"[{self.name}] Structured payload ({parser.kind}) complete after {time.time() - start:.2f}s; stopping stream early", self.role)
+                        break
+            finally:
+                response.close()
+        except Exception as e:
+            self._raise_gemini_error(e)
+
+        if usage:
+            limiter.record_usage(self.current_model, estimated_tokens, usage.get('totalTokenCount'))
+            self.logger.log(f"[{self.name}] Tokens: {usage.get('totalTokenCount', 0)} "
+                          f"(prompt: {usage.get('promptTokenCount', 0)}, "
+                          f"response: {usage.get('candidatesTokenCount', 0)})", self.role)
+        if first_chunk_at is not None:
+            self.logger.log(f"[{self.name}] First streamed text after {first_chunk_at:.2f}s", self.role)
+
+        response_text = parser.result_text().strip()
+        if response_text:
+            if finish_reason not in (None, 'STOP') and not parser.complete:
+                self.logger.log(f"[{self.name}] Finish reason: {finish_reason}", self.role, level="WARNING")
+            return response_text
+        if finish_reason == 'SAFETY':
+            return "Response blocked by safety filters. Please rephrase your request."
+        self.logger.log(f"[{self.name}] Empty response from {self.current_model}", self.role, level="WARNING")
+        return "No response generated"
+
+    def _record_model_turn(self, data: Dict[str, Any], current_contents: List[Dict[str, Any]], call_label: str):
+        """Append the model's turn to the history and return (candidates, parts, function_calls)."""
+        self.logger.log(f"[{self.name}] {call_label} API call response: {json.dumps(data, indent=2)}", self.role)
+
+        if 'usageMetadata' in data:
+            usage = data['usageMetadata']
+            self.logger.log(f"[{self.name}] Tools Tokens ({call_label} call): {usage.get('totalTokenCount', 0)}", self.role)
+
+        candidates = data.get('candidates', [])
+        if not candidates:
+            return candidates, [], None
+
+        # Append model's response to contents
+        # IMPORTANT: Ensure this is the actual model response content, not the whole API response data.
+        # Based on Gemini API, the model's response that might contain a functionCall is candidates[0]['content']
+        if 'content' in candidates[0]:
+            model_response_content = candidates[0]['content']
+            # Ensure 'role' is set to 'model' for this part of the history
+            if 'role' not in model_response_content:
+                model_response_content['role'] = 'model' # Gemini API expects 'model' role for its responses
+            current_contents.append(model_response_content)
+        else:
+            self.logger.log(f"[{self.name}] No 'content' in candidate of {call_label} API response. Cannot append to history.", self.role, level="WARNING")
 
-            if function_call_part:
-                function_call = function_call_part['functionCall']
-                function_name = function_call.get('name', '')
-                function_args = function_call.get('args', {})
-                self.logger.log(f"[{self.name}] Tool call requested: {function_name} with args: {function_args}", self.role)
+        parts = candidates[0].get('content', {}).get('parts', [])
+        function_calls = [part['functionCall'] for part in parts if 'functionCall' in part]
+        return candidates, parts, function_calls
 
-                tool_result_content = ""
-                if self.tool_kit and hasattr(self.tool_kit, function_name):
-                    try:
-                        tool_result = getattr(self.tool_kit, function_name)(**function_args)
-                        # Ensure tool_result is JSON serializable if it's an object, or a string
-                        tool_result_content = json.dumps({"content": tool_result}) if not isinstance(tool_result, str) else tool_result
-                        self.logger.log(f"[{self.name}] Tool {function_name} executed successfully. Result: {tool_result_content}", self.role)
-                    except Exception as e:
-                        tool_result_content = json.dumps({"error": f"Tool execution failed: {str(e)}"})
-                        self.logger.log(f"[{self.name}] Tool {function_name} execution failed: {e}", self.role, level="ERROR")
-                else:
-                    tool_result_content = json.dumps({"error": f"Tool not found: {function_name}"})
-                    self.logger.log(f"[{self.name}] Tool {function_name} not found in tool_kit.", self.role, level="ERROR")
-
-                # Construct function response part for the second API call
-                function_response_content = {
-                    "role": "user", # As per Gemini Python SDK examples for function response part wrapper
-                                    # Some direct REST examples might use "function" - check API docs if "user" causes issues
-                    "parts": [
-                        {
-                            "functionResponse": {
-                                "name": function_name,
-                                "response": {
-                                    "content": tool_result_content # Actual tool output (string or JSON string)
-                                }
-                            }
-                        }
-                    ]
-                }
-                current_contents.append(function_response_content)
-
-                self.logger.log(f"[{self.name}] Preparing for second Gemini API call. Contents: {json.dumps(current_contents, indent=2)}", self.role)
-
-                # Second API Call
-                payload_2 = {
-                    'contents': current_contents, # Now includes original prompt, model's func call, and func result
-                    'generationConfig': self.generation_config,
-                    'safetySettings': GeminiConfig.SAFETY_SETTINGS,
-                    # Tools might not be needed here if we expect a text response, but including them might be safer
-                    # or allow for follow-up tool calls if the model decides so.
-                    'tools': [{'functionDeclarations': self.tools}]
+    def _execute_tool_calls(self, function_calls: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Run every functionCall of one model turn, concurrently when there are several, and
+        return a single user turn holding all functionResponse parts in call order."""
+        if len(function_calls) == 1:
+            response_parts = [self._execute_tool_call(function_calls[0])]
+        else:
+            self.logger.log(f"[{self.name}] Executing {len(function_calls)} tool calls in parallel", self.role)
+            workers = min(len(function_calls), self.strategy_config.TOOL_MAX_PARALLEL_CALLS)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{self.name}-tool") as executor:
+                response_parts = list(executor.map(self._execute_tool_call, function_calls))
+        return {
+            "role": "user", # As per Gemini Python SDK examples for function response part wrapper
+                            # Some direct REST examples might use "function" - check API docs if "user" causes issues
+            "parts": response_parts
+        }
+
+    def _execute_tool_call(self, function_call: Dict[str, Any]) -> Dict[str, Any]:
+        """Run one requested tool and wrap its output as a functionResponse part."""
+        self._tools_executed = True
+        function_name = function_call.get('name', '')
+        function_args = function_call.get('args', {})
+        self.logger.log(f"[{self.name}] Tool call requested: {function_name} with args: {function_args}", self.role)
+
+        tool_result_content = ""
+        if self.tool_kit and hasattr(self.tool_kit, function_name):
+            try:
+                tool_result = getattr(self.tool_kit, function_name)(**function_args)
+                # Ensure tool_result is JSON serializable if it's an object, or a string
+                tool_result_content = json.dumps({"content": tool_result}) if not isinstance(tool_result, str) else tool_result
+                self.logger.log(f"[{self.name}] Tool {function_name} executed successfully. Result: {tool_result_content}", self.role)
+            except Exception as e:
+                tool_result_content = json.dumps({"error": f"Tool execution failed: {str(e)}"})
+                self.logger.log(f"[{self.name}] Tool {function_name} execution failed: {e}", self.role, level="ERROR")
+        else:
+            tool_result_content = json.dumps({"error": f"Tool not found: {function_name}"})
+            self.logger.log(f"[{self.name}] Tool {function_name} not found in tool_kit.", self.role, level="ERROR")
+
+        return {
+            "functionResponse": {
+                "name": function_name,
+                "response": {
+                    "content": tool_result_content # Actual tool output (string or JSON string)
                 }
+            }
+        }
 
-                response2 = requests.post(
-                    url, params={'key': GeminiConfig.API_KEY}, headers=headers, json=payload_2, timeout=90
-                )
-                response2.raise_for_status()
-                data2 = response2.json()
-                self.logger.log(f"[{self.name}] Second API call response: {json.dumps(data2, indent=2)}", self.role)
-
-                if 'usageMetadata' in data2:
-                    usage2 = data2['usageMetadata']
-                    self.logger.log(f"[{self.name}] Tools Tokens (2nd call): {usage2.get('totalTokenCount', 0)}", self.role)
-
-                candidates2 = data2.get('candidates', [])
-                if candidates2 and 'content' in candidates2[0]:
-                    parts2 = candidates2[0]['content'].get('parts', [])
-                    for part in parts2:
-                        if 'text' in part:
-                            response_text = part['text'].strip()
-                            if response_text:
-                                self.logger.log(f"[{self.name}] Final text response after tool call: {response_text}", self.role)
-                                return response_text
-
-                self.logger.log(f"[{self.name}] No text part in second API response after tool call.", self.role, level="WARNING")
-                return "No text response after tool execution cycle."
-
-            else: # No functionCall in the first response, direct text response
-                for part in parts1:
-                    if 'text' in part:
-                        response_text = part['text'].strip()
-                        if response_text:
-                            self.logger.log(f"[{self.name}] Direct text response (no tool call): {response_text}", self.role)
-                            return response_text
-
-                # Handle cases where there's no function call and no text (e.g. safety block)
-                if candidates1 and candidates1[0].get('finishReason') == 'SAFETY':
-                    self.logger.log(f"[{self.name}] Response blocked by safety filters (1st call).", self.role, level="WARNING")
-                    return "Response blocked by safety filters. Please rephrase your request."
-
-                self.logger.log(f"[{self.name}] Empty or non-text response from 1st call (no tool call). Parts: {parts1}", self.role, level="WARNING")
-                return "No response generated (1st call, no tool, no text)"
-            
-        except requests.exceptions.HTTPError as e:
-            error_body = e.response.text
-            self.logger.log(f"[{self.name}] HTTP Error: {e.response.status_code} - {error_body}", self.role, level="ERROR")
-            if e.response.status_code == 429: raise Exception(f"Rate limit exceeded for {self.current_model}")
-            elif e.response.status_code == 403: raise Exception(f"API key invalid or quota exceeded for {self.current_model}")
-            else: raise Exception(f"HTTP {e.response.status_code}: {error_body}")
-        except requests.exceptions.RequestException as e:
+    def _final_tool_text(self, candidates: List[Dict[str, Any]]) -> str:
+        """Text of the model's answer after the tool results were sent back."""
+        if candidates and 'content' in candidates[0]:
+            for part in candidates[0]['content'].get('parts', []):
+                if 'text' in part:
+                    response_text = part['text'].strip()
+                    if response_text:
+                        self.logger.log(f"[{self.name}] Final text response after tool call: {response_text}", self.role)
+                        return response_text
+
+        self.logger.log(f"[{self.name}] No text part in final API response after tool calls.", self.role, level="WARNING")
+        return "No text response after tool execution cycle."
+
+    def _direct_tool_text(self, candidates: List[Dict[str, Any]], parts: List[Dict[str, Any]]) -> str:
+        """Text of a first response that did not request a tool."""
+        for part in parts:
+            if 'text' in part:
+                response_text = part['text'].strip()
+                if response_text:
+                    self.logger.log(f"[{self.name}] Direct text response (no tool call): {response_text}", self.role)
+                    return response_text
+
+        # Handle cases where there's no function call and no text (e.g. safety block)
+        if candidates and candidates[0].get('finishReason') == 'SAFETY':
+            self.logger.log(f"[{self.name}] Response blocked by safety filters (1st call).", self.role, level="WARNING")
+            return "Response blocked by safety filters. Please rephrase your request."
+
+        self.logger.log(f"[{self.name}] Empty or non-text response from 1st call (no tool call). Parts: {parts}", self.role, level="WARNING")
+        return "No response generated (1st call, no tool, no text)"
+
+    def _log_tools_error(self, e: Exception):
+        if isinstance(e, requests.exceptions.HTTPError):
+            self.logger.log(f"[{self.name}] HTTP Error: {e.response.status_code} - {e.response.text}", self.role, level="ERROR")
+        elif isinstance(e, requests.exceptions.RequestException):
             self.logger.log(f"[{self.name}] Request Exception: {str(e)}", self.role, level="ERROR")
-            raise Exception(f"Request failed for {self.current_model}: {str(e)}")
-        except Exception as e:
+        else:
             self.logger.log(f"[{self.name}] Processing Error: {str(e)}", self.role, level="ERROR")
-            raise Exception(f"Processing error for {self.current_model}: {str(e)}")
+
+    def _tool_budget_spent(self, rounds: int, deadline: float) -> bool:
+        return rounds >= self.strategy_config.TOOL_LOOP_MAX_STEPS or time.time() >= deadline
+
+    def _tool_loop_step(self, data: Dict[str, Any], current_contents: List[Dict[str, Any]], rounds: int, force_text: bool):
+        """Handle one model turn of the tool loop. Returns (final_text, function_calls); final_text is
+        None while the model is still asking for tools."""
+        call_label = "1st" if rounds == 0 else f"Round {rounds + 1}"
+        candidates, parts, function_calls = self._record_model_turn(data, current_contents, call_label)
+        if not candidates:
+            self.logger.log(f"[{self.name}] No candidates in {call_label} API response.", self.role, level="WARNING")
+            return ("No response generated (no candidates)" if rounds == 0 else "No text response after tool execution cycle."), []
+        if not function_calls or force_text:
+            if function_calls:
+                self.logger.log(f"[{self.name}] Tool budget spent; ignoring {len(function_calls)} further tool call(s).", self.role, level="WARNING")
+            return (self._direct_tool_text(candidates, parts) if rounds == 0 else self._final_tool_text(candidates)), []
+        return None, function_calls
+
+    def _call_gemini_with_tools(self, prompt: str, contents: Optional[List[Dict[str, Any]]] = None) -> str:
+        """Agentic loop: request, run every functionCall of the turn, send all results back, and repeat
+        until the model answers in text or TOOL_LOOP_MAX_STEPS / TOOL_LOOP_MAX_SECONDS is reached."""
+        if contents is None:
+            current_contents = [{'role': 'user', 'parts': [{'text': prompt}]}]
+        else:
+            current_contents = contents # Use provided history
+
+        self.logger.log(f"[{self.name}] Initial Gemini API call with tools. Model: {self.current_model}. Contents: {json.dumps(current_contents, indent=2)}", self.role)
+
+        deadline = time.time() + self.strategy_config.TOOL_LOOP_MAX_SECONDS
+        rounds = 0
+        try:
+            while True:
+                force_text = self._tool_budget_spent(rounds, deadline)
+                data = self._gemini_request(self._gemini_tools_payload(current_contents, allow_function_calls=not force_text))
+                final_text, function_calls = self._tool_loop_step(data, current_contents, rounds, force_text)
+                if final_text is not None:
+                    return final_text
+
+                current_contents.append(self._execute_tool_calls(function_calls))
+                rounds += 1
+                self.logger.log(f"[{self.name}] Preparing Gemini API call after tool round {rounds}. Contents: {json.dumps(current_contents, indent=2)}", self.role)
+        except Exception as e:
+            self._log_tools_error(e)
+            self._raise_gemini_error(e)
+
+    async def _acall_gemini_with_tools(self, prompt: str, contents: Optional[List[Dict[str, Any]]] = None) -> str:
+        if contents is None:
+            current_contents = [{'role': 'user', 'parts': [{'text': prompt}]}]
+        else:
+            current_contents = contents
+
+        self.logger.log(f"[{self.name}] Initial Gemini API call with tools (async). Model: {self.current_model}. Contents: {json.dumps(current_contents, indent=2)}", self.role)
+
+        deadline = time.time() + self.strategy_config.TOOL_LOOP_MAX_SECONDS
+        rounds = 0
+        try:
+            while True:
+                force_text = self._tool_budget_spent(rounds, deadline)
+                data = await self._agemini_request(self._gemini_tools_payload(current_contents, allow_function_calls=not force_text))
+                final_text, function_calls = self._tool_loop_step(data, current_contents, rounds, force_text)
+                if final_text is not None:
+                    return final_text
+
+                # Tools touch the local filesystem; keep them off the event loop
+                current_contents.append(await asyncio.to_thread(self._execute_tool_calls, function_calls))
+                rounds += 1
+                self.logger.log(f"[{self.name}] Preparing Gemini API call after tool round {rounds}. Contents: {json.dumps(current_contents, indent=2)}", self.role)
+        except Exception as e:
+            self._log_tools_error(e)
+            self._raise_gemini_error(e)
 
     def _parse_response(self, response_text: str, project_context: ProjectContext) -> dict:
         parsed_result = {
@@ -471,7 +1058,7 @@ class Agent:
             self.logger.log(f"JSON parsing failed for {self.name}: {e}", self.role, level="WARNING")
         return parsed_result
 
-    def add_to_memory(self, content: str):
+    def add_to_memory(self, content: str, project: Optional[str] = None):
         item_id = f"{self.name}_{time.time()}"
         try:
           embedding = numpy.random.rand(384).astype(numpy.float32)
@@ -479,7 +1066,7 @@ class Agent:
             self.logger.log(f"Numpy didn't work for embedding generation: {e}","ToolKit", level="ERROR")
             return
         if self.db:
-           if self.db.store_embedding(item_id=item_id, agent_id=self.name, role=self.role, content=content, embedding=embedding):
+           if self.db.store_embedding(item_id=item_id, agent_id=self.name, role=self.role, content=content, embedding=embedding, project=project):
                self.logger.log(f"Added content to memory store for {self.name}: {item_id[:20]}...", self.role)
 
     def set_tools(self, tool_kit: ToolKit):
@@ -548,6 +1135,8 @@ def _process_tech_proposals(logger: Logger, agent_name: str, agent_role: str, ra
                 logger.log(f"[_process_tech_proposals] Unexpected error processing TechProposal for category '{category}'. Item: {str(proposal_item)}. Error: {e}", agent_role, level="ERROR")
 
 class ProjectAnalyzer(Agent):
+    INPUT_CONTEXT_FIELDS = PROMPT_CONTEXT_FIELDS + ("platform_requirements",)
+
     def __init__(self, logger, db: Database = None):
         super().__init__('project_analyzer', 'Project Analyst', logger, db=db)
     def _parse_response(self, text: str, project_context: ProjectContext) -> dict:
@@ -832,6 +1421,8 @@ class Architect(Agent):
         return base_parsed_output
 
 class APIDesigner(Agent):
+    INPUT_CONTEXT_FIELDS = PROMPT_CONTEXT_FIELDS + ("api_specs",)
+
     def __init__(self, logger, db: Database = None):
         super().__init__('api_designer', 'API Designer', logger, db=db)
     def _parse_response(self, text: str, project_context: ProjectContext) -> dict:
@@ -6,11 +6,11 @@ Add this file to your project
 import time
 from pathlib import Path
 import os
+import re
+import json
 import logging
 import datetime
-import requests  # Added missing import
 import sqlite3
-import numpy #  Import NumPy
 from typing import Dict, Any, List
 from pydantic import BaseModel
 
@@ -19,7 +19,7 @@ class GeminiConfig:
     
     # API Configuration
     API_KEY = os.getenv("GEMINI_API_KEY")
-    BASE_URL = 'https://generativelanguage.googleapis.com/v1beta/models'
+    BASE_URL = os.getenv("GEMINI_BASE_URL", 'https://generativelanguage.googleapis.com/v1beta/models') # Override to target utils/llm_stub_server.py
     MODEL_NAME = 'gemini-2.0-flash' # Updated model name
     
     TIMEOUT = 90  # Default timeout in seconds
@@ -119,14 +119,20 @@ class ModelConfig:
             'max_tokens': 8192, # Max tokens for gemini 1.5 flash is 8192 output, 1M context
             'supports_tools': True,
             'cost_per_1k_tokens': 0.075,  # Example pricing, check actual
-            'speed': 'fast'
+            'speed': 'fast',
+            'rpm': 15, # Requests per minute quota (free tier; raise for paid keys)
+            'tpm': 1000000, # Tokens per minute quota
+            'context_window': 1048576 # Input + output tokens
         },
         'gemini-1.5-pro-latest': { # Ensuring this key exists if used by CODING_MODEL_NAME
             'name': 'Gemini 1.5 Pro Latest',
             'max_tokens': 8192, # Max tokens for gemini 1.5 pro is 8192 output, 1M context
             'supports_tools': True,
             'cost_per_1k_tokens': 0.125, # Example pricing, check actual
-            'speed': 'medium'
+            'speed': 'medium',
+            'rpm': 2,
+            'tpm': 32000,
+            'context_window': 2097152
         },
         # Keeping gemini-1.5-pro as an option if distinct from latest, or remove if it's the same
         # For this change, let's assume 'gemini-1.5-pro-latest' is the one we want for pro.
@@ -143,7 +149,8 @@ class ModelConfig:
             'supports_tools': True, # May need testing
             'cost_per_1k_tokens': 0.0,
             'speed': 'medium',
-            'local': True # Flag as local
+            'local': True, # Flag as local
+            'context_window': 16384
         },
        'deepseek-r1': {
             'name': 'DeepSeek R1 (Local)',
@@ -151,7 +158,27 @@ class ModelConfig:
             'supports_tools': False, # May need testing
             'cost_per_1k_tokens': 0.0,
             'speed': 'slow',
-            'local': True # Flag as local
+            'local': True, # Flag as local
+            'context_window': 32768
+        },
+        # LOCAL_MODEL_ENDPOINTS servers; set QREWS_CONTEXT_WINDOW_<MODEL> to the n_ctx they were started with
+        'deepseek-base': {
+            'name': 'DeepSeek Base (Local)',
+            'max_tokens': 2048,
+            'supports_tools': False,
+            'cost_per_1k_tokens': 0.0,
+            'speed': 'medium',
+            'local': True,
+            'context_window': 16384
+        },
+        'deepseek-coder': {
+            'name': 'DeepSeek Coder (Local)',
+            'max_tokens': 4096,
+            'supports_tools': False,
+            'cost_per_1k_tokens': 0.0,
+            'speed': 'medium',
+            'local': True,
+            'context_window': 16384
         }
     }
 
@@ -163,6 +190,13 @@ class ModelConfig:
         'deepseek-r1': 240,
     }
     
+    # Quotas for Gemini models missing from MODELS (e.g. gemini-1.5-flash). Local models are unlimited.
+    DEFAULT_RATE_LIMITS = {'rpm': 15, 'tpm': 1000000}
+
+    # Context windows for models missing from MODELS
+    DEFAULT_GEMINI_CONTEXT_WINDOW = 1048576
+    DEFAULT_LOCAL_CONTEXT_WINDOW = int(os.getenv("QREWS_LOCAL_CONTEXT_WINDOW", "8192"))
+
     # Fallback order if primary model fails
     FALLBACK_ORDER = ['gemini-2.0-flash', 'gemini-1.5-flash-latest', 'deepseek-coder-1.3', 'deepseek-r1'] # Updated order
     
@@ -182,6 +216,29 @@ class ModelConfig:
             pass
         return cls.FALLBACK_ORDER[0]
 
+    @classmethod
+    def get_rate_limits(cls, model_name: str) -> Dict[str, Any]:
+        """Get requests/tokens per minute for a model; None means unlimited"""
+        info = cls.MODELS.get(model_name, {})
+        if info.get('local') or (not info and not model_name.startswith('gemini-')):
+            return {'rpm': None, 'tpm': None}
+        return {
+            'rpm': info.get('rpm', cls.DEFAULT_RATE_LIMITS['rpm']),
+            'tpm': info.get('tpm', cls.DEFAULT_RATE_LIMITS['tpm'])
+        }
+
+    @classmethod
+    def get_context_window(cls, model_name: str) -> int:
+        """Get the total (prompt + output) token window for a model"""
+        # Per-model override, e.g. QREWS_CONTEXT_WINDOW_DEEPSEEK_BASE=32768
+        override = os.getenv("QREWS_CONTEXT_WINDOW_" + re.sub(r"[^A-Z0-9]", "_", model_name.upper()))
+        if override:
+            return int(override)
+        info = cls.MODELS.get(model_name, {})
+        if 'context_window' in info:
+            return info['context_window']
+        return cls.DEFAULT_GEMINI_CONTEXT_WINDOW if model_name.startswith('gemini-') else cls.DEFAULT_LOCAL_CONTEXT_WINDOW
+
     @classmethod
     def get_timeout(cls, model_name: str) -> int:
         """Get timeout for specific model"""
@@ -205,14 +262,24 @@ if __name__ == "__main__":
     print(f"Unknown Model Timeout: {ModelConfig.get_timeout('unknown-model')}")
 
 
+def _local_model_endpoints() -> Dict[str, str]:
+    # QREWS_LOCAL_MODEL_ENDPOINTS replaces the map (JSON object); QREWS_LOCAL_LLM_BASE_URL points every default model at one server
+    override = os.getenv("QREWS_LOCAL_MODEL_ENDPOINTS")
+    if override:
+        return json.loads(override)
+    endpoints = {
+        "deepseek-coder": "http://localhost:8081/v1", # Updated port for coder
+        "deepseek-base": "http://localhost:8080/v1"   # Updated port for general/fallback
+    }
+    base_url = os.getenv("QREWS_LOCAL_LLM_BASE_URL")
+    return {name: base_url for name in endpoints} if base_url else endpoints
+
+
 class ModelStrategyConfig(BaseModel):
     DEFAULT_GEMINI_MODEL: str = "gemini-1.5-flash" # Updated
     CODING_MODEL_NAME: str = "gemini-2.0-flash" # Updated to use Gemini Pro for coding
     LOCAL_FALLBACK_MODEL_NAME: str = "deepseek-base" # User can adjust this value
-    LOCAL_MODEL_ENDPOINTS: Dict[str, str] = {
-        "deepseek-coder": "http://localhost:8081/v1", # Updated port for coder
-        "deepseek-base": "http://localhost:8080/v1"   # Updated port for general/fallback
-    }
+    LOCAL_MODEL_ENDPOINTS: Dict[str, str] = _local_model_endpoints()
     CODING_AGENT_NAMES: List[str] = [
         "code_writer",
         "debugger",
@@ -221,6 +288,27 @@ class ModelStrategyConfig(BaseModel):
         # Add other agents that primarily do coding if any
     ]
     ENABLE_LOCAL_FALLBACK: bool = True
+    ENABLE_STREAMING: bool = False # Use streamGenerateContent / local "stream": true for plain text calls
+    STREAM_EARLY_STOP: bool = True # Stop reading once the ```json block or "Final Answer:" payload closes
+    # Hedging: if the Gemini primary hasn't answered by the agent's p95 latency, race LOCAL_FALLBACK_MODEL_NAME
+    ENABLE_HEDGED_REQUESTS: bool = False
+    HEDGE_LATENCY_PERCENTILE: float = 0.95
+    HEDGE_MIN_SAMPLES: int = 5 # Below this many observed calls, HEDGE_DEFAULT_DELAY_SECONDS is used
+    HEDGE_DEFAULT_DELAY_SECONDS: float = 20.0
+    HEDGE_MIN_DELAY_SECONDS: float = 2.0
+    # Tool loop: rounds of functionCall execution per task, wall-clock cap, and parallel calls per round
+    TOOL_LOOP_MAX_STEPS: int = 5
+    TOOL_LOOP_MAX_SECONDS: float = 300.0
+    TOOL_MAX_PARALLEL_CALLS: int = 4
+    # Crew runners: independent sub-agents run concurrently on a pool of this size (1 = sequential)
+    CREW_MAX_PARALLEL_AGENTS: int = 4
+    # Mobile crew: split the UI structure by screen and design components / state per screen in parallel
+    MOBILE_SHARD_BY_SCREEN: bool = True
+    MOBILE_SHARD_MIN_SCREENS: int = 4 # Smaller apps keep the single whole-app call
+    # API designer crew: endpoints per RequestResponseDesigner call (planned endpoints are grouped by tag/resource)
+    API_DESIGN_ENDPOINT_GROUP_SIZE: int = 8
+    # TaskMaster: top-level agents whose dependencies are done run concurrently on this many threads (1 = sequential)
+    WORKFLOW_MAX_PARALLEL_AGENTS: int = 3
 
 MODEL_STRATEGY_CONFIG = ModelStrategyConfig()
 
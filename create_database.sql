@@ -37,12 +37,34 @@ CREATE TABLE IF NOT EXISTS memory (
     content TEXT NOT NULL,        -- The actual content of the memory
     embedding BLOB NOT NULL,      -- The vector embedding of the content
     creation_time REAL,        -- The time this was created
+    project TEXT,              -- Name of the project the memory belongs to (NULL if not tied to one)
 
     FOREIGN KEY (agent_id) REFERENCES agents(agent_id) -- Link to agents table
 );
 
--- Index for efficient retrieval of memories by agent
-CREATE INDEX idx_memory_agent_id ON memory (agent_id);
+-- Indexes for efficient retrieval of memories by agent, role, project and time window
+CREATE INDEX IF NOT EXISTS idx_memory_agent_id ON memory (agent_id);
+CREATE INDEX IF NOT EXISTS idx_memory_role ON memory (role);
+CREATE INDEX IF NOT EXISTS idx_memory_project_time ON memory (project, creation_time);
+CREATE INDEX IF NOT EXISTS idx_memory_creation_time ON memory (creation_time);
+
+-- Change log of the memory table, kept by triggers: in-memory embedding matrices and the ANN index
+-- (utils/database.py, utils/ann_index.py) catch up on the item_ids changed after the last change_id they applied
+CREATE TABLE IF NOT EXISTS memory_changes (
+    change_id INTEGER PRIMARY KEY AUTOINCREMENT,  -- Never reused, unlike rowids
+    item_id TEXT                                   -- Memory item inserted, replaced, updated or deleted
+);
+
+CREATE TRIGGER IF NOT EXISTS memory_changes_insert AFTER INSERT ON memory BEGIN
+    INSERT INTO memory_changes (item_id) VALUES (NEW.item_id);
+END;
+CREATE TRIGGER IF NOT EXISTS memory_changes_update AFTER UPDATE OF item_id, embedding ON memory BEGIN
+    INSERT INTO memory_changes (item_id) VALUES (OLD.item_id);
+    INSERT INTO memory_changes (item_id) SELECT NEW.item_id WHERE NEW.item_id IS NOT OLD.item_id;
+END;
+CREATE TRIGGER IF NOT EXISTS memory_changes_delete AFTER DELETE ON memory BEGIN
+    INSERT INTO memory_changes (item_id) VALUES (OLD.item_id);
+END;
 
 -- -----------------------------------------------------------------------------
 -- Feedback Table: Stores feedback on agent outputs and evaluation results.
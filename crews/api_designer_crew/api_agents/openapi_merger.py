@@ -122,6 +122,27 @@ class OpenAPIMerger:
         self.logger.log("OpenAPI merge completed.", role=self.agent_name)
         return openapi_spec
 
+    def merge_path_maps(self, path_maps: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Combines several RequestResponseDesigner outputs ({"paths": {...}}), e.g. one per endpoint
+        group, into a single request/response map. Operations on the same path are combined;
+        if two groups define the same method for a path, the first definition is kept.
+        """
+        merged_paths: Dict[str, Dict[str, Any]] = {}
+        for path_map in path_maps:
+            for path, path_item in ((path_map or {}).get("paths") or {}).items():
+                target = merged_paths.setdefault(path, {})
+                for key, value in (path_item or {}).items():
+                    if value is None: # model_dump leaves unused methods as None
+                        continue
+                    if target.get(key) is not None:
+                        if target[key] != value:
+                            self.logger.log(f"'{key}' on path '{path}' was designed by more than one endpoint group. Keeping the first.", level="WARNING", role=self.agent_name)
+                        continue
+                    target[key] = copy.deepcopy(value)
+        self.logger.log(f"Merged {len(path_maps)} request/response maps into {len(merged_paths)} paths.", role=self.agent_name)
+        return {"paths": merged_paths}
+
 if __name__ == '__main__':
     logger = LoggerPlaceholder()
     logger.log("Testing OpenAPIMerger...")
@@ -1,6 +1,9 @@
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 import json # For logging and preparing context strings
 import os # For __main__ test
+import re
+from concurrent.futures import ThreadPoolExecutor
+from utils.dag_scheduler import DagScheduler, DagStep
 
 # Attempt to import real classes; define mocks if import fails
 RUNNER_IMPORTS_OK = False
@@ -11,7 +14,11 @@ try:
     from .request_response_designer import RequestResponseDesignerAgent
     from .auth_designer import AuthDesignerAgent
     from .error_designer import ErrorDesignerAgent
+    from .openapi_merger import OpenAPIMerger
     from utils.api_crew_utils import LoggerPlaceholder # CORRECTED
+    from configs.global_config import MODEL_STRATEGY_CONFIG
+    DEFAULT_MAX_PARALLEL_AGENTS = MODEL_STRATEGY_CONFIG.CREW_MAX_PARALLEL_AGENTS
+    DEFAULT_ENDPOINT_GROUP_SIZE = MODEL_STRATEGY_CONFIG.API_DESIGN_ENDPOINT_GROUP_SIZE
     RUNNER_IMPORTS_OK = True
 except ImportError as e:
     # This block is for when the script is run directly and relative imports fail.
@@ -38,14 +45,47 @@ except ImportError as e:
     RequestResponseDesignerAgent = type("RequestResponseDesignerAgent", (MockAgentPlaceholder,), {})
     AuthDesignerAgent = type("AuthDesignerAgent", (MockAgentPlaceholder,), {})
     ErrorDesignerAgent = type("ErrorDesignerAgent", (MockAgentPlaceholder,), {})
+    OpenAPIMerger = type("OpenAPIMerger", (MockAgentPlaceholder,), {
+        "merge_path_maps": lambda s, path_maps: {"paths": {p: item for m in path_maps for p, item in (m or {}).get("paths", {}).items()}}
+    })
+    DEFAULT_MAX_PARALLEL_AGENTS, DEFAULT_ENDPOINT_GROUP_SIZE = 4, 8
     # These Pydantic models are just for type hints in this file if imports succeed
     EndpointList, SchemaComponents, RequestResponseMap, AuthDefinition, ErrorSchemaDefinition = (dict, dict, dict, dict, dict)
 
 
+_VERSION_SEGMENT = re.compile(r"^v\d+$", re.IGNORECASE)
+
+def group_endpoints(endpoints: List[Dict[str, Any]], max_group_size: int) -> List[List[Dict[str, Any]]]:
+    """
+    Partitions planned endpoints by their first tag, or else by resource (the first path segment
+    after any 'api'/'v1' prefix, e.g. '/api/v1/users/{id}' -> 'users'). Groups keep the planner's
+    order and are split into chunks of at most max_group_size endpoints.
+    """
+    by_key: Dict[str, List[Dict[str, Any]]] = {}
+    for endpoint in endpoints:
+        tags = endpoint.get("tags")
+        if isinstance(tags, list) and tags:
+            key = f"tag:{tags[0]}"
+        else:
+            segments = [seg for seg in str(endpoint.get("path", "")).split("/") if seg]
+            while segments and (segments[0].lower() == "api" or _VERSION_SEGMENT.match(segments[0])):
+                segments.pop(0)
+            key = f"resource:{segments[0] if segments and not segments[0].startswith('{') else '/'}"
+        by_key.setdefault(key, []).append(endpoint)
+
+    size = max(1, max_group_size)
+    return [group[i:i + size] for group in by_key.values() for i in range(0, len(group), size)]
+
+
 class APIDesignCrewRunner:
-    def __init__(self, master_context: Dict[str, Any], logger: Optional[LoggerPlaceholder] = None):
+    def __init__(self, master_context: Dict[str, Any], logger: Optional[LoggerPlaceholder] = None,
+                 max_parallel_agents: Optional[int] = None, endpoint_group_size: Optional[int] = None):
         self.master_context = master_context
         self.logger = logger or LoggerPlaceholder()
+        # Independent agents and endpoint groups run concurrently on up to this many threads (1 = sequential)
+        self.max_parallel_agents = max_parallel_agents or DEFAULT_MAX_PARALLEL_AGENTS
+        # APIs with more planned endpoints than this get one RequestResponseDesigner call per group
+        self.endpoint_group_size = endpoint_group_size or DEFAULT_ENDPOINT_GROUP_SIZE
         self.logger.log("APIDesignCrewRunner initialized.", role="CrewRunner")
 
         if not RUNNER_IMPORTS_OK: # This flag is set at import time
@@ -56,10 +96,14 @@ class APIDesignCrewRunner:
         self.request_response_designer = RequestResponseDesignerAgent(logger=self.logger)
         self.auth_designer = AuthDesignerAgent(logger=self.logger)
         self.error_designer = ErrorDesignerAgent(logger=self.logger)
+        self.openapi_merger = OpenAPIMerger(logger=self.logger)
 
         self.crew_outputs: Dict[str, Any] = {}
 
-    def _extract_agent_context(self, agent_name_str: str) -> Dict[str, Any]:
+    def _extract_agent_context(self, agent_name_str: str, outputs: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Builds an agent's context. outputs defaults to self.crew_outputs; concurrent runs pass the
+        outputs of finished steps instead."""
+        outputs = self.crew_outputs if outputs is None else outputs
         agent_context = {
             "project_name": self.master_context.get("project_name", "Unknown Project"),
             "project_objective": self.master_context.get("project_objective", "No objective specified."),
@@ -76,14 +120,14 @@ class APIDesignCrewRunner:
             analysis_data = self.master_context.get("analysis", {})
             agent_context["domain_models"] = analysis_data.get("domain_models_text")
             agent_context["key_data_requirements"] = analysis_data.get("key_requirements")
-            agent_context["planned_endpoints_output"] = self.crew_outputs.get("endpoint_planner_output", {})
+            agent_context["planned_endpoints_output"] = outputs.get("endpoint_planner_output", {})
         elif agent_name_str == "request_response_designer":
-            agent_context["planned_endpoints_output"] = self.crew_outputs.get("endpoint_planner_output", {})
-            agent_context["available_schemas_output"] = self.crew_outputs.get("schema_designer_output", {})
+            agent_context["planned_endpoints_output"] = outputs.get("endpoint_planner_output", {})
+            agent_context["available_schemas_output"] = outputs.get("schema_designer_output", {})
         elif agent_name_str == "auth_designer":
             arch_data = self.master_context.get("architecture", {})
             agent_context["security_requirements"] = arch_data.get("security_requirements_text")
-            agent_context["planned_endpoints_output"] = self.crew_outputs.get("endpoint_planner_output", {}) # For summary
+            agent_context["planned_endpoints_output"] = outputs.get("endpoint_planner_output", {}) # For summary
         elif agent_name_str == "error_designer":
             analysis_data = self.master_context.get("analysis", {})
             arch_data = self.master_context.get("architecture", {})
@@ -96,6 +140,9 @@ class APIDesignCrewRunner:
         context_for_agent = self._extract_agent_context(agent_name_str)
 
         output_dict = agent_instance.run(context_for_agent)
+        return self._record_agent_output(agent_name_str, output_key, output_dict)
+
+    def _record_agent_output(self, agent_name_str: str, output_key: str, output_dict: Any) -> bool:
         self.crew_outputs[output_key] = output_dict
 
         if isinstance(output_dict, dict) and output_dict.get("error"):
@@ -104,22 +151,83 @@ class APIDesignCrewRunner:
         self.logger.log(f"{agent_name_str} completed successfully.", role="CrewRunner")
         return True
 
+    def _run_request_response_design(self, outputs: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Designs request/response definitions. Large APIs are split into endpoint groups (by tag or
+        resource) that are designed concurrently and merged with OpenAPIMerger, which keeps each
+        LLM call well below the output-token limit.
+        """
+        context = self._extract_agent_context("request_response_designer", outputs)
+        planned = context.get("planned_endpoints_output") or {}
+        endpoints = [ep.model_dump(by_alias=True) if hasattr(ep, "model_dump") else ep
+                     for ep in (planned.get("endpoints") or []) if isinstance(ep, dict) or hasattr(ep, "model_dump")]
+        groups = group_endpoints(endpoints, self.endpoint_group_size) if len(endpoints) > self.endpoint_group_size else []
+        if len(groups) <= 1:
+            return self.request_response_designer.run(context)
+
+        self.logger.log(f"Designing requests/responses for {len(endpoints)} endpoints in {len(groups)} groups...", role="CrewRunner")
+
+        def _design_group(group: List[Dict[str, Any]]) -> Dict[str, Any]:
+            group_context = dict(context)
+            group_context["planned_endpoints_output"] = {**planned, "endpoints": group}
+            return self.request_response_designer.run(group_context)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_parallel_agents, len(groups))), thread_name_prefix="api-group") as executor:
+            group_outputs = list(executor.map(_design_group, groups))
+
+        failed = [(group, output) for group, output in zip(groups, group_outputs) if not isinstance(output, dict) or output.get("error")]
+        if failed:
+            details = "; ".join(
+                f"{[ep.get('path') for ep in group]}: {output.get('error') if isinstance(output, dict) else 'no output'}"
+                for group, output in failed
+            )
+            return {"error": f"Request/response design failed for {len(failed)} of {len(groups)} endpoint groups.",
+                    "agent_name": "request_response_designer", "details": details}
+        return self.openapi_merger.merge_path_maps(group_outputs)
+
     def run(self) -> Dict[str, Any]:
         self.logger.log("APIDesignCrewRunner: Starting generation pipeline...", role="CrewRunner")
         self.crew_outputs = {}
 
+        # (agent name, output key, depends on, callable taking the outputs of finished steps).
+        # Auth and error design don't need the schemas, so they run alongside schema and
+        # request/response design. Outputs are recorded in this order and the pipeline halts at the
+        # first failing agent, exactly as in a sequential run.
+        def _agent_call(agent_instance, agent_name_str):
+            return lambda outputs: agent_instance.run(self._extract_agent_context(agent_name_str, outputs))
+
         pipeline = [
-            (self.endpoint_planner, "endpoint_planner", "endpoint_planner_output"),
-            (self.schema_designer, "schema_designer", "schema_designer_output"),
-            (self.request_response_designer, "request_response_designer", "request_response_designer_output"),
-            (self.auth_designer, "auth_designer", "auth_designer_output"),
-            (self.error_designer, "error_designer", "error_designer_output"),
+            ("endpoint_planner", "endpoint_planner_output", [], _agent_call(self.endpoint_planner, "endpoint_planner")),
+            ("schema_designer", "schema_designer_output", ["endpoint_planner"], _agent_call(self.schema_designer, "schema_designer")),
+            ("request_response_designer", "request_response_designer_output", ["endpoint_planner", "schema_designer"], self._run_request_response_design),
+            ("auth_designer", "auth_designer_output", ["endpoint_planner"], _agent_call(self.auth_designer, "auth_designer")),
+            ("error_designer", "error_designer_output", [], _agent_call(self.error_designer, "error_designer")),
         ]
+        output_keys = {agent_name_str: output_key for agent_name_str, output_key, _, _ in pipeline}
+        finished_outputs: Dict[str, Any] = {}
+
+        def _make_step(agent_name_str, call, depends_on):
+            def _run():
+                self.logger.log(f"Running {agent_name_str}...", role="CrewRunner")
+                return call(dict(finished_outputs))
+            return DagStep(agent_name_str, _run, depends_on=depends_on)
+
+        def _on_complete(step: DagStep, output_dict: Any):
+            finished_outputs[output_keys[step.name]] = output_dict
+
+        def _failed(step: DagStep, output_dict: Any) -> bool:
+            # An error output halts the pipeline at its commit, so its dependents must not start first
+            return isinstance(output_dict, dict) and bool(output_dict.get("error"))
+
+        def _commit(step: DagStep, output_dict: Any) -> bool:
+            if not self._record_agent_output(step.name, output_keys[step.name], output_dict):
+                self.logger.log(f"Pipeline halted due to error in {step.name}.", level="ERROR", role="CrewRunner")
+                return False
+            return True
 
-        for agent_instance, agent_name_str, output_key in pipeline:
-            if not self._run_single_agent(agent_instance, agent_name_str, output_key):
-                self.logger.log(f"Pipeline halted due to error in {agent_name_str}.", level="ERROR", role="CrewRunner")
-                return self.crew_outputs # Return partial outputs with error indication
+        steps = [_make_step(agent_name_str, call, depends_on) for agent_name_str, _, depends_on, call in pipeline]
+        if not DagScheduler(steps, max_workers=self.max_parallel_agents).run(commit=_commit, on_complete=_on_complete, failed=_failed):
+            return self.crew_outputs # Return partial outputs with error indication
 
         self.logger.log("APIDesignCrewRunner: All generation agents completed successfully.", role="CrewRunner")
         return self.crew_outputs
@@ -22,7 +22,29 @@ class BackendSubAgent(Agent):
             self.logger.log(f"BackendSubAgent {self.name} initialized. Using default model selection. Current model: {self.current_model}", self.role)
 
     def run(self, project_context: ProjectContext, crew_inputs: dict = None) -> dict:
+        store, fingerprint, recorded = self._incremental_lookup(project_context, crew_inputs)
+        if recorded is not None:
+            return recorded
+        context_before = project_context.model_dump(mode="json") if store else None
         # This run method structure should be preserved
+        generated_prompt_str = self._build_run_prompt(project_context, crew_inputs)
+        response_content = self._call_model(generated_prompt_str) if not self.tools else self._call_model_with_tools(generated_prompt_str)
+        result = self._parse_response(response_content, project_context)
+        self._incremental_store(store, fingerprint, context_before, project_context, result)
+        return result
+
+    async def arun(self, project_context: ProjectContext, crew_inputs: dict = None) -> dict:
+        store, fingerprint, recorded = self._incremental_lookup(project_context, crew_inputs)
+        if recorded is not None:
+            return recorded
+        context_before = project_context.model_dump(mode="json") if store else None
+        generated_prompt_str = self._build_run_prompt(project_context, crew_inputs)
+        response_content = await self._acall_model(generated_prompt_str) if not self.tools else await self._acall_model_with_tools(generated_prompt_str)
+        result = self._parse_response(response_content, project_context)
+        self._incremental_store(store, fingerprint, context_before, project_context, result)
+        return result
+
+    def _build_run_prompt(self, project_context: ProjectContext, crew_inputs: dict = None) -> str:
         self.logger.log(f"[{self.name}] Executing BackendSubAgent run method with crew_inputs keys: {list(crew_inputs.keys()) if crew_inputs else 'None'}", self.role)
         analysis_data = project_context.analysis.model_dump() if project_context.analysis else {}
         prompt_render_context = {
@@ -39,9 +61,7 @@ class BackendSubAgent(Agent):
             'crew_inputs': crew_inputs if crew_inputs else {}, # Pass along crew_inputs
         }
         prompt_render_context = self._enhance_prompt_context(prompt_render_context, project_context, crew_inputs)
-        generated_prompt_str = get_agent_prompt(self.name, prompt_render_context)
-        response_content = self._call_model(generated_prompt_str) if not self.tools else self._call_model_with_tools(generated_prompt_str)
-        return self._parse_response(response_content, project_context)
+        return get_agent_prompt(self.name, prompt_render_context)
 
     def _enhance_prompt_context(self, context: dict, project_context: ProjectContext, crew_inputs: dict = None) -> dict:
         if crew_inputs is None: crew_inputs = {}
@@ -8,8 +8,11 @@ from utils.general_utils import Logger
 from utils.database import Database
 from prompts.general_prompts import get_agent_prompt
 from utils.context_handler import ProjectContext
+from utils.incremental import PROMPT_CONTEXT_FIELDS
 
 class MobileSubAgent(Agent):
+    INPUT_CONTEXT_FIELDS = PROMPT_CONTEXT_FIELDS + ("api_specs",)
+
     def __init__(self, name, role, logger: Logger, db: Database = None, model_name_override: str = None):
         super().__init__(name, role, logger, db=db)
         if model_name_override:
@@ -21,6 +24,28 @@ class MobileSubAgent(Agent):
             self.logger.log(f"MobileSubAgent {self.name} initialized. Using default model selection. Current model: {self.current_model}", self.role)
 
     def run(self, project_context: ProjectContext, crew_inputs: dict = None) -> dict:
+        store, fingerprint, recorded = self._incremental_lookup(project_context, crew_inputs)
+        if recorded is not None:
+            return recorded
+        context_before = project_context.model_dump(mode="json") if store else None
+        generated_prompt_str = self._build_run_prompt(project_context, crew_inputs)
+        response_content = self._call_model(generated_prompt_str) if not self.tools else self._call_model_with_tools(generated_prompt_str)
+        result = self._parse_response(response_content, project_context)
+        self._incremental_store(store, fingerprint, context_before, project_context, result)
+        return result
+
+    async def arun(self, project_context: ProjectContext, crew_inputs: dict = None) -> dict:
+        store, fingerprint, recorded = self._incremental_lookup(project_context, crew_inputs)
+        if recorded is not None:
+            return recorded
+        context_before = project_context.model_dump(mode="json") if store else None
+        generated_prompt_str = self._build_run_prompt(project_context, crew_inputs)
+        response_content = await self._acall_model(generated_prompt_str) if not self.tools else await self._acall_model_with_tools(generated_prompt_str)
+        result = self._parse_response(response_content, project_context)
+        self._incremental_store(store, fingerprint, context_before, project_context, result)
+        return result
+
+    def _build_run_prompt(self, project_context: ProjectContext, crew_inputs: dict = None) -> str:
         self.logger.log(f"[{self.name}] Executing MobileSubAgent run method with crew_inputs: {list(crew_inputs.keys()) if crew_inputs else 'None'}", self.role)
         analysis_data = project_context.analysis.model_dump() if project_context.analysis else {}
         prompt_render_context = {
@@ -46,10 +71,7 @@ class MobileSubAgent(Agent):
         # This is because their prompts are currently defined there and are not yet integrated into the main AGENT_PROMPTS.
         # This will be reconciled later.
         from prompts.mobile_crew_internal_prompts import get_crew_internal_prompt as get_mobile_prompt
-        generated_prompt_str = get_mobile_prompt(self.name, prompt_render_context)
-
-        response_content = self._call_model(generated_prompt_str) if not self.tools else self._call_model_with_tools(generated_prompt_str)
-        return self._parse_response(response_content, project_context)
+        return get_mobile_prompt(self.name, prompt_render_context)
 
     def _enhance_prompt_context(self, context: dict, project_context: ProjectContext, crew_inputs: dict = None) -> dict:
         if crew_inputs is None: crew_inputs = {}
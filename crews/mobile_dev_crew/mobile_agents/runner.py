@@ -1,7 +1,11 @@
 # crews/mobile_dev_crew/mobile_agents/runner.py
+import copy
+from concurrent.futures import ThreadPoolExecutor
 from utils.general_utils import Logger
 from utils.database import Database
 from utils.context_handler import ProjectContext
+from configs.global_config import MODEL_STRATEGY_CONFIG
+from utils.agent_resources import lazy_sub_agent
 
 # Imports for all 6 mobile sub-agents
 from .ui_structure_designer import UIStructureDesigner
@@ -10,34 +14,60 @@ from .api_binder import APIBinder
 from .state_manager import StateManager
 from .form_validator import FormValidator
 from .test_designer import TestDesigner
+from .screen_shards import split_ui_structure, components_for_screen, merge_component_specs, merge_state_code
 
 class MobileCrewRunner:
-    def __init__(self, logger: Logger, db: Database = None, sub_agent_model_config: dict = None):
+    # The 6 mobile sub-agents, each constructed on first use
+    ui_structure_designer = lazy_sub_agent(UIStructureDesigner, "ui_structure_designer")
+    component_designer = lazy_sub_agent(ComponentDesigner, "component_designer")
+    api_binder = lazy_sub_agent(APIBinder, "api_binder")
+    state_manager = lazy_sub_agent(StateManager, "state_manager")
+    form_validator = lazy_sub_agent(FormValidator, "form_validator")
+    test_designer = lazy_sub_agent(TestDesigner, "test_designer")
+
+    def __init__(self, logger: Logger, db: Database = None, sub_agent_model_config: dict = None, max_parallel_agents: int = None):
         self.logger = logger
         self.db = db
         self.model_config = sub_agent_model_config if sub_agent_model_config else {}
+        # Bounds the per-screen shards that run at once (1 = one screen after another)
+        self.max_parallel_agents = max_parallel_agents or MODEL_STRATEGY_CONFIG.CREW_MAX_PARALLEL_AGENTS
         self.logger.log(f"[MobileCrewRunner] Initializing with model config keys: {list(self.model_config.keys())}", "MobileCrewRunner")
 
-        # Instantiate all 6 mobile sub-agents
-        self.ui_structure_designer = UIStructureDesigner(
-            logger=self.logger, db=self.db, model_name_override=self.model_config.get("ui_structure_designer")
-        )
-        self.component_designer = ComponentDesigner(
-            logger=self.logger, db=self.db, model_name_override=self.model_config.get("component_designer")
-        )
-        self.api_binder = APIBinder(
-            logger=self.logger, db=self.db, model_name_override=self.model_config.get("api_binder")
-        )
-        self.state_manager = StateManager(
-            logger=self.logger, db=self.db, model_name_override=self.model_config.get("state_manager")
-        )
-        self.form_validator = FormValidator(
-            logger=self.logger, db=self.db, model_name_override=self.model_config.get("form_validator")
-        )
-        self.test_designer = TestDesigner(
-            logger=self.logger, db=self.db, model_name_override=self.model_config.get("test_designer")
-        )
-        self.logger.log(f"[MobileCrewRunner] All 6 mobile sub-agents initialized.", "MobileCrewRunner")
+    def _run_sharded(self, agent_name: str, agent, project_context: ProjectContext, shard_inputs: list, merge) -> dict:
+        """
+        Runs agent once per (screen_name, crew_inputs) shard, concurrently, and merges the shard
+        outputs with merge([(screen_name, structured_output), ...]) -> (merged, warnings).
+        Returns a result dict shaped like a single sub-agent run; any failed shard makes it an error.
+        """
+        self.logger.log(f"[MobileCrewRunner] Running {agent_name} for {len(shard_inputs)} screens (up to {self.max_parallel_agents} at a time)...", "MobileCrewRunner")
+
+        def _run_shard(crew_inputs: dict):
+            # Agents keep per-call state (e.g. current_model), so every shard gets its own copy
+            return copy.copy(agent).run(project_context, crew_inputs=crew_inputs)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_parallel_agents, len(shard_inputs))), thread_name_prefix="mobile-shard") as executor:
+            shard_results = list(executor.map(_run_shard, [crew_inputs for _, crew_inputs in shard_inputs]))
+
+        warnings, errors, completed = [], [], []
+        for (screen_name, _), result in zip(shard_inputs, shard_results):
+            if result is None:
+                errors.append(f"screen '{screen_name}': returned None result.")
+                continue
+            shard_warnings = result.get("warnings")
+            if shard_warnings:
+                warnings.extend(f"[{screen_name}] {w}" for w in (shard_warnings if isinstance(shard_warnings, list) else [shard_warnings]))
+            if result.get("status", "unknown") != "complete":
+                errors.append(f"screen '{screen_name}': {result.get('error') or result.get('message', 'failed with unknown error.')}")
+                continue
+            completed.append((screen_name, result.get("structured_output")))
+
+        merged_output, merge_warnings = merge(completed)
+        return {
+            "status": "complete" if not errors else "error",
+            "structured_output": merged_output,
+            "warnings": warnings + merge_warnings,
+            "error": "; ".join(errors) if errors else None,
+        }
 
     def execute(self, project_context: ProjectContext) -> dict:
         self.logger.log(f"[MobileCrewRunner] Starting execution for mobile project: {project_context.project_name}", "MobileCrewRunner")
@@ -99,13 +129,26 @@ class MobileCrewRunner:
         if not _process_agent_result("UIStructureDesigner", ui_structure_result, "ui_structure_output", critical_step=True):
             return {"status": "error", "errors": accumulated_errors, "warnings": accumulated_warnings, "mobile_artifacts": artifacts}
 
+        # Large apps: one ComponentDesigner / StateManager call per screen, run concurrently, so latency
+        # follows the largest screen instead of the whole app. Shards merge back into the usual artifacts.
+        screen_shards = split_ui_structure(artifacts.get("ui_structure_output")) if MODEL_STRATEGY_CONFIG.MOBILE_SHARD_BY_SCREEN else []
+        if len(screen_shards) < MODEL_STRATEGY_CONFIG.MOBILE_SHARD_MIN_SCREENS:
+            screen_shards = []
+
         # 2. ComponentDesigner
-        self.logger.log(f"[MobileCrewRunner] Running ComponentDesigner...", "MobileCrewRunner")
-        component_designer_inputs = {
-            "ui_structure_json": artifacts.get("ui_structure_output")
-            # tech_stack_mobile from project_context
-        }
-        component_designer_result = self.component_designer.run(project_context, crew_inputs=component_designer_inputs)
+        if screen_shards:
+            component_designer_result = self._run_sharded(
+                "ComponentDesigner", self.component_designer, project_context,
+                [(screen_name, {"ui_structure_json": shard}) for screen_name, shard in screen_shards],
+                merge_component_specs,
+            )
+        else:
+            self.logger.log(f"[MobileCrewRunner] Running ComponentDesigner...", "MobileCrewRunner")
+            component_designer_inputs = {
+                "ui_structure_json": artifacts.get("ui_structure_output")
+                # tech_stack_mobile from project_context
+            }
+            component_designer_result = self.component_designer.run(project_context, crew_inputs=component_designer_inputs)
         if not _process_agent_result("ComponentDesigner", component_designer_result, "component_specs_output", critical_step=True):
             return {"status": "error", "errors": accumulated_errors, "warnings": accumulated_warnings, "mobile_artifacts": artifacts}
 
@@ -121,13 +164,23 @@ class MobileCrewRunner:
             pass
 
         # 4. StateManager
-        self.logger.log(f"[MobileCrewRunner] Running StateManager...", "MobileCrewRunner")
-        state_manager_inputs = {
-            "component_designs": artifacts.get("component_specs_output"),
-            "ui_structure_json": artifacts.get("ui_structure_output")
-            # tech_stack_mobile from project_context
-        }
-        state_manager_result = self.state_manager.run(project_context, crew_inputs=state_manager_inputs)
+        if screen_shards:
+            state_manager_result = self._run_sharded(
+                "StateManager", self.state_manager, project_context,
+                [(screen_name, {
+                    "component_designs": components_for_screen(artifacts.get("component_specs_output"), screen_name),
+                    "ui_structure_json": shard,
+                }) for screen_name, shard in screen_shards],
+                merge_state_code,
+            )
+        else:
+            self.logger.log(f"[MobileCrewRunner] Running StateManager...", "MobileCrewRunner")
+            state_manager_inputs = {
+                "component_designs": artifacts.get("component_specs_output"),
+                "ui_structure_json": artifacts.get("ui_structure_output")
+                # tech_stack_mobile from project_context
+            }
+            state_manager_result = self.state_manager.run(project_context, crew_inputs=state_manager_inputs)
         if not _process_agent_result("StateManager", state_manager_result, "state_manager_output", critical_step=False):
             pass
 
@@ -0,0 +1,93 @@
+# crews/mobile_dev_crew/mobile_agents/screen_shards.py
+"""
+Helpers for running mobile sub-agents once per screen and merging the per-screen results.
+A shard is a copy of the UIStructureDesigner output that contains a single screen, plus the
+names of all other screens so navigation targets still make sense.
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def get_screens(ui_structure: Any) -> Optional[List[dict]]:
+    """Returns the screen list of a UI structure, or None if it does not have the expected shape."""
+    if isinstance(ui_structure, str):
+        try:
+            ui_structure = json.loads(ui_structure)
+        except json.JSONDecodeError:
+            return None
+    if not isinstance(ui_structure, dict):
+        return None
+    screens = ui_structure.get("screens")
+    if not isinstance(screens, list) or not all(isinstance(s, dict) and s.get("name") for s in screens):
+        return None
+    return screens
+
+
+def split_ui_structure(ui_structure: Any) -> List[Tuple[str, dict]]:
+    """Splits a UI structure into one (screen_name, ui_structure) shard per screen, in screen order.
+    Returns an empty list if the structure cannot be split."""
+    screens = get_screens(ui_structure)
+    if not screens:
+        return []
+    if isinstance(ui_structure, str):
+        ui_structure = json.loads(ui_structure)
+    shared = {key: value for key, value in ui_structure.items() if key != "screens"}
+    all_names = [screen["name"] for screen in screens]
+    return [
+        (screen["name"], {**shared, "screens": [screen], "all_screen_names": all_names})
+        for screen in screens
+    ]
+
+
+def components_for_screen(component_specs: Any, screen_name: str) -> Any:
+    """The subset of merged component specs used on screen_name (all specs if none declare usage)."""
+    if not isinstance(component_specs, dict):
+        return component_specs
+    used = {
+        name: spec for name, spec in component_specs.items()
+        if isinstance(spec, dict) and screen_name in (spec.get("usage_screens") or [])
+    }
+    return used or component_specs
+
+
+def merge_component_specs(shard_outputs: List[Tuple[str, Any]]) -> Tuple[Dict[str, dict], List[str]]:
+    """Merges per-screen ComponentDesigner outputs ({component_name: spec}) into one dict.
+
+    A component designed for several screens is kept once: the first spec wins, and its
+    usage_screens and properties are extended with those of the later specs.
+    Returns (merged_specs, warnings)."""
+    merged: Dict[str, dict] = {}
+    warnings = []
+    for screen_name, output in shard_outputs:
+        if not isinstance(output, dict):
+            warnings.append(f"ComponentDesigner output for screen '{screen_name}' is not a JSON object; it was skipped in the merge.")
+            continue
+        for component_name, spec in output.items():
+            if not isinstance(spec, dict):
+                spec = {"component_name": component_name, "description": str(spec)}
+            spec = dict(spec)
+            spec["usage_screens"] = list(spec.get("usage_screens") or [])
+            if isinstance(spec.get("properties"), list):
+                spec["properties"] = list(spec["properties"])
+            if screen_name not in spec["usage_screens"]:
+                spec["usage_screens"].append(screen_name)
+            existing = merged.get(component_name)
+            if existing is None:
+                merged[component_name] = spec
+                continue
+            for list_key in ("usage_screens", "properties"):
+                if isinstance(existing.get(list_key), list) and isinstance(spec.get(list_key), list):
+                    existing[list_key].extend(item for item in spec[list_key] if item not in existing[list_key])
+    return merged, warnings
+
+
+def merge_state_code(shard_outputs: List[Tuple[str, Any]]) -> Tuple[str, List[str]]:
+    """Concatenates per-screen StateManager code, one labelled section per screen.
+    Returns (code, warnings) like merge_component_specs."""
+    sections = []
+    for screen_name, output in shard_outputs:
+        if output is None:
+            continue
+        code = output if isinstance(output, str) else json.dumps(output, indent=2, default=str)
+        sections.append(f"// ---- State for screen: {screen_name} ----\n{code.strip()}")
+    return "\n\n".join(sections), []
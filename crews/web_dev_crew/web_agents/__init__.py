@@ -11,6 +11,7 @@ from utils.database import Database # CORRECTED
 from configs.global_config import ModelConfig, GeminiConfig # CORRECTED
 from prompts.general_prompts import get_agent_prompt # ADDED
 from utils.context_handler import ProjectContext # ADDED
+from utils.incremental import PROMPT_CONTEXT_FIELDS
 
 # Relative imports for sub-modules
 from . import api_hook_writer
@@ -26,6 +27,8 @@ from .runner import FrontendCrewRunner
 
 # Base class for frontend sub-agents
 class FrontendSubAgent(Agent):
+    INPUT_CONTEXT_FIELDS = PROMPT_CONTEXT_FIELDS + ("api_specs",)
+
     def __init__(self, name, role, logger: Logger, db: Database = None, model_name_override: str = None):
         super().__init__(name, role, logger, db=db)
         if model_name_override:
@@ -62,6 +65,45 @@ class FrontendSubAgent(Agent):
         # It needs to construct the prompt using get_agent_prompt.
         # The Agent.perform_task() logic is being partially replicated/adapted here.
 
+        store, fingerprint, recorded = self._incremental_lookup(project_context, crew_inputs)
+        if recorded is not None:
+            return recorded
+        context_before = project_context.model_dump(mode="json") if store else None
+        generated_prompt_str = self._build_run_prompt(project_context, crew_inputs)
+
+        self.logger.log(f"[{self.name}] Starting task with model {self.current_model}", self.role)
+
+        if self.tools: # Assuming sub-agents might use tools
+            response_content = self._call_model_with_tools(generated_prompt_str)
+        else:
+            response_content = self._call_model(generated_prompt_str)
+
+        parsed_result = self._parse_response(response_content, project_context)
+        self._incremental_store(store, fingerprint, context_before, project_context, parsed_result)
+        # The 'structured_output' key is populated by _parse_response if successful.
+        return parsed_result
+
+    async def arun(self, project_context: ProjectContext, crew_inputs: dict = None) -> dict:
+        """Async counterpart of run(); same prompt and parsing, awaited model call."""
+        self.logger.log(f"[{self.name}] Executing arun method with inputs: {crew_inputs.keys() if crew_inputs else 'None'}", self.role)
+        store, fingerprint, recorded = self._incremental_lookup(project_context, crew_inputs)
+        if recorded is not None:
+            return recorded
+        context_before = project_context.model_dump(mode="json") if store else None
+        generated_prompt_str = self._build_run_prompt(project_context, crew_inputs)
+
+        self.logger.log(f"[{self.name}] Starting async task with model {self.current_model}", self.role)
+
+        if self.tools:
+            response_content = await self._acall_model_with_tools(generated_prompt_str)
+        else:
+            response_content = await self._acall_model(generated_prompt_str)
+
+        parsed_result = self._parse_response(response_content, project_context)
+        self._incremental_store(store, fingerprint, context_before, project_context, parsed_result)
+        return parsed_result
+
+    def _build_run_prompt(self, project_context: ProjectContext, crew_inputs: dict = None) -> str:
         analysis_data = project_context.analysis.model_dump() if project_context.analysis else {}
         prompt_render_context = {
             'role': self.role,
@@ -87,18 +129,7 @@ class FrontendSubAgent(Agent):
         # Allow specific sub-agents to add more to prompt_render_context
         prompt_render_context = self._enhance_prompt_context(prompt_render_context, project_context, crew_inputs)
 
-        generated_prompt_str = get_agent_prompt(self.name, prompt_render_context) # self.name is sub-agent name
-
-        self.logger.log(f"[{self.name}] Starting task with model {self.current_model}", self.role)
-
-        if self.tools: # Assuming sub-agents might use tools
-            response_content = self._call_model_with_tools(generated_prompt_str)
-        else:
-            response_content = self._call_model(generated_prompt_str)
-
-        parsed_result = self._parse_response(response_content, project_context)
-        # The 'structured_output' key is populated by _parse_response if successful.
-        return parsed_result
+        return get_agent_prompt(self.name, prompt_render_context) # self.name is sub-agent name
 
     def _enhance_prompt_context(self, context: dict, project_context: ProjectContext, crew_inputs: dict = None) -> dict:
         """
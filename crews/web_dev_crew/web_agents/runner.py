@@ -2,6 +2,9 @@ import json # For logging
 from utils.general_utils import Logger # CORRECTED
 from utils.database import Database # CORRECTED
 from utils.context_handler import ProjectContext # CORRECTED
+from utils.dag_scheduler import DagScheduler, DagStep
+from configs.global_config import MODEL_STRATEGY_CONFIG
+from utils.agent_resources import lazy_sub_agent
 
 # Import all sub-agent classes
 from .page_structure_designer import PageStructureDesigner
@@ -15,34 +18,53 @@ from .error_boundary_writer import ErrorBoundaryWriter
 from .test_writer import TestWriter
 
 class FrontendCrewRunner:
-    def __init__(self, logger: Logger, db: Database = None, sub_agent_model_config: dict = None):
+    # (agent name, sub-agent attribute, artifact key, {run() keyword: artifact key it is fed from}).
+    # The dependency graph is derived from the keyword inputs; TestWriter joins every branch.
+    EXECUTION_FLOW = [
+        ("PageStructureDesigner", "page_structure_designer", "page_structure", {}),
+        ("ComponentGenerator", "component_generator", "components", {"page_structure_data": "page_structure"}),
+        ("FormHandler", "form_handler", "forms", {"components_output": "components"}),
+        ("StateManager", "state_manager", "state_management", {"page_structure_data": "page_structure", "components_output": "components"}),
+        ("StyleEngineer", "style_engineer", "styles", {"components_output": "components", "forms_output": "forms"}),
+        ("LayoutDesigner", "layout_designer", "layout", {"page_structure_data": "page_structure", "styles_output": "styles"}),
+        ("APIHookWriter", "api_hook_writer", "api_hooks", {"page_structure_data": "page_structure"}),
+        ("ErrorBoundaryWriter", "error_boundary_writer", "error_boundaries", {"page_structure_data": "page_structure"}),
+        ("TestWriter", "test_writer", "tests", {
+            "page_structure_data": "page_structure", "components_output": "components", "forms_output": "forms",
+            "state_output": "state_management", "styles_output": "styles", "layout_output": "layout",
+            "api_hooks_output": "api_hooks", "error_boundaries_output": "error_boundaries",
+        }),
+    ]
+
+    # Sub-agents, each constructed on first use
+    page_structure_designer = lazy_sub_agent(PageStructureDesigner, "page_structure_designer")
+    component_generator = lazy_sub_agent(ComponentGenerator, "component_generator")
+    api_hook_writer = lazy_sub_agent(APIHookWriter, "api_hook_writer")
+    form_handler = lazy_sub_agent(FormHandler, "form_handler")
+    state_manager = lazy_sub_agent(StateManager, "state_manager")
+    style_engineer = lazy_sub_agent(StyleEngineer, "style_engineer")
+    layout_designer = lazy_sub_agent(LayoutDesigner, "layout_designer")
+    error_boundary_writer = lazy_sub_agent(ErrorBoundaryWriter, "error_boundary_writer")
+    test_writer = lazy_sub_agent(TestWriter, "test_writer")
+
+    def __init__(self, logger: Logger, db: Database = None, sub_agent_model_config: dict = None, max_parallel_agents: int = None):
         """
-        Initializes the FrontendCrewRunner and all its sub-agents.
+        Initializes the FrontendCrewRunner; sub-agents are constructed the first time they run.
         sub_agent_model_config is a dictionary like:
         { "page_structure_designer": "model_name_for_psd", ... }
+        max_parallel_agents bounds how many independent sub-agents run at once (1 = sequential).
         """
         self.logger = logger
         self.db = db
         self.model_config = sub_agent_model_config if sub_agent_model_config else {}
+        self.max_parallel_agents = max_parallel_agents or MODEL_STRATEGY_CONFIG.CREW_MAX_PARALLEL_AGENTS
 
         self.logger.log(f"[FrontendCrewRunner] Initializing with model config: {json.dumps(self.model_config)}", "FrontendCrewRunner")
 
-        # Instantiate all sub-agents, passing logger, db, and specific model overrides
-        self.page_structure_designer = PageStructureDesigner(logger, db, model_name_override=self.model_config.get("page_structure_designer"))
-        self.component_generator = ComponentGenerator(logger, db, model_name_override=self.model_config.get("component_generator"))
-        self.api_hook_writer = APIHookWriter(logger, db, model_name_override=self.model_config.get("api_hook_writer"))
-        self.form_handler = FormHandler(logger, db, model_name_override=self.model_config.get("form_handler"))
-        self.state_manager = StateManager(logger, db, model_name_override=self.model_config.get("state_manager"))
-        self.style_engineer = StyleEngineer(logger, db, model_name_override=self.model_config.get("style_engineer"))
-        self.layout_designer = LayoutDesigner(logger, db, model_name_override=self.model_config.get("layout_designer"))
-        self.error_boundary_writer = ErrorBoundaryWriter(logger, db, model_name_override=self.model_config.get("error_boundary_writer"))
-        self.test_writer = TestWriter(logger, db, model_name_override=self.model_config.get("test_writer"))
-
-        self.logger.log("[FrontendCrewRunner] All sub-agents initialized.", "FrontendCrewRunner")
-
     def execute(self, project_context: ProjectContext) -> dict:
         """
-        Executes the frontend construction crew sequentially, passing outputs explicitly.
+        Executes the frontend construction crew, passing outputs explicitly. Independent branches
+        run concurrently (up to max_parallel_agents) and join before TestWriter.
         Returns a dictionary with status, errors, warnings, and aggregated artifacts.
         """
         self.logger.log(f"[FrontendCrewRunner] Starting execution for project: {project_context.project_name}", "FrontendCrewRunner")
@@ -82,65 +104,39 @@ class FrontendCrewRunner:
 
         # --- Sub-Agent Execution Flow ---
         # Each agent's 'run' method returns a dict: {"status": ..., "structured_output": ..., "errors": ..., "warnings": ...}
-
-        # 1. Page Structure Designer
-        psd_result = self.page_structure_designer.run(project_context)
-        _process_agent_result("PageStructureDesigner", psd_result, "page_structure")
-        if psd_result.get("status") != "complete": # Critical first step
-            self.logger.log("Halting crew execution: PageStructureDesigner failed.", "FrontendCrewRunner", level="ERROR")
+        # Steps run as soon as the artifacts feeding their run(...) keyword inputs exist; results are
+        # processed in this order, so errors and artifacts match a sequential run.
+        step_specs = {step[0]: step for step in self.EXECUTION_FLOW}
+        producers = {artifact_key: name for name, _, artifact_key, _ in self.EXECUTION_FLOW}
+        outputs = {} # artifact key -> structured_output of a finished step
+
+        def _make_step(agent_name, agent_attr, run_inputs):
+            def _run():
+                kwargs = {kwarg: outputs.get(source) for kwarg, source in run_inputs.items()}
+                if agent_name == "TestWriter": # Ensure all data passed is what TestWriter expects (or {} if a step failed to produce output)
+                    kwargs = {kwarg: value if value else {} for kwarg, value in kwargs.items()}
+                return getattr(self, agent_attr).run(project_context, **kwargs)
+            depends_on = sorted({producers[source] for source in run_inputs.values()}, key=list(step_specs).index)
+            return DagStep(agent_name, _run, depends_on=depends_on)
+
+        steps = [_make_step(name, agent_attr, run_inputs) for name, agent_attr, _, run_inputs in self.EXECUTION_FLOW]
+
+        def _on_complete(step: DagStep, result: dict):
+            outputs[step_specs[step.name][2]] = result.get("structured_output")
+
+        def _failed(step: DagStep, result: dict) -> bool:
+            # Dependents of a failed sub-agent wait for its commit (which halts the crew if it was critical)
+            return result.get("status") != "complete"
+
+        def _commit(step: DagStep, result: dict) -> bool:
+            _process_agent_result(step.name, result, step_specs[step.name][2])
+            if step.name == "PageStructureDesigner" and result.get("status") != "complete": # Critical first step
+                self.logger.log("Halting crew execution: PageStructureDesigner failed.", "FrontendCrewRunner", level="ERROR")
+                return False
+            return True
+
+        if not DagScheduler(steps, max_workers=self.max_parallel_agents).run(commit=_commit, on_complete=_on_complete, failed=_failed):
             return {"status": "error", "errors": accumulated_errors, "warnings": accumulated_warnings, "frontend_artifacts": artifacts}
-        page_structure_data = psd_result.get("structured_output")
-
-        # 2. Component Generator
-        cg_result = self.component_generator.run(project_context, page_structure_data=page_structure_data)
-        _process_agent_result("ComponentGenerator", cg_result, "components")
-        components_data = cg_result.get("structured_output")
-        # Allow continuing even if some components fail, to gather more results/errors
-
-        # 3. Form Handler
-        fh_result = self.form_handler.run(project_context, components_output=components_data)
-        _process_agent_result("FormHandler", fh_result, "forms")
-        forms_data = fh_result.get("structured_output")
-
-        # 4. State Manager
-        sm_result = self.state_manager.run(project_context, page_structure_data=page_structure_data, components_output=components_data)
-        _process_agent_result("StateManager", sm_result, "state_management")
-        state_data = sm_result.get("structured_output")
-
-        # 5. Style Engineer
-        se_result = self.style_engineer.run(project_context, components_output=components_data, forms_output=forms_data)
-        _process_agent_result("StyleEngineer", se_result, "styles")
-        styles_data = se_result.get("structured_output")
-
-        # 6. Layout Designer
-        ld_result = self.layout_designer.run(project_context, page_structure_data=page_structure_data, styles_output=styles_data)
-        _process_agent_result("LayoutDesigner", ld_result, "layout")
-        layout_data = ld_result.get("structured_output")
-
-        # 7. API Hook Writer
-        ahw_result = self.api_hook_writer.run(project_context, page_structure_data=page_structure_data)
-        _process_agent_result("APIHookWriter", ahw_result, "api_hooks")
-        api_hooks_data = ahw_result.get("structured_output")
-
-        # 8. Error Boundary Writer
-        ebw_result = self.error_boundary_writer.run(project_context, page_structure_data=page_structure_data)
-        _process_agent_result("ErrorBoundaryWriter", ebw_result, "error_boundaries")
-        error_boundaries_data = ebw_result.get("structured_output")
-
-        # 9. Test Writer (depends on all previous artifacts)
-        # Ensure all data passed is what TestWriter expects (or None if a step failed to produce output)
-        tw_result = self.test_writer.run(
-            project_context,
-            page_structure_data=page_structure_data if page_structure_data else {},
-            components_output=components_data if components_data else {},
-            forms_output=forms_data if forms_data else {},
-            state_output=state_data if state_data else {},
-            styles_output=styles_data if styles_data else {},
-            layout_output=layout_data if layout_data else {},
-            api_hooks_output=api_hooks_data if api_hooks_data else {},
-            error_boundaries_output=error_boundaries_data if error_boundaries_data else {}
-        )
-        _process_agent_result("TestWriter", tw_result, "tests")
 
         self.logger.log(f"[FrontendCrewRunner] Execution finished. Overall status: {overall_status}", "FrontendCrewRunner")
         return {
@@ -6,26 +6,23 @@ import builtins
 from pathlib import Path # Added
 import re # Added re
 import traceback # Added for full stack trace logging
+import argparse
 from dotenv import load_dotenv
-# Import numpy and time if you were to use them globally!
-import numpy as np
 builtins.time = time
 #Import pydantic
 from pydantic import ValidationError
 load_dotenv()
-from agents.base_agent import (
-    ProjectAnalyzer, Planner, Architect, APIDesigner,
-    CodeWriter, FrontendBuilder, MobileDeveloper,
-    Tester, Debugger)
 from utils.general_utils import Logger, DEEPSEEK_TIMEOUT # DEEPSEEK_TIMEOUT might be unused now
-from utils.local_llm_client import LocalLLMClient # CORRECTED
 from utils.database import Database
-from prompts.general_prompts import get_agent_prompt
-from utils.tools import ToolKit, TOOL_DESCRIPTIONS
+from utils.tools import ToolKit
 from utils.models import AgentOutput, ApprovedTechStack, TechProposal # Added ApprovedTechStack, TechProposal
-from configs.global_config import GeminiConfig, ModelConfig, AGENT_SPECIALIZATIONS # Added AGENT_SPECIALIZATIONS
-from utils.context_handler import ProjectContext, TechStack, load_context, save_context, AnalysisOutput, PlatformRequirements # Added TechStack, AnalysisOutput, PlatformRequirements
-from typing import List, Dict, Any # For type hinting
+from configs.global_config import GeminiConfig, ModelConfig, AGENT_SPECIALIZATIONS, MODEL_STRATEGY_CONFIG # Added AGENT_SPECIALIZATIONS
+from utils.context_handler import ProjectContext, TechStack, load_context, save_context, AnalysisOutput, PlatformRequirements, merge_context_branches # Added TechStack, AnalysisOutput, PlatformRequirements
+from utils.dag_scheduler import DagScheduler, DagStep, without_steps
+from utils.run_journal import RunJournal, RunJournalConfig, context_fingerprint
+from utils.incremental import get_output_store
+from utils.agent_resources import LazyAgents, get_local_llm_client, get_tool_descriptions
+from typing import List, Dict, Any, Optional, Callable # For type hinting
 
 # Define Context File Path
 CONTEXT_JSON_FILE = Path("project_context.json") # Added
@@ -43,41 +40,75 @@ class TaskMaster:
         "debugger": ["generate_ctags", "search_ctags", "get_symbol_context", "read_file", "write_file", "patch_file", "lint_file", "run_command", "search_in_files", "analyze_code"]
     }
 
+    AGENT_CLASSES = {
+        "project_analyzer": "ProjectAnalyzer",
+        "planner": "Planner",
+        "architect": "Architect",
+        "api_designer": "APIDesigner",
+        "code_writer": "CodeWriter",
+        "frontend_builder": "FrontendBuilder",
+        "mobile_developer": "MobileDeveloper",
+        "tester": "Tester",
+        "debugger": "Debugger"
+    }
+
+    # Workflow graphs: agent -> agents whose output it needs, listed in sequential order.
+    # Agents whose dependencies are done run concurrently (see _run_workflow_graph).
+    # tester depends on every code-producing agent of the template, so it tests all of their output, as in
+    # a sequential run. frontend_builder and mobile_developer both overwrite current_code_snippet; the
+    # later-declared one's value is kept, as sequentially (see SCRATCH_FIELDS in utils/context_handler.py).
     WORKFLOW_TEMPLATES = {
-        "backend": ["planner", "architect", "api_designer", "code_writer", "tester"],
-        "web": ["planner", "architect", "api_designer", "code_writer", "frontend_builder", "tester"],
-        "mobile": ["planner", "architect", "api_designer", "code_writer", "frontend_builder", "mobile_developer", "tester"],
-        "fullstack": ["planner", "architect", "api_designer", "code_writer", "frontend_builder", "mobile_developer", "tester"]
+        "backend": {"planner": [], "architect": ["planner"], "api_designer": ["architect"], "code_writer": ["api_designer"], "tester": ["code_writer"]},
+        "web": {"planner": [], "architect": ["planner"], "api_designer": ["architect"], "code_writer": ["api_designer"],
+                "frontend_builder": ["api_designer", "code_writer"], "tester": ["code_writer", "frontend_builder"]},
+        "mobile": {"planner": [], "architect": ["planner"], "api_designer": ["architect"], "code_writer": ["api_designer"],
+                   "frontend_builder": ["api_designer", "code_writer"], "mobile_developer": ["api_designer", "code_writer"],
+                   "tester": ["code_writer", "frontend_builder", "mobile_developer"]},
+        "fullstack": {"planner": [], "architect": ["planner"], "api_designer": ["architect"], "code_writer": ["api_designer"],
+                      "frontend_builder": ["api_designer", "code_writer"], "mobile_developer": ["api_designer", "code_writer"],
+                      "tester": ["code_writer", "frontend_builder", "mobile_developer"]}
     }
 
     def __init__(self):
         self.logger = Logger()
         # self.deepseek = LocalLLMClient(default_timeout=DEEPSEEK_TIMEOUT) # OLD Instantiation
-        self.deepseek = LocalLLMClient(logger=self.logger) # CORRECTED Instantiation
+        self.deepseek = get_local_llm_client(self.logger) # Shared with the agents
         self.db = Database()  # Database instance for TaskMaster
         self.tool_kit = ToolKit(logger=self.logger, auto_lint=True, db=self.db) # DB here
+        self.journal: Optional[RunJournal] = None # Journal of the current start_workflow run (see _run_step)
+        self.context_file = CONTEXT_JSON_FILE
+        self.output_dir = Path("outputs")
+        self.projects_dir = Path("projects") # Generated project code, one directory per project
+        # Optional callback receiving progress events ({"event": ..., "step": ..., "time": ...}), e.g. the service's event stream
+        self.event_listener: Optional[Callable[[Dict[str, Any]], None]] = None
 
-        self.agents = {
-            "project_analyzer": ProjectAnalyzer(self.logger, db = self.db),
-            "planner": Planner(self.logger, db = self.db),
-            "architect": Architect(self.logger, db = self.db),
-            "api_designer": APIDesigner(self.logger, db = self.db),
-            "code_writer": CodeWriter(self.logger, db = self.db),
-            "frontend_builder": FrontendBuilder(self.logger, db = self.db),
-            "mobile_developer": MobileDeveloper(self.logger, db = self.db),
-            "tester": Tester(self.logger, db = self.db),
-            "debugger": Debugger(self.logger, db = self.db)
-        }
-
-        for agent_name, agent_instance in self.agents.items():
-            tools_for_agent = self.TOOL_MAPPING.get(agent_name, [])
-            agent_instance.tool_kit = self.tool_kit
-            agent_instance.tools = [TOOL_DESCRIPTIONS[t] for t in tools_for_agent if t in TOOL_DESCRIPTIONS]
-            agent_instance.db = self.db
-            self.logger.log(f"Assigned tools to {agent_name}: {[t['name'] for t in agent_instance.tools]}")
+        # Agents are constructed the first time a workflow step (or the tech council) asks for them
+        self.agents = LazyAgents(
+            {name: (lambda name=name: self._build_agent(name)) for name in self.AGENT_CLASSES},
+            on_build=self._setup_agent
+        )
 
         self.logger.log("TaskMaster initialized with dynamic workflows")
 
+    def _build_agent(self, agent_name: str):
+        # agents.base_agent (and with it requests, numpy and the prompt templates) is imported with the first agent
+        from agents import base_agent
+        return getattr(base_agent, self.AGENT_CLASSES[agent_name])(self.logger, db = self.db)
+
+    def _setup_agent(self, agent_name: str, agent_instance):
+        agent_instance.tool_kit = self.tool_kit
+        agent_instance.tools = get_tool_descriptions(self.TOOL_MAPPING.get(agent_name, []))
+        agent_instance.db = self.db
+        self.logger.log(f"Assigned tools to {agent_name}: {[t['name'] for t in agent_instance.tools]}")
+
+    def _council_agents(self, platform_requirements) -> List[Any]:
+        """Agents that validate the approved stack: the architect, plus the mobile developer for iOS/Android targets.
+        Looked up by name so only these are built (iterating self.agents would construct every agent)."""
+        names = ["architect"]
+        if platform_requirements.ios or platform_requirements.android:
+            names.append("mobile_developer")
+        return [self.agents[name] for name in names if name in self.agents]
+
     def run_tech_council_negotiation(self, project_context: ProjectContext) -> ProjectContext:
         self.logger.log("Starting Tech Council Negotiation phase...", "TaskMaster")
         if not project_context.platform_requirements:
@@ -231,15 +262,7 @@ class TaskMaster:
             self.logger.log("Tech Council: Cannot perform consensus locking: approved_tech_stack or platform_requirements missing.", "TaskMaster", level="ERROR")
             project_context.decision_rationale["consensus"] = "Skipped: Missing approved_tech_stack or platform_requirements."
         else:
-            key_agent_roles_to_consult = ["architect"]
-            if project_context.platform_requirements.ios or project_context.platform_requirements.android:
-                key_agent_roles_to_consult.append("mobile developer")
-            agents_to_consult_instances = []
-            for role_keyword in key_agent_roles_to_consult:
-                for agent_instance in self.agents.values():
-                    if role_keyword in agent_instance.role.lower():
-                        if agent_instance not in agents_to_consult_instances:
-                             agents_to_consult_instances.append(agent_instance)
+            agents_to_consult_instances = self._council_agents(project_context.platform_requirements)
             if not agents_to_consult_instances:
                  self.logger.log("Tech Council: No specific validating agents found for consensus. Defaulting to approval (or review by human).", "TaskMaster", level="WARNING")
                  project_context.decision_rationale["consensus"] = "Conditionally Achieved (No specific AI validators for this configuration)."
@@ -285,8 +308,45 @@ class TaskMaster:
         self.logger.log("Tech Council Negotiation phase finished.", "TaskMaster")
         return project_context
 
-    def start_workflow(self, user_input):
-        project_context = load_context(CONTEXT_JSON_FILE)
+    def use_work_dir(self, work_dir: Optional[Path] = None):
+        """
+        Points the next runs at their own directory: its project_context.json, outputs/ and the files the
+        tools write, including projects/. Lets several runs (e.g. queued jobs, see utils/job_queue.py) share one machine without
+        overwriting each other's context. None restores the defaults (the current directory).
+        """
+        if work_dir is None:
+            self.context_file = CONTEXT_JSON_FILE
+            self.output_dir = Path("outputs")
+            self.projects_dir = Path("projects")
+            self.tool_kit.project_root = Path(".").resolve()
+            return
+        work_dir = Path(work_dir)
+        work_dir.mkdir(parents=True, exist_ok=True)
+        self.context_file = work_dir / CONTEXT_JSON_FILE.name
+        self.output_dir = work_dir / "outputs"
+        # Under the tool root, so tool writes to current_dir pass ToolKit._validate_path
+        self.projects_dir = work_dir / "projects"
+        self.tool_kit.project_root = work_dir.resolve()
+
+    def _emit(self, event: str, **fields):
+        if self.event_listener is None:
+            return
+        try:
+            self.event_listener({"event": event, "time": time.time(), **fields})
+        except Exception as e:
+            self.logger.log(f"Progress event listener failed on {event}: {e}", "TaskMaster", level="WARNING")
+
+    def start_workflow(self, user_input, resume_run_id: Optional[str] = None):
+        if resume_run_id:
+            self.journal = RunJournal.load(resume_run_id)
+            user_input = user_input or self.journal.user_input
+            self.logger.log(f"Resuming run {resume_run_id}. Journal: {self.journal.summary()}", "TaskMaster")
+        elif RunJournalConfig.ENABLED:
+            self.journal = RunJournal.create(user_input)
+            self.logger.log(f"Run id: {self.journal.run_id} (continue an interrupted run with --resume {self.journal.run_id})", "TaskMaster")
+        else:
+            self.journal = None
+        project_context = load_context(self.context_file)
         if not project_context.objective and user_input:
             project_context.objective = user_input
             self.logger.log(f"Objective set from user input: {user_input}", "TaskMaster")
@@ -414,15 +474,7 @@ class TaskMaster:
             self.logger.log("Cannot perform consensus locking: approved_tech_stack or platform_requirements missing.", "TaskMaster", level="ERROR")
             project_context.decision_rationale["consensus"] = "Skipped due to missing data."
         else:
-            key_agent_roles_to_consult = ["architect"]
-            if project_context.platform_requirements.ios or project_context.platform_requirements.android:
-                key_agent_roles_to_consult.append("mobile developer")
-            agents_to_consult_instances = []
-            for role_keyword in key_agent_roles_to_consult:
-                for agent_instance in self.agents.values():
-                    if role_keyword in agent_instance.role.lower():
-                        if agent_instance not in agents_to_consult_instances:
-                             agents_to_consult_instances.append(agent_instance)
+            agents_to_consult_instances = self._council_agents(project_context.platform_requirements)
             if not agents_to_consult_instances:
                  self.logger.log("No specific validating agents found for consensus. Defaulting to approval.", "TaskMaster", level="WARNING")
                  project_context.decision_rationale["consensus"] = "Achieved (no specific validators configured for this setup)."
@@ -457,8 +509,7 @@ class TaskMaster:
         project_name = re.sub(r'[-\s]+', '_', sanitized_objective_for_name).lower()
         if not project_name:
             project_name = "unnamed_ai_project"
-        project_output_base_dir = Path("projects")
-        project_specific_dir = project_output_base_dir / project_name
+        project_specific_dir = self.projects_dir / project_name
         project_specific_dir.mkdir(parents=True, exist_ok=True)
         self.logger.log(f"Project name: '{project_name}', Output directory: '{project_specific_dir}'", "TaskMaster")
         user_input_lower = user_input.lower()
@@ -516,14 +567,15 @@ class TaskMaster:
             platform_requirements=PlatformRequirements()
         )
         self.logger.log(f"Initial project context: {project_context.model_dump_json(indent=2)}", "TaskMaster")
-        save_context(project_context, CONTEXT_JSON_FILE)
+        save_context(project_context, self.context_file)
         self.logger.log(f"Fresh project context initialized and saved for '{project_name}'.", "TaskMaster")
         current_workflow_data = {
             "user_input": user_input,
             "start_time": time.time()
         }
-        current_workflow_data, project_context = self.delegate("project_analyzer", current_workflow_data, project_context)
-        save_context(project_context, CONTEXT_JSON_FILE)
+        self._emit("workflow_started", project_name=project_name, run_id=self.journal.run_id if self.journal else None)
+        current_workflow_data, project_context = self._run_step("project_analyzer", self._delegate_to("project_analyzer"), current_workflow_data, project_context)
+        save_context(project_context, self.context_file)
         if current_workflow_data.get("error"):
              self.logger.log(f"Workflow halted after ProjectAnalyzer due to error: {current_workflow_data.get('error')}", "TaskMaster", level="ERROR")
         elif not project_context.analysis or not project_context.platform_requirements:
@@ -539,8 +591,8 @@ class TaskMaster:
                     proposals_before_arch = {c: [p.model_dump() for p in pl] for c, pl in project_context.tech_proposals.items()} if project_context.tech_proposals else {}
                     self.logger.log(f"Before Architect (pre-council) run. Tech proposals so far: {json.dumps(proposals_before_arch, indent=2)}", "TaskMaster")
                     self.logger.log(f"Delegating to pre-council agent: {agent_name_pre_council}", "TaskMaster")
-                    current_workflow_data, project_context = self.delegate(agent_name_pre_council, current_workflow_data, project_context)
-                    save_context(project_context, CONTEXT_JSON_FILE)
+                    current_workflow_data, project_context = self._run_step(agent_name_pre_council, self._delegate_to(agent_name_pre_council), current_workflow_data, project_context)
+                    save_context(project_context, self.context_file)
                     proposals_after_arch = {c: [p.model_dump() for p in pl] for c, pl in project_context.tech_proposals.items()} if project_context.tech_proposals else {}
                     self.logger.log(f"After Architect (pre-council) run. Tech proposals now: {json.dumps(proposals_after_arch, indent=2)}", "TaskMaster")
                     if current_workflow_data.get("error"):
@@ -553,8 +605,8 @@ class TaskMaster:
                     proposals_before_mob = {c: [p.model_dump() for p in pl] for c, pl in project_context.tech_proposals.items()} if project_context.tech_proposals else {}
                     self.logger.log(f"Before MobileDeveloper (pre-council) run. Tech proposals so far: {json.dumps(proposals_before_mob, indent=2)}", "TaskMaster")
                     self.logger.log("Mobile platform detected, delegating to MobileDeveloper pre-council.", "TaskMaster")
-                    current_workflow_data, project_context = self.delegate("mobile_developer", current_workflow_data, project_context)
-                    save_context(project_context, CONTEXT_JSON_FILE)
+                    current_workflow_data, project_context = self._run_step("mobile_developer_pre_council", self._delegate_to("mobile_developer"), current_workflow_data, project_context)
+                    save_context(project_context, self.context_file)
                     proposals_after_mob = {c: [p.model_dump() for p in pl] for c, pl in project_context.tech_proposals.items()} if project_context.tech_proposals else {}
                     self.logger.log(f"After MobileDeveloper (pre-council) run. Tech proposals now: {json.dumps(proposals_after_mob, indent=2)}", "TaskMaster")
                     if current_workflow_data.get("error"):
@@ -564,8 +616,10 @@ class TaskMaster:
             if not current_workflow_data.get("error"):
                 final_proposals_for_council = {c: [p.model_dump() for p in pl] for c, pl in project_context.tech_proposals.items()} if project_context.tech_proposals else {}
                 self.logger.log(f"Entering Tech Council Negotiation. Final tech proposals collected: {json.dumps(final_proposals_for_council, indent=2)}", "TaskMaster")
-                project_context = self.run_tech_council_negotiation(project_context)
-                save_context(project_context, CONTEXT_JSON_FILE)
+                current_workflow_data, project_context = self._run_step(
+                    "tech_council", lambda data, context: (data, self.run_tech_council_negotiation(context)), current_workflow_data, project_context
+                )
+                save_context(project_context, self.context_file)
                 self.logger.log("Tech Council negotiation complete. Updated context saved.", "TaskMaster")
                 if project_context.decision_rationale.get("consensus") == "Failed" or \
                    project_context.decision_rationale.get("dependency_checks", {}).get("conflicts"):
@@ -579,23 +633,15 @@ class TaskMaster:
                 else:
                     self.logger.log("Tech Council decisions accepted. Proceeding with main agent workflow.", "TaskMaster")
                     project_type = project_context.analysis.project_type_confirmed if project_context.analysis and project_context.analysis.project_type_confirmed else project_context.project_type
-                    base_workflow_steps = self.WORKFLOW_TEMPLATES.get(project_type, self.WORKFLOW_TEMPLATES["fullstack"])
+                    base_workflow_graph = self.WORKFLOW_TEMPLATES.get(project_type, self.WORKFLOW_TEMPLATES["fullstack"])
                     agents_already_run = ["project_analyzer", "architect"]
                     if project_context.platform_requirements and (project_context.platform_requirements.ios or project_context.platform_requirements.android):
                         agents_already_run.append("mobile_developer")
-                    remaining_workflow_steps = [step for step in base_workflow_steps if step not in agents_already_run]
-                    workflow = remaining_workflow_steps
-                    self.logger.log(f"Selected workflow (remaining steps): {workflow}", "TaskMaster")
+                    # Agents that already ran are dropped; their dependents inherit their dependencies (api_designer still waits for planner)
+                    workflow = without_steps(base_workflow_graph, agents_already_run)
+                    self.logger.log(f"Selected workflow (remaining steps): {list(workflow)}", "TaskMaster")
                     if workflow:
-                        for agent_name in workflow:
-                            if current_workflow_data.get("error"):
-                                self.logger.log(f"Halting main workflow before agent {agent_name} due to prior error.", "TaskMaster", level="WARNING")
-                                break
-                            current_workflow_data, project_context = self.delegate(agent_name, current_workflow_data, project_context)
-                            save_context(project_context, CONTEXT_JSON_FILE)
-                            if current_workflow_data.get("error"):
-                                self.logger.log(f"Error at agent {agent_name}: {current_workflow_data['error']}", "TaskMaster", level="ERROR")
-                                break
+                        current_workflow_data, project_context = self._run_workflow_graph(workflow, current_workflow_data, project_context)
                     else:
                         self.logger.log("No remaining workflow steps after pre-council agents and filtering.", "TaskMaster", level="INFO")
             else:
@@ -604,11 +650,21 @@ class TaskMaster:
             if last_agent_status != "complete" and current_workflow_data.get("current_agent_name") == "code_writer":
                 self.logger.log(f"CodeWriter agent status: {last_agent_status}. Launching debugger...", "TaskMaster")
                 project_context.error_report = f"Issues detected after {current_workflow_data.get('current_agent_name', 'unknown agent')}. Errors: {current_workflow_data.get('errors')}"
-                save_context(project_context, CONTEXT_JSON_FILE)
-                current_workflow_data, project_context = self.delegate("debugger", current_workflow_data, project_context)
-                save_context(project_context, CONTEXT_JSON_FILE)
+                save_context(project_context, self.context_file)
+                current_workflow_data, project_context = self._run_step("debugger", self._delegate_to("debugger"), current_workflow_data, project_context)
+                save_context(project_context, self.context_file)
 
         current_workflow_data["end_time"] = time.time()
+        self._emit("workflow_finished", status="error" if current_workflow_data.get("error") else "completed",
+                   error=current_workflow_data.get("error"))
+        output_store = get_output_store()
+        if output_store:
+            incremental_stats = output_store.stats()
+            self.logger.log(f"Incremental execution: {incremental_stats['hits']} agent runs reused, {incremental_stats['misses']} executed", "TaskMaster")
+            current_workflow_data["incremental"] = incremental_stats
+        if self.journal:
+            self.journal.finish("error" if current_workflow_data.get("error") else "completed")
+            current_workflow_data["run_id"] = self.journal.run_id
         final_output_file = self._save_outputs(current_workflow_data, project_context)
 
         if final_output_file and Path(final_output_file).exists():
@@ -631,6 +687,79 @@ class TaskMaster:
             current_workflow_data['api_specs'] = project_context.api_specs
         return current_workflow_data
 
+    def _run_workflow_graph(self, workflow: Dict[str, List[str]], current_workflow_data: dict, project_context: ProjectContext) -> tuple[dict, ProjectContext]:
+        """
+        Runs the workflow graph, starting each agent once the agents it depends on are done, with up to
+        WORKFLOW_MAX_PARALLEL_AGENTS at a time. Every agent works on its own copy of the context, taken
+        right after its last dependency was merged, so what it sees does not depend on timing. Results are
+        merged back (merge_context_branches) and saved in workflow order, and the workflow halts at the
+        first agent that reports an error, as in a sequential run.
+        """
+        steps = list(workflow)
+        initial_context = project_context.model_copy(deep=True)
+        snapshots: Dict[str, ProjectContext] = {} # agent -> context right after its result was merged
+        base_contexts: Dict[str, ProjectContext] = {}
+
+        def _make_step(agent_name: str) -> DagStep:
+            depends_on = workflow[agent_name]
+            def _run():
+                base = snapshots[max(depends_on, key=steps.index)] if depends_on else initial_context
+                base_contexts[agent_name] = base
+                return self._run_step(agent_name, self._delegate_to(agent_name), {}, base.model_copy(deep=True))
+            return DagStep(agent_name, _run, depends_on=depends_on)
+
+        def _commit(step: DagStep, result: tuple) -> bool:
+            nonlocal project_context
+            step_workflow_data, branch_context = result
+            project_context, conflicts = merge_context_branches(
+                base_contexts[step.name], [("workflow", project_context), (step.name, branch_context)]
+            )
+            if conflicts:
+                self.logger.log(f"Context from {step.name} overrode concurrent changes: {conflicts}", "TaskMaster", level="WARNING")
+            snapshots[step.name] = project_context.model_copy(deep=True)
+            save_context(project_context, self.context_file)
+            current_workflow_data.update(step_workflow_data)
+            if step_workflow_data.get("error"):
+                self.logger.log(f"Error at agent {step.name}: {step_workflow_data['error']}", "TaskMaster", level="ERROR")
+                return False
+            return True
+
+        scheduler = DagScheduler([_make_step(agent_name) for agent_name in steps], max_workers=MODEL_STRATEGY_CONFIG.WORKFLOW_MAX_PARALLEL_AGENTS)
+        if not scheduler.run(commit=_commit, start_after_commit=True):
+            self.logger.log("Halting main workflow due to prior error.", "TaskMaster", level="WARNING")
+        return current_workflow_data, project_context
+
+    def _delegate_to(self, agent_name: str) -> Callable[[dict, ProjectContext], tuple]:
+        return lambda current_workflow_data, project_context: self.delegate(agent_name, current_workflow_data, project_context)
+
+    def _run_step(self, step_name: str, run: Callable[[dict, ProjectContext], tuple], current_workflow_data: dict,
+                  project_context: ProjectContext) -> tuple[dict, ProjectContext]:
+        """
+        Runs one workflow step through the run journal. A step the journal already has as complete for
+        the same input context (a resumed run) is restored from it instead of being executed again;
+        otherwise the step runs and its status, outputs and resulting context are recorded.
+        """
+        fingerprint = None
+        if self.journal:
+            fingerprint = context_fingerprint(step_name, project_context.model_dump())
+            entry = self.journal.completed_step(step_name, fingerprint)
+            if entry:
+                self.logger.log(f"Step {step_name} already completed in run {self.journal.run_id}. Restoring its outputs.", "TaskMaster")
+                self._emit("step_restored", step=step_name)
+                current_workflow_data.update(entry["outputs"])
+                return current_workflow_data, ProjectContext.model_validate(entry["context"])
+
+        started_at = time.time()
+        self._emit("step_started", step=step_name)
+        current_workflow_data, project_context = run(current_workflow_data, project_context)
+        status = "error" if current_workflow_data.get("error") else "complete"
+        self._emit("step_finished", step=step_name, status=status, duration=time.time() - started_at,
+                   error=current_workflow_data.get("error"))
+        if self.journal:
+            outputs = {k: v for k, v in current_workflow_data.items() if k not in ("start_time", "user_input")}
+            self.journal.record_step(step_name, fingerprint, status, outputs, project_context.model_dump(), started_at)
+        return current_workflow_data, project_context
+
     def delegate(self, agent_name: str, current_workflow_data: dict, project_context: ProjectContext) -> tuple[dict, ProjectContext]:
         if project_context.analysis:
             if agent_name == "mobile_developer" and not project_context.analysis.mobile_needed:
@@ -707,8 +836,8 @@ class TaskMaster:
         if project_context.analysis and project_context.analysis.project_type_confirmed:
             project_type_str = project_context.analysis.project_type_confirmed
     
-        os.makedirs("outputs", exist_ok=True)
-        filename = f"outputs/{project_context.project_name.replace(' ', '_').replace(':', '_')}_{project_type_str}_context_snapshot.json"
+        os.makedirs(self.output_dir, exist_ok=True)
+        filename = str(self.output_dir / f"{project_context.project_name.replace(' ', '_').replace(':', '_')}_{project_type_str}_context_snapshot.json")
     
         try:
             with open(filename, "w") as f:
@@ -747,16 +876,30 @@ class TaskMaster:
         self.logger.log("Disconnected from the database.", "TaskMaster")
 
 
-if __name__ == "__main__":
+def main():
+    parser = argparse.ArgumentParser(description="Run the Qrews agent workflow for a project request")
+    parser.add_argument("requirements", nargs="*", help="Project requirements (default: a sample task management API)")
+    parser.add_argument("--resume", dest="resume_run_id", metavar="RUN_ID", help="Resume a journaled run instead of starting a new one")
+    args = parser.parse_args()
+    resume_run_id = args.resume_run_id
+    requirements = " ".join(args.requirements) if args.requirements else ("" if resume_run_id else "Build a task management API with user authentication")
+
+    # Parsed before building TaskMaster, so --help and usage errors return without touching the database or agents
     taskmaster = TaskMaster()
     try:
-        requirements = " ".join(sys.argv[1:]) if len(sys.argv) > 1 else "Build a task management API with user authentication"
-
-        print(f"\n🚀 Starting project: {requirements}")
-        context = taskmaster.start_workflow(requirements)
+        if resume_run_id:
+            if not (Path(RunJournalConfig.DIR) / f"{resume_run_id}.json").exists():
+                print(f"❌ No journal found for run id '{resume_run_id}' in {RunJournalConfig.DIR}/")
+                sys.exit(1)
+            print(f"\n🔁 Resuming run: {resume_run_id}")
+        else:
+            print(f"\n🚀 Starting project: {requirements}")
+        context = taskmaster.start_workflow(requirements, resume_run_id=resume_run_id)
 
         duration = context.get("end_time", time.time()) - context.get("start_time", time.time())
         print(f"\n✅ Workflow completed in {duration:.1f} seconds")
+        if context.get("run_id"):
+            print(f"🧾 Run id: {context['run_id']} (resume with: python main.py --resume {context['run_id']})")
 
         if "error" in context:
             print(f"❌ Error: {context['error']}")
@@ -776,3 +919,7 @@ if __name__ == "__main__":
                 print(f"  - {k.capitalize()}: {len(context[k])} chars")
     finally:
         taskmaster.cleanup()  # Cleanly disconnect database
+
+
+if __name__ == "__main__":
+    main()
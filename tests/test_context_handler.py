@@ -0,0 +1,37 @@
+import pytest
+
+pytest.importorskip("pydantic")
+from utils.context_handler import ProjectContext, TechStack, merge_context_branches
+
+
+def _context(**fields):
+    return ProjectContext(project_name="demo", project_type="fullstack", db_choice="SQLite", deployment_target="Heroku",
+                          security_level="standard", tech_stack=TechStack(frontend="React", backend="FastAPI", database="SQLite"),
+                          **fields)
+
+
+def _branch(base, **changes):
+    context = base.model_copy(deep=True)
+    for field_name, value in changes.items():
+        setattr(context, field_name, value)
+    return context
+
+
+def test_concurrent_code_snippets_keep_the_last_writer_without_a_conflict():
+    base = _context(current_code_snippet="backend code")
+    merged, conflicts = merge_context_branches(base, [
+        ("frontend_builder", _branch(base, current_code_snippet="web ui")),
+        ("mobile_developer", _branch(base, current_code_snippet="mobile app")),
+    ])
+    assert merged.current_code_snippet == "mobile app"
+    assert conflicts == []
+
+
+def test_other_concurrent_overwrites_are_reported():
+    base = _context(objective="original")
+    merged, conflicts = merge_context_branches(base, [
+        ("a", _branch(base, objective="from a")),
+        ("b", _branch(base, objective="from b")),
+    ])
+    assert merged.objective == "from b"
+    assert len(conflicts) == 1 and conflicts[0].startswith("objective")
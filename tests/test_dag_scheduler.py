@@ -0,0 +1,183 @@
+import threading
+import time
+
+import pytest
+
+from utils.dag_scheduler import DagScheduler, DagStep, without_steps
+
+WAIT = 5 # Seconds a step waits for an event before giving up, so a scheduling bug fails instead of hanging
+
+FULLSTACK = {
+    "planner": [], "architect": ["planner"], "api_designer": ["architect"], "code_writer": ["api_designer"],
+    "frontend_builder": ["api_designer", "code_writer"], "mobile_developer": ["api_designer", "code_writer"],
+    "tester": ["code_writer"],
+}
+
+
+def test_removed_step_passes_its_dependencies_on():
+    workflow = without_steps(FULLSTACK, ["project_analyzer", "architect", "mobile_developer"])
+    assert workflow == {
+        "planner": [], "api_designer": ["planner"], "code_writer": ["api_designer"],
+        "frontend_builder": ["api_designer", "code_writer"], "tester": ["code_writer"],
+    }
+
+
+def test_chain_of_removed_steps():
+    assert without_steps({"a": [], "b": ["a"], "c": ["b"], "d": ["c", "a"]}, ["b", "c"]) == {"a": [], "d": ["a"]}
+
+
+def test_taskmaster_templates_keep_planner_before_api_designer():
+    main = pytest.importorskip("main")
+    for project_type, graph in main.TaskMaster.WORKFLOW_TEMPLATES.items():
+        workflow = without_steps(graph, ["project_analyzer", "architect", "mobile_developer"])
+        assert workflow["api_designer"] == ["planner"], project_type
+
+
+def test_tester_waits_for_every_code_producing_agent():
+    main = pytest.importorskip("main")
+    for project_type, graph in main.TaskMaster.WORKFLOW_TEMPLATES.items():
+        producers = [name for name in ("code_writer", "frontend_builder", "mobile_developer") if name in graph]
+        assert graph["tester"] == producers, project_type
+
+
+class Recorder:
+    """Thread-safe event log shared by the steps and the callbacks"""
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+
+    def add(self, event):
+        with self._lock:
+            self.events.append(event)
+
+    def step(self, name, result=None, wait_for=None, raises=None):
+        def func():
+            self.add(f"start {name}")
+            if wait_for is not None:
+                assert wait_for.wait(WAIT), f"{name} timed out"
+            self.add(f"end {name}")
+            if raises is not None:
+                raise raises
+            return result if result is not None else name
+        return func
+
+    def commit(self, halt_on=()):
+        def commit(step, result):
+            self.add(f"commit {step.name}")
+            return step.name not in halt_on and None
+        return commit
+
+    def index(self, event):
+        return self.events.index(event)
+
+
+def test_commits_follow_declaration_order_when_later_steps_finish_first():
+    log, b_completed = Recorder(), threading.Event()
+    scheduler = DagScheduler([
+        DagStep("a", log.step("a", wait_for=b_completed)),
+        DagStep("b", log.step("b")),
+        DagStep("c", log.step("c"), depends_on=["a", "b"]),
+    ])
+    completed = []
+
+    def on_complete(step, result):
+        completed.append(step.name)
+        if step.name == "b":
+            b_completed.set()
+
+    assert scheduler.run(commit=log.commit(), on_complete=on_complete) is True
+    assert completed == ["b", "a", "c"]
+    assert [e for e in log.events if e.startswith("commit")] == ["commit a", "commit b", "commit c"]
+    assert log.index("start c") > log.index("end a")
+
+
+def test_commit_returning_false_halts_the_run():
+    log = Recorder()
+    scheduler = DagScheduler([
+        DagStep("a", log.step("a")),
+        DagStep("b", log.step("b"), depends_on=["a"]),
+        DagStep("c", log.step("c"), depends_on=["b"]),
+    ])
+    assert scheduler.run(commit=log.commit(halt_on={"a"})) is False
+    assert log.events == ["start a", "end a", "commit a"]
+
+
+def _slow_first_then(failing_step, log):
+    """slow (0.1s), then failing_step, then b (depends on it) and c (independent). With two workers c only
+    gets a worker after failing_step has finished, while slow still holds back failing_step's commit."""
+    return DagScheduler([
+        DagStep("slow", lambda: (time.sleep(0.1), log.add("end slow")) and "slow"),
+        failing_step,
+        DagStep("b", log.step("b"), depends_on=[failing_step.name]),
+        DagStep("c", log.step("c")),
+    ], max_workers=2)
+
+
+def test_step_exception_is_raised_at_its_commit_turn():
+    log = Recorder()
+    scheduler = _slow_first_then(DagStep("a", log.step("a", raises=RuntimeError("a broke"))), log)
+    with pytest.raises(RuntimeError, match="a broke"):
+        scheduler.run(commit=log.commit())
+    # Raised only once slow had committed; nothing declared after the failed step started
+    assert log.index("end slow") < log.index("commit slow")
+    assert "commit a" not in log.events
+    assert not any(e in log.events for e in ("start b", "start c"))
+
+
+def test_failed_result_holds_later_steps_until_it_is_committed():
+    log = Recorder()
+    scheduler = _slow_first_then(DagStep("a", log.step("a", result={"error": "bad"})), log)
+    failed = lambda step, result: isinstance(result, dict) and bool(result.get("error"))
+    assert scheduler.run(commit=log.commit(), failed=failed) is True
+    # c is independent but declared after the failure: like b it waits for a's commit
+    assert log.index("commit slow") < log.index("commit a") < log.index("start b")
+    assert log.index("commit a") < log.index("start c")
+
+
+def test_commit_can_halt_on_a_failed_result():
+    log = Recorder()
+    scheduler = _slow_first_then(DagStep("a", log.step("a", result={"error": "bad"})), log)
+    failed = lambda step, result: isinstance(result, dict) and bool(result.get("error"))
+    assert scheduler.run(commit=log.commit(halt_on={"a"}), failed=failed) is False
+    assert log.events[-1] == "commit a"
+    assert not any(e in log.events for e in ("start b", "start c"))
+
+
+def test_start_after_commit_lets_dependents_read_committed_state():
+    state, seen_by_b = [], []
+    scheduler = DagScheduler([
+        DagStep("a", lambda: "a"),
+        DagStep("b", lambda: seen_by_b.extend(state), depends_on=["a"]),
+    ])
+    # The commit is slow: without start_after_commit b could start before it has run
+    scheduler.run(commit=lambda step, result: (time.sleep(0.05), state.append(step.name)) and None,
+                  start_after_commit=True)
+    assert seen_by_b == ["a"]
+
+
+def test_single_worker_run_is_the_sequential_run():
+    graph = {"p": [], "q": ["p"], "r": [], "s": ["q", "r"], "t": ["p"], "u": []}
+    delays = {"p": 0.03, "q": 0.0, "r": 0.02, "s": 0.01, "t": 0.0, "u": 0.02}
+
+    def run(max_workers):
+        log = Recorder()
+
+        def step(name):
+            def func():
+                log.add(f"start {name}")
+                time.sleep(delays[name])
+                log.add(f"end {name}")
+                return name.upper()
+            return func
+
+        results = []
+        DagScheduler([DagStep(name, step(name), deps) for name, deps in graph.items()], max_workers=max_workers).run(
+            commit=lambda s, result: results.append(result), on_complete=lambda s, result: log.add(f"complete {s.name}")
+        )
+        return log.events, results
+
+    events, results = run(max_workers=1)
+    assert events == [e for name in graph for e in (f"start {name}", f"end {name}", f"complete {name}")]
+    assert results == [name.upper() for name in graph]
+    # More workers change the timing, never the committed results
+    assert run(max_workers=4)[1] == results
@@ -0,0 +1,54 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+from utils.http_transport import HttpTransport
+
+
+def _server(keep_alive: bool):
+    accepted = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            accepted.append(self.client_address)
+            super().setup()
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            body = b"{}"
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            if not keep_alive:
+                self.send_header("Connection", "close")
+                self.close_connection = True
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, accepted
+
+
+@pytest.mark.parametrize("keep_alive", [True, False])
+def test_stats_count_the_connections_actually_opened(keep_alive):
+    server, accepted = _server(keep_alive)
+    transport = HttpTransport()
+    url = f"http://127.0.0.1:{server.server_address[1]}/v1/completions"
+    try:
+        for _ in range(5):
+            transport.post(url, json={"prompt": "hi"}, timeout=5).raise_for_status()
+        stats = transport.stats()[f"http://127.0.0.1:{server.server_address[1]}"]
+    finally:
+        transport.close()
+        server.shutdown()
+        server.server_close()
+    assert stats["requests"] == 5
+    assert stats["connections"] == len(accepted) == (1 if keep_alive else 5)
+    assert stats["reused"] == 5 - len(accepted)
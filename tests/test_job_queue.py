@@ -0,0 +1,75 @@
+import pytest
+
+from utils.job_queue import JobQueueConfig, SQLiteJobQueue, run_job
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.db"))
+    yield queue
+    queue.close()
+
+
+def _expire_leases(queue):
+    queue.conn.execute("UPDATE jobs SET heartbeat_at = 0 WHERE status = 'running'")
+
+
+def test_requeued_job_only_accepts_its_new_worker(queue):
+    job_id = queue.submit("build a todo api")
+    assert queue.claim("old")["job_id"] == job_id
+    _expire_leases(queue)
+    assert queue.claim("new")["job_id"] == job_id
+
+    assert queue.heartbeat(job_id, "old") is False
+    assert queue.finish(job_id, "old", "completed", {"project_name": "stale"}) is False
+    assert queue.get(job_id)["status"] == "running"
+
+    assert queue.heartbeat(job_id, "new") is True
+    assert queue.finish(job_id, "new", "completed", {"project_name": "fresh"}) is True
+    job = queue.get(job_id)
+    assert (job["status"], job["worker"], job["result"]) == ("completed", "new", {"project_name": "fresh"})
+    # A finished job is not finished again, nor kept alive by a late heartbeat
+    assert queue.heartbeat(job_id, "new") is False
+    assert queue.finish(job_id, "new", "error", error="late") is False
+
+
+def test_run_job_does_not_overwrite_a_job_taken_over_by_another_worker(queue, tmp_path, monkeypatch):
+    monkeypatch.setattr(JobQueueConfig, "JOBS_DIR", str(tmp_path / "jobs"))
+    job_id = queue.submit("build a todo api")
+    stale = queue.claim("old")
+
+    class TakenOverTaskMaster:
+        def use_work_dir(self, work_dir):
+            pass
+
+        def start_workflow(self, user_input):
+            # The worker stalls past its lease; the job is requeued, claimed and completed elsewhere
+            _expire_leases(queue)
+            assert queue.claim("new")["job_id"] == job_id
+            assert queue.finish(job_id, "new", "completed", {"project_name": "fresh"})
+            return {"project_name": "stale"}
+
+    run_job(TakenOverTaskMaster(), queue, stale)
+    assert queue.get(job_id)["result"] == {"project_name": "fresh"}
+
+
+def test_redis_queue_claims_atomically_and_fences_stale_workers(monkeypatch):
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa") # Lua scripting in fakeredis
+    from utils.job_queue import RedisJobQueue
+
+    queue = RedisJobQueue(prefix="test", client=fakeredis.FakeRedis(decode_responses=True))
+    job_id = queue.submit("build a todo api")
+    assert queue.claim("old")["worker"] == "old"
+    assert queue.client.zscore("test:running", job_id) is not None
+
+    monkeypatch.setattr(JobQueueConfig, "LEASE_SECONDS", -1)
+    assert queue.claim("new")["job_id"] == job_id
+    monkeypatch.setattr(JobQueueConfig, "LEASE_SECONDS", 120)
+
+    assert queue.heartbeat(job_id, "old") is False
+    assert queue.finish(job_id, "old", "completed", {"project_name": "stale"}) is False
+    assert queue.finish(job_id, "new", "completed", {"project_name": "fresh"}) is True
+    assert queue.get(job_id)["result"] == {"project_name": "fresh"}
+    assert queue.heartbeat(job_id, "new") is False
+    assert queue.client.zcard("test:running") == 0
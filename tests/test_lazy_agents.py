@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+import pytest
+
+main = pytest.importorskip("main")
+from utils.agent_resources import LazyAgents
+
+
+def _taskmaster_with_fake_agents():
+    tm = main.TaskMaster.__new__(main.TaskMaster)
+    tm.agents = LazyAgents({
+        name: (lambda name=name: SimpleNamespace(name=name, role=name.replace("_", " ").title()))
+        for name in main.TaskMaster.AGENT_CLASSES
+    })
+    return tm
+
+
+def test_council_builds_only_the_architect_for_web_projects():
+    tm = _taskmaster_with_fake_agents()
+    council = tm._council_agents(SimpleNamespace(web=True, ios=False, android=False))
+    assert [agent.name for agent in council] == ["architect"]
+    assert tm.agents.built() == ["architect"]
+
+
+def test_council_adds_the_mobile_developer_for_mobile_targets():
+    tm = _taskmaster_with_fake_agents()
+    council = tm._council_agents(SimpleNamespace(web=False, ios=False, android=True))
+    assert [agent.name for agent in council] == ["architect", "mobile_developer"]
+    assert sorted(tm.agents.built()) == ["architect", "mobile_developer"]
+
+
+def test_build_all_constructs_each_agent_once():
+    calls = []
+    agents = LazyAgents({name: (lambda name=name: calls.append(name) or name) for name in ("planner", "tester")})
+    assert agents.built() == [] and len(agents) == 2
+    agents.build_all()
+    agents.build_all()
+    assert calls == ["planner", "tester"] and agents.built() == ["planner", "tester"]
@@ -0,0 +1,130 @@
+import sqlite3
+
+import pytest
+
+np = pytest.importorskip("numpy")
+from utils.ann_index import AnnIndexConfig, IVFIndex, index_path_for
+from utils.database import Database
+
+
+def _unit(i, dim=8):
+    vector = np.zeros(dim, dtype=np.float32)
+    vector[i % dim] = 1.0
+    return vector
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / "memory.db"))
+    yield database
+    database.close()
+
+
+def _store(db, item_id, vector):
+    assert db.store_embedding(item_id, "agent", "role", f"content of {item_id}", vector)
+
+
+def _ids(results):
+    return [row[0] for row in results]
+
+
+def test_item_stored_after_deleting_the_newest_row_is_found(db):
+    _store(db, "a", _unit(0))
+    _store(db, "b", _unit(1))
+    assert _ids(db.retrieve_similar_items(_unit(1), top_k=2)) == ["b", "a"]
+    db.delete_item("b")
+    _store(db, "c", _unit(2)) # Gets b's rowid back
+    assert db.conn.execute("SELECT rowid, item_id FROM memory WHERE item_id = 'c'").fetchone() == (2, "c")
+    assert _ids(db.retrieve_similar_items(_unit(2), top_k=2)) == ["c", "a"]
+
+
+def test_changes_from_another_connection_are_seen(db):
+    _store(db, "a", _unit(0))
+    _store(db, "b", _unit(1))
+    _store(db, "c", _unit(2))
+    assert len(db.retrieve_similar_items(_unit(0), top_k=3)) == 3
+
+    other = sqlite3.connect(db.db_file_path)
+    other.execute("DELETE FROM memory WHERE item_id = 'c'")
+    other.execute("UPDATE memory SET embedding = ? WHERE item_id = 'a'", (_unit(3).tobytes(),))
+    other.commit()
+    other.close()
+
+    assert _ids(db.retrieve_similar_items(_unit(3), top_k=3)) == ["a", "b"]
+    assert db.retrieve_similar_items(_unit(3), top_k=1)[0][4] == pytest.approx(1.0)
+
+
+def test_replaced_embedding_replaces_the_matrix_row(db):
+    _store(db, "a", _unit(0))
+    db.retrieve_similar_items(_unit(0))
+    _store(db, "a", _unit(1))
+    assert db.retrieve_similar_items(_unit(1), top_k=1)[0][4] == pytest.approx(1.0)
+    assert len(db._embeddings) == 1
+
+
+def test_change_log_is_compacted_on_open(tmp_path):
+    path = str(tmp_path / "memory.db")
+    database = Database(path)
+    for _ in range(3):
+        _store(database, "a", _unit(0))
+    database.close()
+    database = Database(path)
+    assert database.conn.execute("SELECT COUNT(*) FROM memory_changes").fetchone()[0] == 1
+    database.close()
+
+
+@pytest.fixture
+def ann(monkeypatch):
+    monkeypatch.setattr(AnnIndexConfig, "ENABLED", True)
+    monkeypatch.setattr(AnnIndexConfig, "MIN_ITEMS", 1)
+    monkeypatch.setattr(AnnIndexConfig, "NLIST", 4)
+    monkeypatch.setattr(AnnIndexConfig, "RETRAIN_GROWTH", 1000)
+
+
+def _clustered(rng, center, dim=8):
+    return (_unit(center, dim) * 10 + rng.normal(size=dim)).astype(np.float32)
+
+
+def test_ann_index_follows_insert_delete_and_reinsert(db, ann):
+    rng = np.random.default_rng(0)
+    for i in range(40):
+        _store(db, f"item{i}", _clustered(rng, i % 4))
+    db.retrieve_similar_items(_unit(0), top_k=1)
+    index = db._ann_index
+    assert index is not None and len(index) == 40
+
+    db.delete_item("item39")
+    _store(db, "late", _clustered(rng, 2)) # Reuses the deleted row's rowid
+    results = db.retrieve_similar_items(_unit(2), top_k=11)
+    assert "late" in _ids(results)
+    assert "item39" not in index.cell_of and len(index) == 40
+
+    _store(db, "item39", _clustered(rng, 1))
+    assert "item39" in _ids(db.retrieve_similar_items(_unit(1), top_k=11))
+
+
+def test_ann_index_reassigns_embeddings_replaced_while_on_disk(tmp_path, ann):
+    path = str(tmp_path / "memory.db")
+    rng = np.random.default_rng(1)
+    database = Database(path)
+    for i in range(40):
+        _store(database, f"item{i}", _clustered(rng, i % 4))
+    database.retrieve_similar_items(_unit(0), top_k=1)
+    database.close()
+    saved = IVFIndex.load(index_path_for(path))
+    assert saved is not None and saved.change_id is not None and len(saved) == 40
+
+    # Replaced and deleted by another process while no index is loaded
+    other = sqlite3.connect(path)
+    other.execute("UPDATE memory SET embedding = ? WHERE item_id = 'item0'", (_clustered(rng, 3).tobytes(),))
+    other.execute("DELETE FROM memory WHERE item_id = 'item1'")
+    other.commit()
+    other.close()
+
+    database = Database(path)
+    results = database.retrieve_similar_items(_unit(3), top_k=11)
+    index = database._ann_index
+    assert "item0" in _ids(results)
+    assert index.cell_of["item0"] == index.cell_of["item3"]
+    assert "item1" not in index.cell_of
+    database.close()
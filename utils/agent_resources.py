@@ -0,0 +1,123 @@
+"""
+Resources shared by every agent in the process, and lazy construction of agents.
+
+Agents used to build their own LocalLLMClient, GeminiConfig and ModelConfig, and crews
+built all of their sub-agents up front. The clients and configs are stateless, so one
+instance of each is shared here. Agents themselves are only constructed the first time
+they are used (LazyAgents for TaskMaster, lazy_sub_agent for the crew runners).
+"""
+import threading
+from typing import Optional, Dict, Any, List, Callable, Iterator, Tuple
+from collections.abc import Mapping
+
+from configs.global_config import GeminiConfig, ModelConfig
+
+_lock = threading.RLock()
+_resources: Dict[str, Any] = {}
+_tool_lists: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+
+
+def _shared(key: str, factory: Callable[[], Any]) -> Any:
+    resource = _resources.get(key)
+    if resource is None:
+        with _lock:
+            resource = _resources.get(key)
+            if resource is None:
+                resource = _resources[key] = factory()
+    return resource
+
+
+def get_local_llm_client(logger=None):
+    from utils.local_llm_client import LocalLLMClient
+    return _shared("local_llm_client", lambda: LocalLLMClient(logger=logger))
+
+
+def get_gemini_config() -> GeminiConfig:
+    return _shared("gemini_config", GeminiConfig)
+
+
+def get_model_config() -> ModelConfig:
+    return _shared("model_config", ModelConfig)
+
+
+def get_tool_descriptions(tool_names: List[str]) -> List[Dict[str, Any]]:
+    """Tool declarations for the named tools; agents with the same tool set share one list (treat it as read-only)"""
+    key = tuple(tool_names)
+    tools = _tool_lists.get(key)
+    if tools is None:
+        from utils.tools import TOOL_DESCRIPTIONS
+        with _lock:
+            tools = _tool_lists.setdefault(key, [TOOL_DESCRIPTIONS[t] for t in tool_names if t in TOOL_DESCRIPTIONS])
+    return tools
+
+
+class LazyAgents(Mapping):
+    """
+    Name -> agent mapping that builds each agent on first lookup. factories maps names to
+    zero-argument callables; on_build(name, agent) runs once per agent after it is built
+    (e.g. to assign tools). Membership tests and len() don't build anything.
+    """
+    def __init__(self, factories: Dict[str, Callable[[], Any]], on_build: Optional[Callable[[str, Any], None]] = None):
+        self._factories = dict(factories)
+        self._on_build = on_build
+        self._agents: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+
+    def __getitem__(self, name: str):
+        agent = self._agents.get(name)
+        if agent is not None:
+            return agent
+        if name not in self._factories:
+            raise KeyError(name)
+        with self._lock:
+            if name not in self._agents:
+                agent = self._factories[name]()
+                if self._on_build:
+                    self._on_build(name, agent)
+                self._agents[name] = agent
+            return self._agents[name]
+
+    def __contains__(self, name) -> bool:
+        return name in self._factories
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._factories)
+
+    def __len__(self) -> int:
+        return len(self._factories)
+
+    def built(self) -> List[str]:
+        """Names of the agents constructed so far"""
+        return list(self._agents)
+
+    def build_all(self):
+        """Constructs every agent now, e.g. when a long-running service warms up"""
+        for name in self._factories:
+            self[name]
+
+
+class lazy_sub_agent:
+    """
+    Crew runner attribute that constructs its sub-agent on first access, with the runner's
+    logger, db and model override (runner.model_config[config_key]), e.g.
+        component_designer = lazy_sub_agent(ComponentDesigner, "component_designer")
+    """
+    def __init__(self, agent_class, config_key: str):
+        self.agent_class = agent_class
+        self.config_key = config_key
+        self.attr_name = config_key
+
+    def __set_name__(self, owner, name):
+        self.attr_name = name
+
+    def __get__(self, runner, owner=None):
+        if runner is None:
+            return self
+        with _lock:
+            agent = runner.__dict__.get(self.attr_name)
+            if agent is None:
+                agent = self.agent_class(
+                    logger=runner.logger, db=runner.db, model_name_override=runner.model_config.get(self.config_key)
+                )
+                runner.__dict__[self.attr_name] = agent
+        return agent
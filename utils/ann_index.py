@@ -0,0 +1,191 @@
+"""
+Approximate nearest-neighbour index (IVF-flat) for agent memory, in pure NumPy.
+
+Embeddings are clustered with spherical k-means into nlist cells; a query is compared with
+the cell centroids and only the items in its nprobe closest cells are scored exactly.
+More probes give better recall at the cost of latency. The index holds cell assignments
+only; vectors stay in the Database's EmbeddingMatrix (utils/embedding_matrix.py).
+
+Database.retrieve_similar_items switches to the index once the memory table has
+QREWS_ANN_MIN_ITEMS embeddings, and persists it next to the database file
+(qnatz_crew.db -> qnatz_crew.ivf.npz) so a restart doesn't retrain it.
+"""
+import os
+import math
+import logging
+from itertools import chain
+from pathlib import Path
+from typing import Optional, Dict, List, Tuple, Iterable, Set
+
+import numpy as np
+
+from utils.embedding_matrix import EmbeddingMatrix
+
+logger = logging.getLogger(__name__)
+
+
+class AnnIndexConfig:
+    """Settings for the approximate memory search"""
+    ENABLED = os.getenv("QREWS_ANN", "1").lower() not in ("0", "off", "false", "no")
+    # Below this many embeddings, exact (brute-force) search is used
+    MIN_ITEMS = int(os.getenv("QREWS_ANN_MIN_ITEMS", "50000"))
+    # Number of cells; 0 picks about sqrt(n), bounded by the training sample
+    NLIST = int(os.getenv("QREWS_ANN_NLIST", "0"))
+    # Cells scored per query: higher means better recall and slower queries
+    NPROBE = int(os.getenv("QREWS_ANN_NPROBE", "8"))
+    TRAIN_SAMPLE = int(os.getenv("QREWS_ANN_TRAIN_SAMPLE", "25000"))
+    TRAIN_ITERATIONS = int(os.getenv("QREWS_ANN_TRAIN_ITERATIONS", "10"))
+    # Retrain once the memory has grown this many times past the size the index was trained on
+    RETRAIN_GROWTH = float(os.getenv("QREWS_ANN_RETRAIN_GROWTH", "4"))
+
+
+def index_path_for(db_file_path: str) -> Path:
+    """Where the index of a database file is persisted"""
+    return Path(db_file_path).with_suffix(".ivf.npz")
+
+
+def _normalized(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+
+class IVFIndex:
+    """Inverted-file index over the keys of an EmbeddingMatrix"""
+    def __init__(self, nprobe: int = AnnIndexConfig.NPROBE):
+        self.nprobe = nprobe
+        self.centroids: Optional[np.ndarray] = None # (nlist, dim), unit length
+        self.cells: List[Set[str]] = []
+        self.cell_of: Dict[str, int] = {}
+        self.trained_size = 0
+        # Memory change log position (utils/database.py) the cells are current with; None if unknown
+        self.change_id: Optional[int] = None
+        self.dirty = False # Changed since the last save
+
+    def __len__(self) -> int:
+        return len(self.cell_of)
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def nlist(self) -> int:
+        return 0 if self.centroids is None else self.centroids.shape[0]
+
+    def train(self, matrix: EmbeddingMatrix, nlist: int = AnnIndexConfig.NLIST,
+              sample_size: int = AnnIndexConfig.TRAIN_SAMPLE, iterations: int = AnnIndexConfig.TRAIN_ITERATIONS, seed: int = 0):
+        """Clusters a sample of the matrix (spherical k-means) and assigns every item to a cell"""
+        n = len(matrix)
+        if n == 0:
+            raise ValueError("Cannot train an index on an empty matrix")
+        rng = np.random.default_rng(seed)
+        sample_rows = np.sort(rng.choice(n, size=min(n, sample_size), replace=False))
+        sample = _normalized(matrix.vectors(sample_rows))
+        if nlist <= 0:
+            # ~sqrt(n) cells, with at least ~39 training points per cell
+            nlist = max(1, min(int(math.sqrt(n)), len(sample) // 39))
+        nlist = min(nlist, len(sample))
+
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assignment = self._nearest(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            counts = np.bincount(assignment, minlength=nlist)
+            empty = counts == 0
+            if empty.any(): # Restart empty cells from random sample points
+                sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()), replace=False)]
+            centroids = _normalized(sums)
+
+        self.centroids = centroids.astype(np.float32)
+        self.cells = [set() for _ in range(nlist)]
+        self.cell_of = {}
+        self.add_many(matrix, (matrix.key(row) for row in range(n)))
+        self.trained_size = n
+        logger.info(f"Trained IVF index: {n} items in {nlist} cells")
+
+    @staticmethod
+    def _nearest(unit_vectors: np.ndarray, centroids: np.ndarray, batch: int = 65536) -> np.ndarray:
+        return np.concatenate([
+            np.argmax(unit_vectors[start:start + batch] @ centroids.T, axis=1)
+            for start in range(0, len(unit_vectors), batch)
+        ]) if len(unit_vectors) else np.zeros(0, dtype=np.int64)
+
+    def add_many(self, matrix: EmbeddingMatrix, keys: Iterable[str]):
+        """Assigns (or reassigns, for replaced embeddings) the given keys of the matrix to cells"""
+        keys = [k for k in keys if k in matrix]
+        if not keys or not self.trained:
+            return
+        cells = self._nearest(_normalized(matrix.vectors(matrix.rows_for(keys))), self.centroids)
+        for key, cell in zip(keys, cells.tolist()):
+            previous = self.cell_of.get(key)
+            if previous is not None:
+                self.cells[previous].discard(key)
+            self.cells[cell].add(key)
+            self.cell_of[key] = cell
+        self.dirty = True
+
+    def remove(self, key: str) -> bool:
+        cell = self.cell_of.pop(key, None)
+        if cell is None:
+            return False
+        self.cells[cell].discard(key)
+        self.dirty = True
+        return True
+
+    def reconcile(self, matrix: EmbeddingMatrix, changed: Iterable[str] = ()):
+        """Brings a loaded index in line with the matrix: drops vanished keys, assigns unindexed ones and
+        reassigns the changed ones (keys whose embeddings were replaced while the index was on disk)"""
+        for key in [k for k in self.cell_of if k not in matrix]:
+            self.remove(key)
+        changed = set(changed)
+        self.add_many(matrix, (matrix.key(row) for row in range(len(matrix))
+                               if matrix.key(row) not in self.cell_of or matrix.key(row) in changed))
+
+    def needs_training(self, size: int) -> bool:
+        return not self.trained or size > self.trained_size * AnnIndexConfig.RETRAIN_GROWTH
+
+    def search(self, matrix: EmbeddingMatrix, query, k: int, nprobe: Optional[int] = None) -> List[Tuple[str, float]]:
+        """(key, similarity) of the k best items among the nprobe cells closest to query"""
+        if not self.trained or k <= 0:
+            return []
+        nprobe = min(max(1, nprobe or self.nprobe), self.nlist)
+        closeness = self.centroids @ _normalized(np.asarray(query, dtype=np.float32).ravel())
+        probe = np.argpartition(-closeness, nprobe - 1)[:nprobe] if nprobe < self.nlist else range(self.nlist)
+        rows = matrix.rows_for(chain.from_iterable(self.cells[c] for c in probe))
+        return matrix.top_k(query, k, rows)
+
+    def save(self, path: Path):
+        """Writes centroids and cell assignments (not vectors) atomically"""
+        keys = list(self.cell_of)
+        tmp_path = Path(f"{path}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f, centroids=self.centroids, keys=np.array(keys, dtype=str),
+                cells=np.array([self.cell_of[k] for k in keys], dtype=np.int32),
+                trained_size=np.array(self.trained_size),
+                change_id=np.array(-1 if self.change_id is None else self.change_id),
+            )
+        os.replace(tmp_path, path)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, path: Path, nprobe: int = AnnIndexConfig.NPROBE) -> Optional["IVFIndex"]:
+        """The index saved at path, or None if there isn't a readable one"""
+        if not Path(path).exists():
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                index = cls(nprobe=nprobe)
+                index.centroids = data["centroids"].astype(np.float32)
+                index.trained_size = int(data["trained_size"])
+                change_id = int(data["change_id"]) if "change_id" in data.files else -1
+                index.change_id = None if change_id < 0 else change_id
+                index.cells = [set() for _ in range(index.centroids.shape[0])]
+                for key, cell in zip(data["keys"].tolist(), data["cells"].tolist()):
+                    index.cells[cell].add(key)
+                    index.cell_of[key] = cell
+        except (OSError, KeyError, ValueError, IndexError) as e:
+            logger.error(f"Ignoring unreadable ANN index at {path}: {e}")
+            return None
+        return index
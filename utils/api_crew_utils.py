@@ -1,6 +1,9 @@
 import json
 import time
 import requests
+from utils import http_transport
+from utils.rate_limiter import get_rate_limiter, backoff_delay, estimate_tokens
+from utils.llm_cache import LLMResponseCache, ResponseCacheConfig, get_response_cache, is_cacheable_response
 import os
 from typing import Type, TypeVar, Dict, Any, Optional
 
@@ -12,7 +15,7 @@ from pydantic import BaseModel, ValidationError
 
 # Placeholder for GeminiConfig - in a real scenario, this would be imported or passed
 class GeminiConfigPlaceholder:
-    BASE_URL = "https://generativelanguage.googleapis.com/v1beta/models"
+    BASE_URL = os.environ.get("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta/models")
     API_KEY = os.environ.get("GEMINI_API_KEY") # Needs API key
     DEFAULT_MODEL_NAME = "gemini-pro"
     SAFETY_SETTINGS = [
@@ -65,6 +68,7 @@ class SubAgentLLMInvoker:
         self.gemini_config = gemini_config or GeminiConfigPlaceholder()
         self.model_name = AGENT_MODEL_CONFIG.get(agent_name, self.gemini_config.DEFAULT_MODEL_NAME)
         self.generation_config = self.gemini_config.get_generation_config(agent_name)
+        self.use_response_cache = not ResponseCacheConfig.is_bypassed(agent_name)
 
         if not self.gemini_config.API_KEY:
             self.logger.log(f"Gemini API key not found for {self.agent_name}.", level="ERROR")
@@ -72,6 +76,23 @@ class SubAgentLLMInvoker:
             # The error will be caught if invoke is actually called without an API key.
 
     def invoke(self, prompt: str, max_retries: int = 2, initial_delay: float = 1.0) -> str:
+        cache = get_response_cache() if self.use_response_cache and self.model_name != "system" else None
+        if cache is None:
+            return self._invoke_uncached(prompt, max_retries, initial_delay)
+
+        cache_key = LLMResponseCache.make_key(
+            self.model_name, self.generation_config, self.gemini_config.SAFETY_SETTINGS, None, prompt
+        )
+        cached = cache.get(cache_key)
+        if cached is not None:
+            self.logger.log(f"Response cache hit for {self.agent_name} ({self.model_name})", role=self.agent_name)
+            return cached
+        response = self._invoke_uncached(prompt, max_retries, initial_delay)
+        if is_cacheable_response(response):
+            cache.put(cache_key, self.model_name, response)
+        return response
+
+    def _invoke_uncached(self, prompt: str, max_retries: int = 2, initial_delay: float = 1.0) -> str:
         if not self.gemini_config.API_KEY:
             return "Error: Gemini API key is not configured."
 
@@ -87,12 +108,14 @@ class SubAgentLLMInvoker:
         }
         headers = {'Content-Type': 'application/json'}
 
+        limiter = get_rate_limiter()
+        estimated_tokens = estimate_tokens(prompt) + int(self.generation_config.get('maxOutputTokens', 0))
         current_retry = 0
-        delay = initial_delay
         while current_retry <= max_retries:
             try:
+                limiter.acquire(self.model_name, estimated_tokens)
                 self.logger.log(f"Attempting to call {self.model_name} for {self.agent_name} (Attempt {current_retry + 1})", role=self.agent_name)
-                response = requests.post(
+                response = http_transport.post(
                     url,
                     params={'key': self.gemini_config.API_KEY},
                     headers=headers,
@@ -102,6 +125,7 @@ class SubAgentLLMInvoker:
                 response.raise_for_status()
 
                 data = response.json()
+                limiter.record_usage(self.model_name, estimated_tokens, data.get('usageMetadata', {}).get('totalTokenCount'))
 
                 if 'candidates' in data and data['candidates'] and 'content' in data['candidates'][0] and \
                    'parts' in data['candidates'][0]['content'] and data['candidates'][0]['content']['parts'] and \
@@ -123,9 +147,10 @@ class SubAgentLLMInvoker:
                 self.logger.log(f"HTTP Error {status_code} for {self.agent_name}: {error_text}", role=self.agent_name, level="ERROR")
                 if status_code == 429 or status_code >= 500: # Retry on rate limit or server errors
                     if current_retry < max_retries:
-                        self.logger.log(f"Retrying in {delay}s...", role=self.agent_name, level="WARNING")
-                        time.sleep(delay)
-                        delay *= 2
+                        # Shared limiter holds every caller of this model for Retry-After / jittered backoff;
+                        # the acquire() at the top of the next attempt does the waiting.
+                        delay = limiter.report_throttle(self.model_name, e.response, current_retry)
+                        self.logger.log(f"Retrying in {delay:.1f}s...", role=self.agent_name, level="WARNING")
                         current_retry += 1
                         continue
                     else:
@@ -134,9 +159,9 @@ class SubAgentLLMInvoker:
             except requests.exceptions.RequestException as e:
                 self.logger.log(f"Request failed for {self.agent_name}: {e}", role=self.agent_name, level="ERROR")
                 if current_retry < max_retries:
-                    self.logger.log(f"Retrying in {delay}s...", role=self.agent_name, level="WARNING")
+                    delay = backoff_delay(current_retry, base=initial_delay)
+                    self.logger.log(f"Retrying in {delay:.1f}s...", role=self.agent_name, level="WARNING")
                     time.sleep(delay)
-                    delay *= 2
                     current_retry += 1
                     continue
                 return f"Error: Request failed after {max_retries + 1} attempts: {e}"
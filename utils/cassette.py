@@ -0,0 +1,189 @@
+import os
+import gzip
+import json
+import time
+import asyncio
+import hashlib
+import threading
+import logging
+from collections import deque
+from typing import Optional, Dict, Any, Deque
+from urllib.parse import urlsplit, parse_qsl
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+
+class CassetteConfig:
+    """Record/replay of LLM HTTP traffic.
+
+    QREWS_CASSETTE_MODE: "off" (default), "record" (live calls, each exchange appended to the
+    cassette) or "replay" (served from the cassette, no network).
+    QREWS_REPLAY_LATENCY: seconds to wait before each replayed response, or "recorded" to
+    reproduce the original latency (scaled by QREWS_REPLAY_LATENCY_SCALE)."""
+    MODE = os.getenv("QREWS_CASSETTE_MODE", "off").lower()
+    PATH = os.getenv("QREWS_CASSETTE", "llm_cassette.jsonl.gz")
+    REPLAY_LATENCY = os.getenv("QREWS_REPLAY_LATENCY", "0")
+    REPLAY_LATENCY_SCALE = float(os.getenv("QREWS_REPLAY_LATENCY_SCALE", "1.0"))
+    # Query parameters that must not end up in the cassette or affect matching
+    REDACTED_PARAMS = ("key",)
+    RECORDED_HEADERS = ("Content-Type", "Retry-After")
+
+
+class CassetteResponse:
+    """requests.Response stand-in for a replayed exchange"""
+    def __init__(self, entry: Dict[str, Any]):
+        self.status_code = entry["status"]
+        self.headers = CaseInsensitiveDict(entry.get("headers") or {})
+        self.url = entry.get("url", "")
+        self.text = entry.get("body", "")
+        self.content = self.text.encode("utf-8")
+
+    def json(self, **kwargs):
+        return json.loads(self.text, **kwargs)
+
+    def raise_for_status(self):
+        if 400 <= self.status_code < 600:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+    def iter_lines(self, decode_unicode: bool = False, **kwargs):
+        for line in self.text.splitlines():
+            yield line if decode_unicode else line.encode("utf-8")
+
+    def close(self):
+        pass
+
+
+class Cassette:
+    """Request/response pairs keyed by a hash of URL (minus the API key), query and JSON body.
+
+    Identical requests recorded more than once are replayed in recorded order; once the
+    recorded answers run out the last one is repeated."""
+    def __init__(self, path: str = CassetteConfig.PATH, mode: str = CassetteConfig.MODE, config: type = CassetteConfig):
+        self.path = path
+        self.mode = mode
+        self.config = config
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._last: Dict[str, Dict[str, Any]] = {}
+        self.stats = {"recorded": 0, "replayed": 0, "misses": 0}
+        if mode == "replay":
+            self._load()
+
+    def _open(self, file_mode: str):
+        if self.path.endswith(".gz"):
+            return gzip.open(self.path, file_mode + "t", encoding="utf-8")
+        return open(self.path, file_mode, encoding="utf-8")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            logger.error(f"Cassette {self.path} not found; every request will miss")
+            return
+        with self._open("r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                self._entries.setdefault(entry["key"], deque()).append(entry)
+        logger.info(f"Loaded {sum(len(q) for q in self._entries.values())} exchanges from cassette {self.path}")
+
+    def request_key(self, url: str, kwargs: Dict[str, Any]) -> str:
+        parts = urlsplit(url)
+        params = dict(parse_qsl(parts.query))
+        params.update(kwargs.get("params") or {})
+        for name in self.config.REDACTED_PARAMS:
+            params.pop(name, None)
+        body = kwargs.get("json")
+        if body is None:
+            body = kwargs.get("data")
+        material = {
+            "url": f"{parts.scheme}://{parts.netloc}{parts.path}",
+            "params": params,
+            "body": body,
+        }
+        canonical = json.dumps(material, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    # --- record ---
+
+    def _record(self, key: str, url: str, response, latency: float) -> CassetteResponse:
+        entry = {
+            "key": key,
+            "url": urlsplit(url)._replace(query="").geturl(),
+            "status": response.status_code,
+            "headers": {h: response.headers[h] for h in self.config.RECORDED_HEADERS if h in response.headers},
+            "body": response.content.decode("utf-8", errors="replace"),
+            "latency": round(latency, 4),
+        }
+        with self._lock:
+            with self._open("a") as f:
+                f.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            self.stats["recorded"] += 1
+        # Hand back a replayable copy: a streamed body has already been read to record it
+        return CassetteResponse(entry)
+
+    def record(self, send, url: str, **kwargs):
+        start = time.time()
+        response = send(url, **kwargs)
+        return self._record(self.request_key(url, kwargs), url, response, time.time() - start)
+
+    async def arecord(self, send, url: str, **kwargs):
+        start = time.time()
+        response = await send(url, **kwargs)
+        return self._record(self.request_key(url, kwargs), url, response, time.time() - start)
+
+    # --- replay ---
+
+    def _next_entry(self, url: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        key = self.request_key(url, kwargs)
+        with self._lock:
+            queue = self._entries.get(key)
+            if queue:
+                entry = queue.popleft()
+                self._last[key] = entry
+            else:
+                entry = self._last.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                raise requests.exceptions.ConnectionError(f"No cassette entry for {urlsplit(url).path} (replay mode, key {key[:12]})")
+            self.stats["replayed"] += 1
+            return entry
+
+    def _replay_delay(self, entry: Dict[str, Any]) -> float:
+        setting = self.config.REPLAY_LATENCY
+        if setting == "recorded":
+            return entry.get("latency", 0.0) * self.config.REPLAY_LATENCY_SCALE
+        return float(setting)
+
+    def replay(self, url: str, **kwargs) -> CassetteResponse:
+        entry = self._next_entry(url, kwargs)
+        delay = self._replay_delay(entry)
+        if delay > 0:
+            time.sleep(delay)
+        return CassetteResponse(entry)
+
+    async def areplay(self, url: str, **kwargs) -> CassetteResponse:
+        entry = self._next_entry(url, kwargs)
+        delay = self._replay_delay(entry)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return CassetteResponse(entry)
+
+
+_cassette: Optional[Cassette] = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette() -> Optional[Cassette]:
+    """Process-wide cassette, or None when record/replay is off"""
+    global _cassette
+    if CassetteConfig.MODE not in ("record", "replay"):
+        return None
+    if _cassette is None:
+        with _cassette_lock:
+            if _cassette is None:
+                _cassette = Cassette()
+    return _cassette
@@ -0,0 +1,158 @@
+import os
+import time
+import threading
+import logging
+from collections import deque
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreakerConfig:
+    """Thresholds for the per-model / per-endpoint circuit breakers"""
+    ENABLED = os.getenv("QREWS_CIRCUIT_BREAKER", "1").lower() not in ("0", "off", "false", "no")
+    WINDOW_SECONDS = float(os.getenv("QREWS_BREAKER_WINDOW", "120"))
+    MIN_CALLS = int(os.getenv("QREWS_BREAKER_MIN_CALLS", "4")) # Calls in the window before the error rate counts
+    ERROR_RATE_THRESHOLD = float(os.getenv("QREWS_BREAKER_ERROR_RATE", "0.5"))
+    OPEN_SECONDS = float(os.getenv("QREWS_BREAKER_OPEN_SECONDS", "60"))
+    HALF_OPEN_PROBES = int(os.getenv("QREWS_BREAKER_PROBES", "1")) # Concurrent probe calls allowed while half-open
+    PROBE_TIMEOUT_SECONDS = float(os.getenv("QREWS_BREAKER_PROBE_TIMEOUT", "180")) # Probes never reported back are released after this
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker over a rolling window of call outcomes.
+
+    Closed: calls pass and outcomes are recorded; once the window holds MIN_CALLS and the
+    error rate reaches ERROR_RATE_THRESHOLD the breaker opens.
+    Open: calls are refused for OPEN_SECONDS, then the breaker goes half-open.
+    Half-open: up to HALF_OPEN_PROBES calls go through; a success closes the breaker,
+    a failure opens it again."""
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, config: type = CircuitBreakerConfig):
+        self.name = name
+        self.config = config
+        self._state = self.CLOSED
+        self._outcomes = deque() # (timestamp, succeeded)
+        self._opened_at = 0.0
+        self._probes: deque = deque() # start times of in-flight half-open probes
+        self._lock = threading.Lock()
+        self.times_opened = 0
+
+    def _prune(self, now: float):
+        while self._outcomes and now - self._outcomes[0][0] > self.config.WINDOW_SECONDS:
+            self._outcomes.popleft()
+        while self._probes and now - self._probes[0] > self.config.PROBE_TIMEOUT_SECONDS:
+            self._probes.popleft()
+
+    def _advance(self, now: float):
+        if self._state == self.OPEN and now - self._opened_at >= self.config.OPEN_SECONDS:
+            self._state = self.HALF_OPEN
+            self._probes.clear()
+            logger.info(f"Circuit for {self.name} half-open; allowing probe requests")
+
+    def _open(self, now: float):
+        self._state = self.OPEN
+        self._opened_at = now
+        self._probes.clear()
+        self.times_opened += 1
+        logger.warning(f"Circuit for {self.name} opened for {self.config.OPEN_SECONDS:.0f}s")
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._advance(time.monotonic())
+            return self._state
+
+    def is_available(self) -> bool:
+        """True unless the breaker is open (does not reserve a half-open probe)"""
+        return not self.config.ENABLED or self.state != self.OPEN
+
+    def allow_request(self) -> bool:
+        """Whether a call may go out now. In half-open state this reserves a probe slot."""
+        if not self.config.ENABLED:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            self._advance(now)
+            self._prune(now)
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and len(self._probes) < self.config.HALF_OPEN_PROBES:
+                self._probes.append(now)
+                return True
+            return False
+
+    def record_success(self):
+        now = time.monotonic()
+        with self._lock:
+            self._advance(now)
+            if self._state == self.HALF_OPEN:
+                self._state = self.CLOSED
+                self._outcomes.clear()
+                self._probes.clear()
+                logger.info(f"Circuit for {self.name} closed after successful probe")
+            self._outcomes.append((now, True))
+            self._prune(now)
+
+    def record_failure(self):
+        now = time.monotonic()
+        with self._lock:
+            self._advance(now)
+            if self._state == self.HALF_OPEN:
+                self._open(now)
+                return
+            self._outcomes.append((now, False))
+            self._prune(now)
+            if self._state == self.CLOSED and len(self._outcomes) >= self.config.MIN_CALLS:
+                failures = sum(1 for _, succeeded in self._outcomes if not succeeded)
+                if failures / len(self._outcomes) >= self.config.ERROR_RATE_THRESHOLD:
+                    self._open(now)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._lock:
+            self._advance(now)
+            self._prune(now)
+            failures = sum(1 for _, succeeded in self._outcomes if not succeeded)
+            return {
+                "state": self._state,
+                "calls": len(self._outcomes),
+                "error_rate": failures / len(self._outcomes) if self._outcomes else 0.0,
+                "open_for": max(0.0, self.config.OPEN_SECONDS - (now - self._opened_at)) if self._state == self.OPEN else 0.0,
+                "times_opened": self.times_opened,
+            }
+
+
+class CircuitBreakerRegistry:
+    """One breaker per key: a Gemini model name or a local endpoint URL"""
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> CircuitBreaker:
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(key, CircuitBreaker(key))
+        return breaker
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {key: breaker.snapshot() for key, breaker in breakers.items()}
+
+
+_registry: Optional[CircuitBreakerRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_circuit_breakers() -> CircuitBreakerRegistry:
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = CircuitBreakerRegistry()
+    return _registry
@@ -130,6 +130,60 @@ def save_context(context_data: ProjectContext, context_file_path: Path) -> bool:
         logging.error(f"An unexpected error occurred while saving context to {context_file_path} (possibly during serialization or file write): {e}")
         return False
 
+_MISSING = object()
+
+# Fields every agent that produces code overwrites with its latest output. A sequential run keeps the last
+# writer's value, so concurrent writes to them are resolved that way without being reported as conflicts.
+SCRATCH_FIELDS = ("current_code_snippet",)
+
+def _merge_changes(base: Any, changes: List[tuple], path: str, conflicts: List[str]) -> Any:
+    """Three-way merge of one value. changes is [(branch_name, new_value)] for branches that changed it."""
+    if len(changes) == 1:
+        return changes[0][1]
+    values = [value for _, value in changes]
+    if all(isinstance(v, dict) for v in values) and (base is _MISSING or base is None or isinstance(base, dict)):
+        base_dict = base if isinstance(base, dict) else {}
+        merged = {}
+        keys = list(base_dict) + [k for v in values for k in v if k not in base_dict]
+        for key in dict.fromkeys(keys):
+            base_value = base_dict.get(key, _MISSING)
+            key_changes = [(name, v.get(key, _MISSING)) for name, v in changes if v.get(key, _MISSING) != base_value]
+            value = _merge_changes(base_value, key_changes, f"{path}.{key}", conflicts) if key_changes else base_value
+            if value is not _MISSING:
+                merged[key] = value
+        return merged
+    if all(isinstance(v, list) for v in values) and (base is _MISSING or base is None or isinstance(base, list)):
+        merged = list(base) if isinstance(base, list) else []
+        for value in values:
+            merged.extend(item for item in value if item not in merged)
+        return merged
+    conflicts.append(f"{path}: changed by {[name for name, _ in changes]}; kept the value from {changes[-1][0]}")
+    return changes[-1][1]
+
+def merge_context_branches(base: ProjectContext, branches: List[tuple]) -> tuple:
+    """
+    Reconciles copies of a ProjectContext that were changed independently, e.g. by agents running
+    concurrently, into one context. branches is [(name, ProjectContext)] in workflow order.
+
+    A field changed by a single branch takes that branch's value. Dicts changed by several branches
+    are merged key by key, and lists are combined (base items, then each branch's new items). Any other
+    value changed by several branches is taken from the last branch, as a sequential run would have left it.
+    Returns (merged_context, conflicts), with one note per conflicting field; SCRATCH_FIELDS are not noted.
+    """
+    base_data = base.model_dump()
+    branch_data = [(name, context.model_dump()) for name, context in branches]
+    merged_data = {}
+    conflicts: List[str] = []
+    for field_name, base_value in base_data.items():
+        changes = [(name, data[field_name]) for name, data in branch_data if data[field_name] != base_value]
+        if field_name in SCRATCH_FIELDS and changes:
+            merged_data[field_name] = changes[-1][1]
+            continue
+        merged_data[field_name] = _merge_changes(base_value, changes, field_name, conflicts) if changes else base_value
+    for conflict in conflicts:
+        logging.warning(f"ProjectContext merge conflict: {conflict}")
+    return type(base).model_validate(merged_data), conflicts
+
 if __name__ == '__main__':
     # Example usage:
     context_path = Path("project_context.json")
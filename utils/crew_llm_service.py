@@ -3,13 +3,15 @@ import json
 import os
 import time
 import requests # This import is allowed as it's a standard library for HTTP calls
+from utils import http_transport # Shared keep-alive pools
+from utils.rate_limiter import get_rate_limiter, backoff_delay, estimate_tokens # Shared RPM/TPM limiter
 
 from prompts.mobile_crew_internal_prompts import get_crew_internal_prompt # CORRECTED
 from configs.mobile_agent_config import load_agent_config_from_json # CORRECTED
 
 MAX_LLM_RETRIES = 3
 RETRY_LLM_DELAY_SECONDS = 5
-GEMINI_API_BASE_URL = "https://generativelanguage.googleapis.com/v1beta/models" # Standard Gemini base
+GEMINI_API_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta/models") # Standard Gemini base
 
 # Default safety settings for Gemini
 DEFAULT_SAFETY_SETTINGS = [
@@ -78,13 +80,17 @@ def execute_crew_llm_task(agent_name: str, prompt_input_data: dict, api_key: str
         # "generationConfig": {} # Add if specific generation params are needed per agent
     }
 
+    limiter = get_rate_limiter()
+    estimated_tokens = estimate_tokens(prompt_string)
     for attempt in range(MAX_LLM_RETRIES):
+        limiter.acquire(model_name, estimated_tokens)
         print(f"[{agent_name}] Attempting LLM call {attempt + 1}/{MAX_LLM_RETRIES} to model {model_name}...")
         try:
-            response = requests.post(llm_url, headers=headers, json=payload, timeout=90)
+            response = http_transport.post(llm_url, headers=headers, json=payload, timeout=90)
             response.raise_for_status()
 
             response_data = response.json()
+            limiter.record_usage(model_name, estimated_tokens, response_data.get('usageMetadata', {}).get('totalTokenCount'))
 
             if 'candidates' in response_data and response_data['candidates']:
                 candidate = response_data['candidates'][0]
@@ -110,8 +116,9 @@ def execute_crew_llm_task(agent_name: str, prompt_input_data: dict, api_key: str
             print(f"ERROR: {error_msg}")
             if status_code == 429 or status_code >= 500:
                 if attempt < MAX_LLM_RETRIES - 1:
-                    print(f"[{agent_name}] Retrying in {RETRY_LLM_DELAY_SECONDS}s...")
-                    time.sleep(RETRY_LLM_DELAY_SECONDS)
+                    # Honours Retry-After / RetryInfo; the next acquire() waits it out
+                    delay = limiter.report_throttle(model_name, http_err.response, attempt)
+                    print(f"[{agent_name}] Retrying in {delay:.1f}s...")
                 else:
                     return {"status": "error", "message": error_msg} # Failed after retries
             else:
@@ -120,8 +127,9 @@ def execute_crew_llm_task(agent_name: str, prompt_input_data: dict, api_key: str
             error_msg = f"[{agent_name}] Request exception calling LLM: {req_err}"
             print(f"ERROR: {error_msg}")
             if attempt < MAX_LLM_RETRIES - 1:
-                print(f"[{agent_name}] Retrying in {RETRY_LLM_DELAY_SECONDS}s...")
-                time.sleep(RETRY_LLM_DELAY_SECONDS)
+                delay = backoff_delay(attempt, base=RETRY_LLM_DELAY_SECONDS)
+                print(f"[{agent_name}] Retrying in {delay:.1f}s...")
+                time.sleep(delay)
             else:
                 return {"status": "error", "message": error_msg} # Failed after retries
         except Exception as e:
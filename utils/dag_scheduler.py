@@ -0,0 +1,129 @@
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Any, Dict, Iterable, List, Optional
+
+
+class DagStep:
+    """One unit of work in a DagScheduler run. func takes no arguments and runs on a worker
+    thread once every step named in depends_on has completed."""
+    def __init__(self, name: str, func: Callable[[], Any], depends_on: Iterable[str] = ()):
+        self.name = name
+        self.func = func
+        self.depends_on = list(depends_on)
+
+    def __repr__(self):
+        return f"DagStep({self.name!r}, depends_on={self.depends_on!r})"
+
+
+class DagScheduler:
+    """Runs steps on a bounded thread pool as soon as their dependencies are done.
+
+    Steps are declared in a valid sequential order (dependencies first). Two callbacks run on
+    the calling thread:
+      on_complete(step, result) - as soon as a step finishes, before its dependents are
+                                  started; use it to publish outputs the dependents read.
+      commit(step, result)      - strictly in declaration order, so accumulated errors and
+                                  artifacts come out exactly as in a sequential run. Returning
+                                  False halts the run: nothing new is started and results of
+                                  later steps are discarded.
+    An exception raised by a step is re-raised when that step's turn to commit comes; no new
+    steps declared after a step that raised are started, so its dependents never start.
+    A step whose result failed(step, result) reports as a failure (e.g. an error dict) is only
+    treated as done once it has been committed, and no later-declared step starts until then: commit
+    decides whether the run carries on (dependents then see the failed output, as they would
+    in a sequential run) or halts.
+    With start_after_commit=True a step only starts once its dependencies have been committed,
+    so it can read state that commit builds up.
+    With max_workers=1 the run is identical to executing the steps one after another."""
+    def __init__(self, steps: List[DagStep], max_workers: int = 4):
+        self.steps = steps
+        self.max_workers = max(1, max_workers)
+        self._validate()
+
+    def _validate(self):
+        seen = set()
+        for step in self.steps:
+            if step.name in seen:
+                raise ValueError(f"Duplicate step name: {step.name}")
+            for dependency in step.depends_on:
+                if dependency not in seen:
+                    raise ValueError(f"Step {step.name} depends on {dependency}, which is not declared before it")
+            seen.add(step.name)
+
+    def run(self, commit: Optional[Callable[[DagStep, Any], Optional[bool]]] = None,
+            on_complete: Optional[Callable[[DagStep, Any], None]] = None, start_after_commit: bool = False,
+            failed: Optional[Callable[[DagStep, Any], bool]] = None) -> bool:
+        """Execute the graph. Returns False if commit halted the run, True otherwise."""
+        finished: Dict[str, tuple] = {} # name -> (succeeded, result or exception)
+        committed = set()
+        uncommitted_failures = set() # Steps that raised or reported a failure and haven't been committed
+        position = {step.name: i for i, step in enumerate(self.steps)}
+        submitted = set()
+        running = {}
+        next_commit = 0
+        halted = False
+        pending_error: Optional[BaseException] = None
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="dag") as executor:
+            while True:
+                if not halted:
+                    # Steps declared after an uncommitted failure wait; earlier ones still run so its commit turn comes
+                    barrier = min((position[name] for name in uncommitted_failures), default=len(self.steps))
+                    for step in self.steps[:barrier]:
+                        if len(running) >= self.max_workers:
+                            break
+                        ready = committed if start_after_commit else finished
+                        if step.name not in submitted and all(d in ready for d in step.depends_on):
+                            submitted.add(step.name)
+                            running[executor.submit(step.func)] = step
+                if not running:
+                    break
+
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in sorted(done, key=lambda f: position[running[f].name]):
+                    step = running.pop(future)
+                    try:
+                        finished[step.name] = (True, future.result())
+                    except Exception as e:
+                        finished[step.name] = (False, e)
+                        uncommitted_failures.add(step.name)
+                        continue
+                    if failed and failed(step, finished[step.name][1]):
+                        uncommitted_failures.add(step.name)
+                    if on_complete and not halted:
+                        on_complete(step, finished[step.name][1])
+
+                while not halted and next_commit < len(self.steps) and self.steps[next_commit].name in finished:
+                    step = self.steps[next_commit]
+                    succeeded, result = finished[step.name]
+                    if not succeeded:
+                        halted = True
+                        pending_error = result
+                        break
+                    if commit and commit(step, result) is False:
+                        halted = True
+                    committed.add(step.name)
+                    uncommitted_failures.discard(step.name)
+                    next_commit += 1
+
+        if pending_error is not None:
+            raise pending_error
+        return not halted
+
+
+def without_steps(graph: Dict[str, List[str]], removed: Iterable[str]) -> Dict[str, List[str]]:
+    """Graph (step -> dependencies) without the removed steps. A step that depended on a removed
+    step depends on that step's own remaining dependencies instead, so ordering through it is kept
+    (removing b from a <- b <- c leaves a <- c)."""
+    removed = set(removed)
+
+    def _resolve(dependency: str, seen: frozenset) -> List[str]:
+        if dependency not in removed:
+            return [dependency]
+        if dependency in seen:
+            return []
+        return [d for parent in graph.get(dependency, []) for d in _resolve(parent, seen | {dependency})]
+
+    return {
+        step: list(dict.fromkeys(d for dep in deps for d in _resolve(dep, frozenset())))
+        for step, deps in graph.items() if step not in removed
+    }
@@ -1,8 +1,83 @@
 import sqlite3
-import numpy as np
-from numpy.linalg import norm
+import threading
 import time # For timestamp in store_embedding if we re-add it
-from typing import Optional, List, Tuple # ADDED
+from typing import Optional, List, Tuple, TYPE_CHECKING # ADDED
+
+if TYPE_CHECKING:
+    import numpy as np # numpy is imported where embeddings are handled, so opening the database doesn't load it
+
+# Every insert, replace, update or delete of a memory row appends its item_id here (by trigger, so writes from
+# other connections and processes are seen too). AUTOINCREMENT ids are never reused, unlike rowids, so a
+# reader that remembers the last change_id it applied can catch up on exactly what changed since.
+MEMORY_CHANGE_LOG_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS memory_changes (
+        change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        item_id TEXT
+    )
+    """,
+    "CREATE TRIGGER IF NOT EXISTS memory_changes_insert AFTER INSERT ON memory BEGIN "
+    "INSERT INTO memory_changes (item_id) VALUES (NEW.item_id); END",
+    "CREATE TRIGGER IF NOT EXISTS memory_changes_update AFTER UPDATE OF item_id, embedding ON memory BEGIN "
+    "INSERT INTO memory_changes (item_id) VALUES (OLD.item_id); "
+    "INSERT INTO memory_changes (item_id) SELECT NEW.item_id WHERE NEW.item_id IS NOT OLD.item_id; END",
+    "CREATE TRIGGER IF NOT EXISTS memory_changes_delete AFTER DELETE ON memory BEGIN "
+    "INSERT INTO memory_changes (item_id) VALUES (OLD.item_id); END",
+)
+
+
+def create_memory_change_log(conn: sqlite3.Connection):
+    """Creates the memory change log and its triggers, and compacts it to the latest change of each item
+    (enough for any reader, however far behind, to see every item that changed after its position)"""
+    for statement in MEMORY_CHANGE_LOG_SCHEMA:
+        conn.execute(statement)
+    conn.execute("DELETE FROM memory_changes WHERE change_id NOT IN (SELECT MAX(change_id) FROM memory_changes GROUP BY item_id)")
+    conn.commit()
+
+
+def memory_change_position(conn: sqlite3.Connection) -> int:
+    """The latest change_id in the memory change log"""
+    return conn.execute("SELECT COALESCE(MAX(change_id), 0) FROM memory_changes").fetchone()[0]
+
+
+def items_changed_since(conn: sqlite3.Connection, change_id: int) -> List[str]:
+    return [row[0] for row in conn.execute(
+        "SELECT DISTINCT item_id FROM memory_changes WHERE change_id > ?", (change_id,)
+    )]
+
+
+def sync_memory_matrix(conn: sqlite3.Connection, matrix, position: Optional[int]) -> Tuple[int, List[str], List[str]]:
+    """
+    Brings an EmbeddingMatrix in line with the memory table. position is the change_id the matrix is current
+    with, or None for an empty matrix (every row is loaded). Returns (new position, item_ids added or replaced,
+    item_ids removed). Changes are applied idempotently, so one committed while this runs is simply seen again.
+    """
+    if position is None:
+        new_position = memory_change_position(conn)
+        rows = conn.execute("SELECT item_id, embedding FROM memory").fetchall()
+        matrix.add_many(rows)
+        return new_position, [item_id for item_id, _ in rows], []
+
+    changes = conn.execute(
+        "SELECT change_id, item_id FROM memory_changes WHERE change_id > ? ORDER BY change_id", (position,)
+    ).fetchall()
+    if not changes:
+        return position, [], []
+    changed = list(dict.fromkeys(item_id for _, item_id in changes))
+    rows = []
+    for start in range(0, len(changed), 500): # Stays under SQLite's bound parameter limit
+        chunk = changed[start:start + 500]
+        rows.extend(conn.execute(
+            f"SELECT item_id, embedding FROM memory WHERE item_id IN ({', '.join('?' for _ in chunk)})", chunk
+        ).fetchall())
+    rows = [(item_id, embedding) for item_id, embedding in rows if embedding]
+    present = {item_id for item_id, _ in rows}
+    removed = [item_id for item_id in changed if item_id not in present]
+    for item_id in removed:
+        matrix.remove(item_id)
+    matrix.add_many(rows)
+    return changes[-1][0], [item_id for item_id, _ in rows], removed
+
 
 class Database:
     def __init__(self, db_file_path: str = "qnatz_crew.db"):
@@ -13,12 +88,20 @@ class Database:
         self.db_file_path = db_file_path
         self.conn: Optional[sqlite3.Connection] = None # Type hint for conn
         self.cursor: Optional[sqlite3.Cursor] = None # Type hint for cursor
+        # Agents running concurrently share this connection; the lock serializes use of the cursor
+        self._lock = threading.RLock()
+        # Embeddings of the memory table as one matrix (utils/embedding_matrix.py), loaded on the first search
+        # and then kept current from the memory change log (changes after _embeddings_change_id)
+        self._embeddings = None
+        self._embeddings_change_id: Optional[int] = None
+        # Approximate index over the matrix (utils/ann_index.py), used once the table is large enough
+        self._ann_index = None
         self._connect_and_initialize()
 
     def _connect_and_initialize(self):
         """Establishes connection and initializes the database table."""
         try:
-            self.conn = sqlite3.connect(self.db_file_path)
+            self.conn = sqlite3.connect(self.db_file_path, check_same_thread=False)
             self.cursor = self.conn.cursor()
             self._create_memory_table()
             # Consider logging successful connection here if a logger is passed or available globally
@@ -37,24 +120,38 @@ class Database:
                 role TEXT,
                 content TEXT,
                 embedding BLOB,
-                creation_time REAL
+                creation_time REAL,
+                project TEXT
             )
             """)
+            # Tables created before the project column existed get it added
+            columns = {row[1] for row in self.cursor.execute("PRAGMA table_info(memory)").fetchall()}
+            if "project" not in columns:
+                self.cursor.execute("ALTER TABLE memory ADD COLUMN project TEXT")
+            # Indexes for the metadata pre-filters of retrieve_similar_items
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_memory_agent_id ON memory (agent_id)")
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_memory_role ON memory (role)")
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_memory_project_time ON memory (project, creation_time)")
+            self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_memory_creation_time ON memory (creation_time)")
         if self.conn:
             self.conn.commit()
+            create_memory_change_log(self.conn)
 
     @staticmethod
-    def _cosine_similarity(a: np.ndarray, b: np.ndarray) -> float: # Type hint
+    def _cosine_similarity(a: "np.ndarray", b: "np.ndarray") -> float: # Type hint
         """Calculate cosine similarity between two numpy arrays."""
+        import numpy as np
+        from numpy.linalg import norm
         norm_a = norm(a)
         norm_b = norm(b)
         if norm_a == 0 or norm_b == 0: # Handle zero vectors
             return 0.0
         return np.dot(a, b) / (norm_a * norm_b)
 
-    def store_embedding(self, item_id: str, agent_id: str, role: str, content: str, embedding: np.ndarray) -> bool:
+    def store_embedding(self, item_id: str, agent_id: str, role: str, content: str, embedding: "np.ndarray",
+                        project: Optional[str] = None) -> bool:
         """
-        Stores an embedding in the database.
+        Stores an embedding in the database, optionally tagged with the project it belongs to.
         Returns True on success, False otherwise.
         """
         if self.conn is None or self.cursor is None:
@@ -62,43 +159,136 @@ class Database:
             return False
         try:
             embedding_bytes = embedding.tobytes()
-            self.cursor.execute(
-                "INSERT OR REPLACE INTO memory (item_id, agent_id, role, content, embedding, creation_time) VALUES (?, ?, ?, ?, ?, ?)",
-                (item_id, agent_id, role, content, embedding_bytes, time.time()),
-            )
-            self.conn.commit()
+            with self._lock:
+                self.cursor.execute(
+                    "INSERT OR REPLACE INTO memory (item_id, agent_id, role, content, embedding, creation_time, project) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (item_id, agent_id, role, content, embedding_bytes, time.time(), project),
+                )
+                self.conn.commit()
             return True
         except sqlite3.Error as e:
             print(f"Error storing embedding for item_id {item_id}: {e}")
             return False
 
-    def retrieve_similar_items(self, query_embedding: np.ndarray, top_k: int = 5) -> List[Tuple[str, str, str, str, float]]: # Type hint
+    def _sync_embeddings(self):
+        """Applies memory rows stored, replaced or deleted (by any connection) since the last search to the embedding matrix"""
+        from utils.embedding_matrix import EmbeddingMatrix
+        with self._lock:
+            if self._embeddings is None:
+                self._embeddings = EmbeddingMatrix()
+                self._embeddings_change_id = None
+            self._embeddings_change_id, changed, removed = sync_memory_matrix(self.conn, self._embeddings, self._embeddings_change_id)
+            if self._ann_index is not None:
+                for item_id in removed:
+                    self._ann_index.remove(item_id)
+                self._ann_index.add_many(self._embeddings, changed)
+                self._ann_index.change_id = self._embeddings_change_id
+            return self._embeddings
+
+    def _approximate_index(self, matrix):
+        """IVF index over the matrix once it has AnnIndexConfig.MIN_ITEMS embeddings (loaded from disk, or trained), else None"""
+        from utils.ann_index import AnnIndexConfig, IVFIndex, index_path_for
+        if not AnnIndexConfig.ENABLED or len(matrix) < AnnIndexConfig.MIN_ITEMS:
+            return None
+        with self._lock:
+            index_path = index_path_for(self.db_file_path)
+            if self._ann_index is None:
+                self._ann_index = IVFIndex.load(index_path)
+                if self._ann_index is not None and self._ann_index.centroids.shape[1] == matrix.dim:
+                    self._ann_index.reconcile(matrix, self._changed_since_index(self._ann_index, matrix))
+                    self._ann_index.change_id = self._embeddings_change_id
+                else:
+                    self._ann_index = IVFIndex()
+            if self._ann_index.needs_training(len(matrix)):
+                self._ann_index.train(matrix)
+                self._ann_index.change_id = self._embeddings_change_id
+                self._ann_index.save(index_path)
+            return self._ann_index
+
+    def _changed_since_index(self, index, matrix) -> List[str]:
+        """Items whose embeddings may have changed since a loaded index was saved: everything logged after its
+        change_id, or all of them if it has no usable position (saved before the change log, or for another database)"""
+        if index.change_id is None or index.change_id > memory_change_position(self.conn):
+            return [matrix.key(row) for row in range(len(matrix))]
+        return items_changed_since(self.conn, index.change_id)
+
+    def delete_item(self, item_id: str) -> bool:
+        """Removes a memory item from the table, the embedding matrix and the approximate index"""
+        if self.conn is None or self.cursor is None:
+            print("Database connection not initialized. Call connect() first.")
+            return False
+        try:
+            with self._lock:
+                self.cursor.execute("DELETE FROM memory WHERE item_id = ?", (item_id,))
+                self.conn.commit()
+                if self._embeddings is not None:
+                    self._embeddings.remove(item_id)
+                if self._ann_index is not None:
+                    self._ann_index.remove(item_id)
+            return True
+        except sqlite3.Error as e:
+            print(f"Error deleting item_id {item_id}: {e}")
+            return False
+
+    @staticmethod
+    def _memory_filter(agent_id=None, role=None, project=None, since: Optional[float] = None,
+                       until: Optional[float] = None) -> Tuple[str, tuple]:
+        """WHERE clause and parameters for the metadata filters; agent_id, role and project take one value or a list"""
+        clauses, params = [], []
+        for column, value in (("agent_id", agent_id), ("role", role), ("project", project)):
+            if value is None:
+                continue
+            values = [value] if isinstance(value, str) else list(value)
+            clauses.append(f"{column} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+        if since is not None:
+            clauses.append("creation_time >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("creation_time < ?")
+            params.append(until)
+        return " AND ".join(clauses), tuple(params)
+
+    def retrieve_similar_items(self, query_embedding: "np.ndarray", top_k: int = 5, agent_id=None, role=None,
+                               project=None, since: Optional[float] = None, until: Optional[float] = None) -> List[Tuple[str, str, str, str, float]]: # Type hint
         """
         Retrieves similar items based on cosine similarity.
+        Optional filters restrict the search to some agents, roles or projects (a value or a list of values)
+        and to creation_time in [since, until); they are applied in SQL, using the memory indexes, before
+        the matching embeddings are scored.
         Returns a list of tuples: (item_id, agent_id, role, content, similarity)
         """
         if self.conn is None or self.cursor is None:
             print("Database connection not initialized. Call connect() first.")
             return []
 
-        query_embedding_np = np.array(query_embedding, dtype=np.float32) # Ensure it's a numpy array
-
+        where, params = self._memory_filter(agent_id, role, project, since, until)
         try:
-            self.cursor.execute("SELECT item_id, agent_id, role, content, embedding FROM memory")
-            rows: List[Tuple[str, str, str, str, bytes]] = self.cursor.fetchall() # Type hint for rows
-
-            results: List[Tuple[str, str, str, str, float]] = [] # Type hint for results
-            for row_data in rows: # Renamed row to row_data to avoid conflict with outer scope (if any)
-                item_id, agent_id, role, content, embedding_bytes = row_data
-                embedding = np.frombuffer(embedding_bytes, dtype=np.float32)
-                similarity = self._cosine_similarity(query_embedding_np, embedding)
-                results.append((item_id, agent_id, role, content, float(similarity))) # Cast similarity to float
-
-            results.sort(key=lambda x: x[4], reverse=True)
-            return results[:top_k]
+            with self._lock:
+                matrix = self._sync_embeddings()
+                if where:
+                    # Only the matching slice is scored (exactly; filtered slices are small next to the whole table)
+                    item_ids = [row[0] for row in self.conn.execute(f"SELECT item_id FROM memory WHERE {where}", params)]
+                    best = matrix.top_k(query_embedding, top_k, matrix.rows_for(item_ids))
+                else:
+                    index = self._approximate_index(matrix)
+                    best = index.search(matrix, query_embedding, top_k) if index else matrix.top_k(query_embedding, top_k)
+                if not best:
+                    return []
+                placeholders = ", ".join("?" for _ in best)
+                details = {
+                    row[0]: row for row in self.conn.execute(
+                        f"SELECT item_id, agent_id, role, content FROM memory WHERE item_id IN ({placeholders})",
+                        tuple(item_id for item_id, _ in best)
+                    )
+                }
+            return [details[item_id] + (similarity,) for item_id, similarity in best if item_id in details]
         except sqlite3.Error as e:
             print(f"Error retrieving similar items: {e}")
             return []
+        except ValueError as e: # Query dimension doesn't match the stored embeddings
+            print(f"Error retrieving similar items: {e}")
+            return []
 
     def execute(self, sql: str, params: Optional[tuple] = None) -> Optional[sqlite3.Cursor]: # Type hint for params
         """Execute an SQL query. Useful for other operations if needed."""
@@ -106,18 +296,25 @@ class Database:
             print("Not connected to database")
             return None
         try:
-            if params:
-                self.cursor.execute(sql, params)
-            else:
-                self.cursor.execute(sql)
-            self.conn.commit()
-            return self.cursor
+            with self._lock:
+                if params:
+                    self.cursor.execute(sql, params)
+                else:
+                    self.cursor.execute(sql)
+                self.conn.commit()
+                return self.cursor
         except sqlite3.Error as e:
             print(f"Error executing SQL: {sql}, Error: {e}")
             return None
 
     def close(self):
         """Closes the database connection."""
+        if self._ann_index is not None and self._ann_index.dirty:
+            from utils.ann_index import index_path_for
+            try:
+                self._ann_index.save(index_path_for(self.db_file_path))
+            except OSError as e:
+                print(f"Error saving the approximate memory index: {e}")
         if self.conn:
             self.conn.close()
             self.conn = None
@@ -127,6 +324,7 @@ class Database:
 if __name__ == '__main__':
     # Added os import for file removal
     import os
+    import numpy as np
     print("--- Testing Database Class ---")
     db_instance = Database(db_file_path="test_qnatz_crew.db") # Use a test DB file
 
@@ -0,0 +1,135 @@
+"""
+In-memory embedding matrix for cosine top-k search over the memory table.
+
+Embeddings are kept in one contiguous float32 matrix with their norms precomputed, so a
+query is scored with a single matrix-vector product and reduced with argpartition instead
+of decoding and comparing rows one by one in Python.
+"""
+import numpy as np
+from typing import Optional, Dict, List, Tuple, Iterable, Sequence
+
+
+class EmbeddingMatrix:
+    """Row-per-item float32 matrix with precomputed norms; rows are appended (or replaced) incrementally"""
+    def __init__(self, initial_capacity: int = 1024):
+        self.initial_capacity = initial_capacity
+        self.dim: Optional[int] = None
+        self.count = 0
+        self.skipped = 0 # Embeddings ignored because their dimension differs from the matrix's
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._norms = np.zeros(0, dtype=np.float32)
+        self._keys: List[str] = []
+        self._row_of: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._row_of
+
+    def _reserve(self, rows: int):
+        if rows <= self._vectors.shape[0]:
+            return
+        capacity = max(rows, self.initial_capacity, 2 * self._vectors.shape[0])
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        norms = np.zeros(capacity, dtype=np.float32)
+        vectors[:self.count] = self._vectors[:self.count]
+        norms[:self.count] = self._norms[:self.count]
+        self._vectors, self._norms = vectors, norms
+
+    def add(self, key: str, embedding) -> bool:
+        """Appends an embedding (array or float32 bytes), or replaces the row already stored under key"""
+        vector = np.frombuffer(embedding, dtype=np.float32) if isinstance(embedding, (bytes, bytearray, memoryview)) \
+            else np.asarray(embedding, dtype=np.float32).ravel()
+        if self.dim is None:
+            self.dim = vector.shape[0]
+            self._vectors = np.zeros((0, self.dim), dtype=np.float32)
+        if vector.shape[0] != self.dim:
+            self.skipped += 1
+            return False
+        row = self._row_of.get(key)
+        if row is None:
+            self._reserve(self.count + 1)
+            row = self.count
+            self._row_of[key] = row
+            self._keys.append(key)
+            self.count += 1
+        self._vectors[row] = vector
+        self._norms[row] = np.linalg.norm(vector)
+        return True
+
+    def add_many(self, items: Iterable[Tuple[str, bytes]]):
+        """Bulk add of (key, float32 bytes) pairs, e.g. rows read from SQLite"""
+        fresh: Dict[str, bytes] = {}
+        for key, blob in items:
+            if not blob:
+                continue
+            if self.dim is None or key in self._row_of:
+                self.add(key, blob)
+            elif len(blob) == self.dim * 4:
+                fresh[key] = blob # Later duplicates of a key win, as with add()
+            else:
+                self.skipped += 1
+        if not fresh:
+            return
+        # New rows of the right size are decoded in one frombuffer call and copied in as a block
+        block = np.frombuffer(b"".join(fresh.values()), dtype=np.float32).reshape(len(fresh), self.dim)
+        self._reserve(self.count + len(fresh))
+        end = self.count + len(fresh)
+        self._vectors[self.count:end] = block
+        self._norms[self.count:end] = np.linalg.norm(block, axis=1)
+        for row, key in enumerate(fresh, start=self.count):
+            self._row_of[key] = row
+            self._keys.append(key)
+        self.count = end
+
+    def remove(self, key: str) -> bool:
+        """Drops key's row; the last row moves into its place"""
+        row = self._row_of.pop(key, None)
+        if row is None:
+            return False
+        last = self.count - 1
+        if row != last:
+            moved_key = self._keys[last]
+            self._vectors[row] = self._vectors[last]
+            self._norms[row] = self._norms[last]
+            self._keys[row] = moved_key
+            self._row_of[moved_key] = row
+        self._keys.pop()
+        self.count = last
+        return True
+
+    def rows_for(self, keys: Iterable[str]) -> np.ndarray:
+        """Row numbers of the given keys (keys not in the matrix are left out)"""
+        return np.fromiter((self._row_of[k] for k in keys if k in self._row_of), dtype=np.int64)
+
+    def vectors(self, rows: Optional[Sequence[int]] = None) -> np.ndarray:
+        """The stored embeddings (all of them, or the given rows)"""
+        return self._vectors[:self.count] if rows is None else self._vectors[np.asarray(rows, dtype=np.int64)]
+
+    def key(self, row: int) -> str:
+        return self._keys[row]
+
+    def scores(self, query, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Cosine similarity of query to every row (or to the given rows); zero vectors score 0"""
+        query = np.asarray(query, dtype=np.float32).ravel()
+        if self.dim is not None and query.shape[0] != self.dim:
+            raise ValueError(f"Query has dimension {query.shape[0]}, stored embeddings have {self.dim}")
+        vectors = self._vectors[:self.count] if rows is None else self._vectors[rows]
+        norms = self._norms[:self.count] if rows is None else self._norms[rows]
+        denominators = norms * np.linalg.norm(query)
+        dots = vectors @ query
+        return np.divide(dots, denominators, out=np.zeros_like(dots), where=denominators > 0)
+
+    def top_k(self, query, k: int, rows: Optional[np.ndarray] = None) -> List[Tuple[str, float]]:
+        """(key, similarity) of the k most similar rows, best first; rows restricts the search"""
+        if self.count == 0 or k <= 0 or (rows is not None and len(rows) == 0):
+            return []
+        scores = self.scores(query, rows)
+        if k < len(scores):
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best], kind="stable")]
+        else:
+            best = np.argsort(-scores, kind="stable")
+        row_numbers = best if rows is None else np.asarray(rows)[best]
+        return [(self._keys[row], float(scores[i])) for row, i in zip(row_numbers, best)]
@@ -2,9 +2,7 @@ import os
 from pathlib import Path
 import logging
 import datetime
-import requests  # Added missing import
 import sqlite3
-import numpy as np  # Import NumPy
 from typing import Optional # Added Optional
 
 DEEPSEEK_TIMEOUT = 120 # Default timeout for local LLM calls
@@ -33,6 +31,8 @@ class Database:
     def __init__(self, db_file=DATABASE_FILE):
         self.db_file = db_file
         self.conn = None
+        self._embeddings = None # EmbeddingMatrix of the memory table, see retrieve_similar_items
+        self._embeddings_change_id = None # Memory change log position the matrix is current with
 
     def connect(self):
         """Connect to the SQLite database"""
@@ -108,26 +108,35 @@ class Database:
 
     def retrieve_similar_items(self, query_embedding, top_k=5):
         """Retrieve similar items based on cosine similarity"""
+        # Loaded on first use; importing this module (for Logger) stays cheap
+        from utils.embedding_matrix import EmbeddingMatrix
+        from utils.database import create_memory_change_log, sync_memory_matrix
+        if not self.conn:
+            logger.error("Not connected to database")
+            return None
         try:
-            query_embedding = np.array(query_embedding)
-            cursor = self.execute("SELECT item_id, agent_id, role, content, embedding FROM memory")
-            results = []
-            for row in cursor:
-                item_id, agent_id, role, content, embedding_bytes = row
-                embedding = np.frombuffer(embedding_bytes, dtype=np.float32) # Assumes float32
-                similarity = self.cosine_similarity(query_embedding, embedding)
-                results.append((item_id, agent_id, role, content, similarity))
-
-            # Sort by similarity (descending)
-            results.sort(key=lambda x: x[4], reverse=True)
-            return results[:top_k]
+            if self._embeddings is None:
+                create_memory_change_log(self.conn)
+                self._embeddings = EmbeddingMatrix()
+            # Only rows stored, replaced or deleted since the last search are applied to the matrix (assumes float32)
+            self._embeddings_change_id, _, _ = sync_memory_matrix(self.conn, self._embeddings, self._embeddings_change_id)
+
+            best = self._embeddings.top_k(query_embedding, top_k)
+            if not best:
+                return []
+            cursor = self.execute(
+                f"SELECT item_id, agent_id, role, content FROM memory WHERE item_id IN ({', '.join('?' for _ in best)})",
+                tuple(item_id for item_id, _ in best)
+            )
+            details = {row[0]: row for row in cursor.fetchall()} if cursor else {}
+            return [details[item_id] + (similarity,) for item_id, similarity in best if item_id in details]
         except sqlite3.Error as e:
             logger.error(f"Error retrieving similar items: {e}")
             return None
 
     def cosine_similarity(self, a, b):
         """Calculate cosine similarity"""
-        # Added import for norm
+        import numpy as np
         from numpy.linalg import norm
         return np.dot(a, b) / (norm(a) * norm(b))
 
@@ -138,6 +147,7 @@ class LocalLLMClient:
     
     def generate(self, base_api_url: str, prompt: str, model_name: Optional[str] = None, max_tokens: int = 2048, temperature: float = 0.1, request_timeout: Optional[int] = None) -> str:
         """Generate text with configurable timeout and model"""
+        import requests
         actual_timeout = request_timeout if request_timeout is not None else self.default_timeout
 
         # Ensure base_api_url does not have a trailing slash before appending /completions
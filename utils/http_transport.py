@@ -0,0 +1,336 @@
+import os
+import asyncio
+import weakref
+import threading
+import logging
+from typing import Optional, Dict, Any
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.cassette import get_cassette
+
+try:
+    import httpx  # Optional: HTTP/2 (with the 'h2' extra) and native async requests
+except ImportError:
+    httpx = None
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = httpx is not None
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+class TransportConfig:
+    """Pool sizes and timeouts for the shared HTTP transport"""
+    POOL_CONNECTIONS = int(os.getenv("QREWS_HTTP_POOL_CONNECTIONS", "4"))
+    POOL_MAXSIZE = int(os.getenv("QREWS_HTTP_POOL_MAXSIZE", "16"))
+    CONNECT_TIMEOUT = float(os.getenv("QREWS_HTTP_CONNECT_TIMEOUT", "10"))
+    READ_TIMEOUT = float(os.getenv("QREWS_HTTP_READ_TIMEOUT", "90"))
+    # "auto" uses HTTP/2 for https hosts when httpx[http2] is installed, "off" disables it
+    HTTP2 = os.getenv("QREWS_HTTP2", "auto").lower()
+
+    @classmethod
+    def http2_enabled(cls) -> bool:
+        return HTTP2_AVAILABLE and cls.HTTP2 not in ("off", "0", "false", "no")
+
+
+class _HttpxResponse:
+    """Minimal requests.Response look-alike over an httpx.Response, so call sites keep
+    catching requests.exceptions.* regardless of which client served the call."""
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.http_version = response.http_version
+
+    @property
+    def text(self) -> str:
+        return self._response.text
+
+    @property
+    def content(self) -> bytes:
+        return self._response.content
+
+    def json(self, **kwargs):
+        return self._response.json(**kwargs)
+
+    def raise_for_status(self):
+        if 400 <= self.status_code < 600:
+            raise requests.exceptions.HTTPError(f"{self.status_code} Error for url: {self.url}", response=self)
+
+
+class _CountingAdapter(HTTPAdapter):
+    """HTTPAdapter that counts the connections it really opens. urllib3 reconnects a pooled connection
+    in place when the server has closed it, so the number of connection objects is not the number of handshakes."""
+    def __init__(self, **kwargs):
+        self.connects = 0
+        self._connects_lock = threading.Lock()
+        super().__init__(**kwargs)
+
+    def _count_connect(self):
+        with self._connects_lock:
+            self.connects += 1
+
+    def _install_counting_pools(self, manager):
+        adapter = self
+
+        def counting(connection_cls):
+            class CountingConnection(connection_cls):
+                def connect(self):
+                    adapter._count_connect()
+                    return super().connect()
+            return CountingConnection
+
+        manager.pool_classes_by_scheme = {
+            scheme: type(pool_cls.__name__, (pool_cls,), {"ConnectionCls": counting(pool_cls.ConnectionCls)})
+            for scheme, pool_cls in manager.pool_classes_by_scheme.items()
+        }
+        return manager
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self._install_counting_pools(self.poolmanager)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        if proxy in self.proxy_manager:
+            return self.proxy_manager[proxy]
+        return self._install_counting_pools(super().proxy_manager_for(proxy, **proxy_kwargs))
+
+
+class HttpTransport:
+    """Process-wide HTTP transport with one keep-alive pool per host.
+
+    Every LLM call path posts through here instead of bare requests.post so repeated
+    calls to the same host skip the TCP/TLS handshake."""
+    def __init__(self, config: type = TransportConfig):
+        self.config = config
+        self._sessions: Dict[str, requests.Session] = {}
+        self._http2_clients: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._request_counts: Dict[str, int] = {}
+        # loop -> (AsyncClient, lifetime generator); an entry is dropped and its client closed when the loop shuts down
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Any]" = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def _host_key(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def _normalize_timeout(self, timeout):
+        """(connect, read) tuple; a bare number is the caller's read timeout"""
+        if timeout is None:
+            return (self.config.CONNECT_TIMEOUT, self.config.READ_TIMEOUT)
+        if isinstance(timeout, (int, float)):
+            return (min(self.config.CONNECT_TIMEOUT, timeout), timeout)
+        return timeout
+
+    def _get_session(self, host: str) -> requests.Session:
+        session = self._sessions.get(host)
+        if session is None:
+            with self._lock:
+                session = self._sessions.get(host)
+                if session is None:
+                    session = requests.Session()
+                    adapter = _CountingAdapter(
+                        pool_connections=self.config.POOL_CONNECTIONS,
+                        pool_maxsize=self.config.POOL_MAXSIZE
+                    )
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._sessions[host] = session
+        return session
+
+    def _get_http2_client(self, host: str):
+        client = self._http2_clients.get(host)
+        if client is None:
+            with self._lock:
+                client = self._http2_clients.get(host)
+                if client is None:
+                    limits = httpx.Limits(
+                        max_connections=self.config.POOL_MAXSIZE,
+                        max_keepalive_connections=self.config.POOL_MAXSIZE
+                    )
+                    client = httpx.Client(http2=True, limits=limits)
+                    self._http2_clients[host] = client
+        return client
+
+    def _count(self, host: str):
+        with self._lock:
+            self._request_counts[host] = self._request_counts.get(host, 0) + 1
+
+    def post(self, url: str, timeout=None, **kwargs):
+        """POST through the pooled session for url's host. Mirrors requests.post."""
+        cassette = get_cassette()
+        if cassette is not None:
+            if cassette.mode == "replay":
+                return cassette.replay(url, **kwargs)
+            return cassette.record(self._post_live, url, timeout=timeout, **kwargs)
+        return self._post_live(url, timeout=timeout, **kwargs)
+
+    def _post_live(self, url: str, timeout=None, **kwargs):
+        host = self._host_key(url)
+        timeout = self._normalize_timeout(timeout)
+        self._count(host)
+
+        # Streamed responses stay on requests so callers can use iter_lines()
+        if host.startswith("https://") and self.config.http2_enabled() and not kwargs.get("stream"):
+            return self._post_http2(host, url, timeout, **kwargs)
+        return self._get_session(host).post(url, timeout=timeout, **kwargs)
+
+    def _post_http2(self, host: str, url: str, timeout, **kwargs):
+        client = self._get_http2_client(host)
+        connect_timeout, read_timeout = timeout
+        try:
+            response = client.post(
+                url,
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                **kwargs
+            )
+        except httpx.HTTPError as e:
+            raise self._as_requests_error(e)
+        return _HttpxResponse(response)
+
+    @staticmethod
+    def _as_requests_error(e) -> requests.exceptions.RequestException:
+        if isinstance(e, httpx.TimeoutException):
+            return requests.exceptions.Timeout(str(e))
+        if isinstance(e, httpx.ConnectError):
+            return requests.exceptions.ConnectionError(str(e))
+        return requests.exceptions.RequestException(str(e))
+
+    async def _get_async_client(self):
+        # httpx.AsyncClient is bound to the loop it first runs on, so keep one per loop
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            # Loops closed without shutdown_asyncgens() never ran their client's cleanup; just forget them
+            for stale in [other for other in self._async_clients if other.is_closed()]:
+                del self._async_clients[stale]
+            entry = self._async_clients.get(loop)
+            if entry is None:
+                limits = httpx.Limits(
+                    max_connections=self.config.POOL_MAXSIZE * self.config.POOL_CONNECTIONS,
+                    max_keepalive_connections=self.config.POOL_MAXSIZE
+                )
+                client = httpx.AsyncClient(http2=self.config.http2_enabled(), limits=limits)
+                entry = (client, self._async_client_lifetime(loop, client))
+                self._async_clients[loop] = entry
+                created = True
+            else:
+                created = False
+        if created:
+            # Runs up to its yield; the loop's shutdown_asyncgens() (asyncio.run does it) then closes the client
+            await entry[1].__anext__()
+        return entry[0]
+
+    async def apost(self, url: str, timeout=None, **kwargs):
+        """Async POST. Uses a shared httpx.AsyncClient when httpx is installed,
+        otherwise runs the pooled sync post in a worker thread."""
+        cassette = get_cassette()
+        if cassette is not None:
+            if cassette.mode == "replay":
+                return await cassette.areplay(url, **kwargs)
+            return await cassette.arecord(self._apost_live, url, timeout=timeout, **kwargs)
+        return await self._apost_live(url, timeout=timeout, **kwargs)
+
+    async def _apost_live(self, url: str, timeout=None, **kwargs):
+        if httpx is None:
+            return await asyncio.to_thread(self._post_live, url, timeout=timeout, **kwargs)
+
+        host = self._host_key(url)
+        timeout = self._normalize_timeout(timeout)
+        self._count(host)
+
+        connect_timeout, read_timeout = timeout
+        try:
+            client = await self._get_async_client()
+            response = await client.post(
+                url,
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                **kwargs
+            )
+        except httpx.HTTPError as e:
+            raise self._as_requests_error(e)
+        return _HttpxResponse(response)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Per-host request and connection counters.
+
+        'reused' is the number of requests served on an already open connection."""
+        report: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for host, count in self._request_counts.items():
+                report[host] = {"requests": count, "connections": None, "reused": None, "http2": False}
+            sessions = dict(self._sessions)
+            http2_hosts = set(self._http2_clients)
+
+        for host, session in sessions.items():
+            # TCP connects (handshakes), reconnects of pooled connections included
+            new_connections = sum(adapter.connects for adapter in set(session.adapters.values())
+                                  if isinstance(adapter, _CountingAdapter))
+            entry = report.setdefault(host, {"requests": 0, "http2": False})
+            entry["connections"] = new_connections
+            entry["reused"] = max(entry["requests"] - new_connections, 0)
+        for host in http2_hosts:
+            # httpx multiplexes over a single connection per host; it does not expose counts
+            report.setdefault(host, {"requests": 0, "connections": None, "reused": None})["http2"] = True
+        return report
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            for client in self._http2_clients.values():
+                client.close()
+            self._sessions.clear()
+            self._http2_clients.clear()
+
+    async def aclose(self):
+        """Close the async client owned by the running loop"""
+        with self._lock:
+            entry = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if entry is not None:
+            await entry[1].aclose()
+
+    async def _async_client_lifetime(self, loop, client):
+        """Holds loop's AsyncClient open until the loop shuts down its async generators (or aclose() is called)"""
+        try:
+            yield
+        finally:
+            with self._lock:
+                if self._async_clients.get(loop, (None,))[0] is client:
+                    del self._async_clients[loop]
+            await client.aclose()
+
+
+_transport: Optional[HttpTransport] = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> HttpTransport:
+    """Return the process-wide transport, creating it on first use"""
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = HttpTransport()
+    return _transport
+
+
+def post(url: str, **kwargs):
+    """Drop-in replacement for requests.post that uses the shared pools"""
+    return get_transport().post(url, **kwargs)
+
+
+async def apost(url: str, **kwargs):
+    """Async counterpart of post()"""
+    return await get_transport().apost(url, **kwargs)
+
+
+def transport_stats() -> Dict[str, Dict[str, Any]]:
+    return get_transport().stats()
@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from typing import Optional, Dict, Any, Iterable
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalConfig:
+    """Settings for skipping agents whose inputs are unchanged since a previous run"""
+    # Off by default while recording or replaying a cassette (QREWS_CASSETTE_MODE, see CassetteConfig), like
+    # the response cache: replayed outputs would skip the model calls the cassette is meant to capture.
+    # Read from the environment directly so main doesn't import utils.cassette (and requests) at startup.
+    ENABLED = os.getenv(
+        "QREWS_INCREMENTAL", "0" if os.getenv("QREWS_CASSETTE_MODE", "off").lower() in ("record", "replay") else "1"
+    ).lower() not in ("0", "off", "false", "no")
+    DB_PATH = os.getenv("QREWS_INCREMENTAL_PATH", "agent_outputs.db")
+    # Comma-separated agent names that always run
+    BYPASS_AGENTS = [a.strip() for a in os.getenv("QREWS_INCREMENTAL_BYPASS", "").split(",") if a.strip()]
+
+    @classmethod
+    def is_bypassed(cls, agent_name: str) -> bool:
+        return agent_name in cls.BYPASS_AGENTS
+
+
+# ProjectContext fields read when an agent's prompt is built (Agent._build_task_prompt and the crew sub-agent bases)
+PROMPT_CONTEXT_FIELDS = (
+    "project_name", "project_type", "objective", "current_dir", "project_summary",
+    "architecture", "plan", "analysis", "current_code_snippet", "error_report", "tech_stack",
+)
+
+
+def context_slice(project_context, fields: Iterable[str]) -> Dict[str, Any]:
+    """The part of a ProjectContext an agent consumes, as JSON-ready data"""
+    return project_context.model_dump(mode="json", include=set(fields))
+
+
+def input_fingerprint(agent_name: str, context_data: Dict[str, Any], crew_inputs: Optional[Dict[str, Any]],
+                      prompt_template: Optional[str], model_config: Dict[str, Any]) -> str:
+    """Hash of everything that determines an agent's output: its context slice, crew inputs,
+    prompt template text (its version) and model settings"""
+    material = {
+        "agent": agent_name,
+        "context": context_data,
+        "crew_inputs": crew_inputs or {},
+        "template": hashlib.sha256((prompt_template or "").encode("utf-8")).hexdigest(),
+        "model": model_config,
+    }
+    canonical = json.dumps(material, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def context_delta(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    """What an agent changed in the ProjectContext (both sides are model_dump(mode="json")).
+
+    Dict fields that only gained or changed keys are recorded key by key ("update") so a
+    restore doesn't drop keys other agents added since; anything else is replaced ("set")."""
+    delta = {"set": {}, "update": {}}
+    for field_name, value in after.items():
+        old = before.get(field_name)
+        if value == old:
+            continue
+        if isinstance(value, dict) and isinstance(old, dict) and set(old) <= set(value):
+            delta["update"][field_name] = {k: v for k, v in value.items() if old.get(k) != v}
+        else:
+            delta["set"][field_name] = value
+    return delta
+
+
+def apply_context_delta(project_context, delta: Dict[str, Any]):
+    """Replays a recorded context_delta onto project_context in place"""
+    data = project_context.model_dump(mode="json")
+    changed = set(delta.get("set", {})) | set(delta.get("update", {}))
+    data.update(delta.get("set", {}))
+    for field_name, updates in delta.get("update", {}).items():
+        data[field_name] = {**(data.get(field_name) or {}), **updates}
+    restored = type(project_context).model_validate(data)
+    for field_name in changed:
+        setattr(project_context, field_name, getattr(restored, field_name))
+
+
+class AgentOutputStore:
+    """Outputs of past agent runs in SQLite, keyed by input fingerprint.
+
+    Each row holds the agent's result dict and the change it made to the ProjectContext,
+    so a run with the same fingerprint can be replayed instead of calling the model."""
+    def __init__(self, db_path: str = IncrementalConfig.DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0}
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS agent_outputs (
+            fingerprint TEXT PRIMARY KEY,
+            agent_name TEXT,
+            result TEXT,
+            context_delta TEXT,
+            created_at REAL,
+            last_used REAL
+        )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_agent_outputs_agent ON agent_outputs (agent_name)")
+        self.conn.commit()
+
+    def get(self, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """{"result": ..., "context_delta": ...} recorded for this fingerprint, or None"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT result, context_delta FROM agent_outputs WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            self.conn.execute("UPDATE agent_outputs SET last_used = ? WHERE fingerprint = ?", (time.time(), fingerprint))
+            self.conn.commit()
+            self._stats["hits"] += 1
+        return {"result": json.loads(row[0]), "context_delta": json.loads(row[1])}
+
+    def put(self, fingerprint: str, agent_name: str, result: Dict[str, Any], delta: Dict[str, Any]) -> bool:
+        """Records an output; returns False when the result isn't plain JSON and can't be replayed"""
+        try:
+            result_json = json.dumps(result)
+            delta_json = json.dumps(delta)
+        except (TypeError, ValueError) as e:
+            logger.debug(f"Not recording output of {agent_name}: {e}")
+            return False
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO agent_outputs (fingerprint, agent_name, result, context_delta, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (fingerprint, agent_name, result_json, delta_json, now, now)
+            )
+            self.conn.commit()
+            self._stats["stores"] += 1
+        return True
+
+    def invalidate(self, agent_name: Optional[str] = None):
+        """Forget recorded outputs of one agent, or all of them"""
+        with self._lock:
+            if agent_name:
+                self.conn.execute("DELETE FROM agent_outputs WHERE agent_name = ?", (agent_name,))
+            else:
+                self.conn.execute("DELETE FROM agent_outputs")
+            self.conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            report = dict(self._stats)
+            report["entries"] = self.conn.execute("SELECT COUNT(*) FROM agent_outputs").fetchone()[0]
+        return report
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+_store: Optional[AgentOutputStore] = None
+_store_lock = threading.Lock()
+
+
+def get_output_store() -> Optional[AgentOutputStore]:
+    """Process-wide store, or None when incremental runs are disabled or the file can't be opened"""
+    global _store
+    if not IncrementalConfig.ENABLED:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                try:
+                    _store = AgentOutputStore()
+                except sqlite3.Error as e:
+                    logger.error(f"Could not open agent output store at {IncrementalConfig.DB_PATH}: {e}")
+                    IncrementalConfig.ENABLED = False
+                    return None
+    return _store
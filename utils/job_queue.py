@@ -0,0 +1,401 @@
+"""
+Job queue for running many project requests on one machine.
+
+Requirements are submitted as jobs; a pool of worker processes claims them and runs
+TaskMaster.start_workflow for each one in its own work directory (jobs/<job_id>/), so
+concurrent runs never share a project_context.json, outputs/ or generated files (projects/).
+Workers renew a lease on the job they run; a job whose worker died is requeued once its
+lease (QREWS_JOB_LEASE seconds) runs out. Heartbeats and results are only accepted from the
+worker that holds the job, so a worker that lost its lease can't overwrite the new run's result.
+
+The queue is a local SQLite table by default. Set QREWS_JOB_QUEUE=redis to use a
+Redis-compatible server instead (QREWS_REDIS_URL; any server speaking the Redis
+protocol works, e.g. a local stand-in during development).
+
+Usage:
+    python -m utils.job_queue submit "Build a todo API" "Build a recipe app"
+    python -m utils.job_queue work --workers 4 [--exit-when-idle]
+    python -m utils.job_queue status [job_id]
+"""
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import argparse
+import logging
+import threading
+import multiprocessing
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+JOB_FIELDS = ("job_id", "user_input", "status", "work_dir", "worker", "result", "error",
+              "created_at", "started_at", "finished_at", "heartbeat_at")
+
+
+class JobQueueConfig:
+    """Settings for the multi-project job queue"""
+    BACKEND = os.getenv("QREWS_JOB_QUEUE", "sqlite").lower()
+    DB_PATH = os.getenv("QREWS_JOB_QUEUE_PATH", "jobs.db")
+    REDIS_URL = os.getenv("QREWS_REDIS_URL", "redis://localhost:6379/0")
+    REDIS_PREFIX = os.getenv("QREWS_JOB_QUEUE_PREFIX", "qrews:jobs")
+    JOBS_DIR = os.getenv("QREWS_JOBS_DIR", "jobs")
+    WORKERS = int(os.getenv("QREWS_JOB_WORKERS", "2"))
+    POLL_INTERVAL = float(os.getenv("QREWS_JOB_POLL_INTERVAL", "1.0"))
+    # A running job whose worker hasn't sent a heartbeat for this many seconds is put back in the queue
+    LEASE_SECONDS = float(os.getenv("QREWS_JOB_LEASE", "120"))
+
+
+def worker_id(name: str) -> str:
+    """Identity a worker claims jobs under: unique across hosts and processes, so a restarted
+    worker-0 is never mistaken for the one that held a job before it"""
+    return f"{name}@{socket.gethostname()}:{os.getpid()}"
+
+
+def _new_job(user_input: str) -> Dict[str, Any]:
+    job_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    return {
+        "job_id": job_id, "user_input": user_input, "status": "queued",
+        "work_dir": str(Path(JobQueueConfig.JOBS_DIR) / job_id), "worker": None,
+        "result": None, "error": None, "created_at": time.time(), "started_at": None, "finished_at": None,
+        "heartbeat_at": None,
+    }
+
+
+class SQLiteJobQueue:
+    """Jobs in a local SQLite table. Safe to share between processes (each one opens its own connection)
+    and between the threads of one process (calls are serialized)."""
+    def __init__(self, db_path: str = JobQueueConfig.DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_id TEXT PRIMARY KEY,
+            user_input TEXT,
+            status TEXT,
+            work_dir TEXT,
+            worker TEXT,
+            result TEXT,
+            error TEXT,
+            created_at REAL,
+            started_at REAL,
+            finished_at REAL,
+            heartbeat_at REAL
+        )
+        """)
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(jobs)").fetchall()}
+        if "heartbeat_at" not in columns: # Queue files created before leases existed
+            self.conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+
+    def submit(self, user_input: str) -> str:
+        job = _new_job(user_input)
+        with self._lock:
+            self.conn.execute(
+                f"INSERT INTO jobs ({', '.join(JOB_FIELDS)}) VALUES ({', '.join('?' for _ in JOB_FIELDS)})",
+                tuple(job[f] for f in JOB_FIELDS)
+            )
+        return job["job_id"]
+
+    def claim(self, worker: str) -> Optional[Dict[str, Any]]:
+        """Marks the oldest queued job as running for this worker and returns it; None if the queue is empty.
+        Running jobs whose lease expired (their worker died) are requeued first."""
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                requeued = self.conn.execute(
+                    "UPDATE jobs SET status = 'queued', worker = NULL, started_at = NULL, heartbeat_at = NULL "
+                    "WHERE status = 'running' AND COALESCE(heartbeat_at, started_at, 0) < ?",
+                    (now - JobQueueConfig.LEASE_SECONDS,)
+                ).rowcount
+                if requeued:
+                    logger.warning(f"Requeued {requeued} job(s) whose worker stopped sending heartbeats")
+                row = self.conn.execute(
+                    "SELECT job_id FROM jobs WHERE status = 'queued' ORDER BY created_at, rowid LIMIT 1"
+                ).fetchone()
+                if row:
+                    self.conn.execute(
+                        "UPDATE jobs SET status = 'running', worker = ?, started_at = ?, heartbeat_at = ? WHERE job_id = ?",
+                        (worker, now, now, row[0])
+                    )
+                self.conn.execute("COMMIT")
+            except sqlite3.Error:
+                self.conn.execute("ROLLBACK")
+                raise
+            return self.get(row[0]) if row else None
+
+    def heartbeat(self, job_id: str, worker: str) -> bool:
+        """Extends worker's lease on a running job; False if the job is no longer held by worker"""
+        with self._lock:
+            return self.conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE job_id = ? AND status = 'running' AND worker = ?",
+                (time.time(), job_id, worker)
+            ).rowcount > 0
+
+    def finish(self, job_id: str, worker: str, status: str, result: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None) -> bool:
+        """Records the outcome of worker's run; False (nothing recorded) if the job was requeued or taken over"""
+        with self._lock:
+            return self.conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? "
+                "WHERE job_id = ? AND status = 'running' AND worker = ?",
+                (status, json.dumps(result, default=str) if result is not None else None, error, time.time(), job_id, worker)
+            ).rowcount > 0
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self.conn.execute(f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._to_job(row) if row else None
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        sql = f"SELECT {', '.join(JOB_FIELDS)} FROM jobs"
+        params: tuple = ()
+        if status:
+            sql += " WHERE status = ?"
+            params = (status,)
+        with self._lock:
+            rows = self.conn.execute(sql + " ORDER BY created_at DESC LIMIT ?", params + (limit,)).fetchall()
+        return [self._to_job(row) for row in rows]
+
+    @staticmethod
+    def _to_job(row: tuple) -> Dict[str, Any]:
+        job = dict(zip(JOB_FIELDS, row))
+        if job["result"]:
+            job["result"] = json.loads(job["result"])
+        return job
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+class RedisJobQueue:
+    """Jobs in a Redis-compatible server: a hash per job, a list of queued ids, a sorted set of all ids
+    and a sorted set of running ids scored by their last heartbeat. Every state change is a Lua script,
+    so it happens atomically (a worker crashing mid-claim can't lose the job)."""
+    # Hash values are JSON, like the rest of the job; ARGV carries them already encoded
+    _CLAIM = """
+    local job_id = redis.call('RPOP', KEYS[1])
+    if not job_id then return false end
+    redis.call('ZADD', KEYS[2], ARGV[1], job_id)
+    redis.call('HSET', ARGV[3] .. ':' .. job_id, 'status', '"running"', 'worker', ARGV[2], 'started_at', ARGV[1], 'heartbeat_at', ARGV[1])
+    return job_id
+    """
+    _REQUEUE_EXPIRED = """
+    local expired = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+    for _, job_id in ipairs(expired) do
+        redis.call('ZREM', KEYS[1], job_id)
+        redis.call('HSET', ARGV[2] .. ':' .. job_id, 'status', '"queued"', 'worker', 'null', 'started_at', 'null', 'heartbeat_at', 'null')
+        redis.call('RPUSH', KEYS[2], job_id)
+    end
+    return expired
+    """
+    # KEYS: running set, job hash; ARGV: job_id, worker, now, then field/value pairs to set
+    _UPDATE_IF_HELD = """
+    if not redis.call('ZSCORE', KEYS[1], ARGV[1]) or redis.call('HGET', KEYS[2], 'worker') ~= ARGV[2] then return 0 end
+    if ARGV[4] == 'finish' then redis.call('ZREM', KEYS[1], ARGV[1]) else redis.call('ZADD', KEYS[1], ARGV[3], ARGV[1]) end
+    for i = 5, #ARGV, 2 do redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 1]) end
+    return 1
+    """
+
+    def __init__(self, url: str = JobQueueConfig.REDIS_URL, prefix: str = JobQueueConfig.REDIS_PREFIX, client=None):
+        if client is None and redis is None:
+            raise ImportError("The redis package is required for QREWS_JOB_QUEUE=redis (pip install redis)")
+        # client: an already connected redis.Redis (decode_responses=True), e.g. a stand-in in tests
+        self.client = client if client is not None else redis.Redis.from_url(url, decode_responses=True)
+        self.prefix = prefix
+        self._claim = self.client.register_script(self._CLAIM)
+        self._requeue = self.client.register_script(self._REQUEUE_EXPIRED)
+        self._update_if_held = self.client.register_script(self._UPDATE_IF_HELD)
+
+    def _key(self, job_id: str) -> str:
+        return f"{self.prefix}:{job_id}"
+
+    def submit(self, user_input: str) -> str:
+        job = _new_job(user_input)
+        pipe = self.client.pipeline()
+        pipe.hset(self._key(job["job_id"]), mapping={k: json.dumps(v) for k, v in job.items()})
+        pipe.zadd(f"{self.prefix}:all", {job["job_id"]: job["created_at"]})
+        pipe.lpush(f"{self.prefix}:queued", job["job_id"])
+        pipe.execute()
+        return job["job_id"]
+
+    def _requeue_expired(self):
+        expired = self._requeue(keys=[f"{self.prefix}:running", f"{self.prefix}:queued"],
+                                args=[time.time() - JobQueueConfig.LEASE_SECONDS, self.prefix])
+        for job_id in expired:
+            logger.warning(f"Requeued job {job_id}: its worker stopped sending heartbeats")
+
+    def claim(self, worker: str) -> Optional[Dict[str, Any]]:
+        self._requeue_expired()
+        # Popping the id, leasing it and marking it running happen in one script
+        job_id = self._claim(keys=[f"{self.prefix}:queued", f"{self.prefix}:running"],
+                             args=[json.dumps(time.time()), json.dumps(worker), self.prefix])
+        return self.get(job_id) if job_id else None
+
+    def _update(self, job_id: str, worker: str, action: str, fields: Dict[str, Any]) -> bool:
+        now = time.time()
+        args = [job_id, json.dumps(worker), now, action]
+        for name, value in fields.items():
+            args.extend([name, json.dumps(value, default=str)])
+        return bool(self._update_if_held(keys=[f"{self.prefix}:running", self._key(job_id)], args=args))
+
+    def heartbeat(self, job_id: str, worker: str) -> bool:
+        return self._update(job_id, worker, "heartbeat", {"heartbeat_at": time.time()})
+
+    def finish(self, job_id: str, worker: str, status: str, result: Optional[Dict[str, Any]] = None,
+               error: Optional[str] = None) -> bool:
+        return self._update(job_id, worker, "finish", {
+            "status": status, "result": result, "error": error, "finished_at": time.time(),
+        })
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        data = self.client.hgetall(self._key(job_id))
+        return {k: json.loads(v) for k, v in data.items()} if data else None
+
+    def list_jobs(self, status: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        jobs = []
+        for job_id in self.client.zrevrange(f"{self.prefix}:all", 0, -1):
+            job = self.get(job_id)
+            if job and (status is None or job.get("status") == status):
+                jobs.append(job)
+                if len(jobs) >= limit:
+                    break
+        return jobs
+
+    def close(self):
+        self.client.close()
+
+
+def get_job_queue():
+    """Queue for the configured backend. Falls back to SQLite when Redis is requested but not usable."""
+    if JobQueueConfig.BACKEND == "redis":
+        try:
+            queue = RedisJobQueue()
+            queue.client.ping()
+            return queue
+        except Exception as e:
+            logger.error(f"Redis job queue at {JobQueueConfig.REDIS_URL} unavailable ({e}); using SQLite at {JobQueueConfig.DB_PATH}")
+    return SQLiteJobQueue()
+
+
+def run_job(taskmaster, queue, job: Dict[str, Any]):
+    """Runs one claimed job in its own work directory and records the outcome. A background thread
+    renews the job's lease while it runs, so only jobs of dead workers get requeued."""
+    taskmaster.use_work_dir(Path(job["work_dir"]))
+    done = threading.Event()
+
+    job_id, worker = job["job_id"], job["worker"]
+
+    def _heartbeat():
+        while not done.wait(JobQueueConfig.LEASE_SECONDS / 3):
+            try:
+                if not queue.heartbeat(job_id, worker):
+                    logger.error(f"Lost the lease on job {job_id}: it was requeued; this run's result will be discarded")
+                    return
+            except Exception as e:
+                logger.error(f"Heartbeat for job {job_id} failed: {e}")
+
+    def _finish(status: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        if not queue.finish(job_id, worker, status, result, error=error):
+            logger.error(f"Discarded the {status} result of job {job_id}: {worker} no longer holds it")
+
+    threading.Thread(target=_heartbeat, name=f"heartbeat-{job_id}", daemon=True).start()
+    try:
+        workflow_data = taskmaster.start_workflow(job["user_input"])
+    except Exception as e:
+        logger.exception(f"Job {job_id} failed")
+        _finish("error", error=f"{type(e).__name__}: {e}")
+        return
+    finally:
+        done.set()
+    summary = {k: workflow_data.get(k) for k in ("run_id", "project_name", "output_file", "status") if workflow_data.get(k) is not None}
+    if workflow_data.get("error"):
+        _finish("error", summary, error=str(workflow_data["error"]))
+    else:
+        _finish("completed", summary)
+
+
+def worker_main(worker: str, exit_when_idle: bool = False, poll_interval: float = JobQueueConfig.POLL_INTERVAL):
+    """Worker process: one TaskMaster, kept warm across the jobs it claims"""
+    from main import TaskMaster # Imported here so submit/status don't pay for building the agents
+
+    queue = get_job_queue()
+    taskmaster = TaskMaster()
+    try:
+        while True:
+            job = queue.claim(worker_id(worker))
+            if job is None:
+                if exit_when_idle:
+                    break
+                time.sleep(poll_interval)
+                continue
+            logger.info(f"[{worker}] Running job {job['job_id']}: {job['user_input']}")
+            run_job(taskmaster, queue, job)
+    finally:
+        taskmaster.cleanup()
+        queue.close()
+
+
+def run_workers(workers: int = JobQueueConfig.WORKERS, exit_when_idle: bool = False):
+    """Starts the worker pool and waits for it. Workers are spawned, not forked, so none inherits open connections."""
+    ctx = multiprocessing.get_context("spawn")
+    processes = [
+        ctx.Process(target=worker_main, args=(f"worker-{i}", exit_when_idle), name=f"qrews-worker-{i}")
+        for i in range(max(1, workers))
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Queue project requests and run them with a pool of worker processes")
+    sub = parser.add_subparsers(dest="command", required=True)
+    submit = sub.add_parser("submit", help="Queue one job per requirement")
+    submit.add_argument("requirements", nargs="+")
+    work = sub.add_parser("work", help="Run worker processes that execute queued jobs")
+    work.add_argument("--workers", type=int, default=JobQueueConfig.WORKERS)
+    work.add_argument("--exit-when-idle", action="store_true", help="Stop once the queue is empty")
+    status = sub.add_parser("status", help="Show one job, or the most recent ones")
+    status.add_argument("job_id", nargs="?")
+    status.add_argument("--status", dest="status_filter")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(processName)s - %(levelname)s - %(message)s')
+    if args.command == "work":
+        run_workers(args.workers, args.exit_when_idle)
+        return
+
+    queue = get_job_queue()
+    try:
+        if args.command == "submit":
+            for requirement in args.requirements:
+                print(queue.submit(requirement))
+        elif args.job_id:
+            job = queue.get(args.job_id)
+            print(json.dumps(job, indent=2, default=str) if job else f"No job {args.job_id}")
+        else:
+            for job in queue.list_jobs(args.status_filter):
+                print(f"{job['job_id']}  {job['status']:<9}  {job['user_input'][:60]}")
+    finally:
+        queue.close()
+
+
+if __name__ == "__main__":
+    main()
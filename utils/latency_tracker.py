@@ -0,0 +1,54 @@
+import math
+import threading
+from collections import deque
+from typing import Optional, Dict, Deque
+
+
+class LatencyTracker:
+    """Rolling window of recent call latencies per key (e.g. "agent:model")"""
+    def __init__(self, window: int = 50):
+        self.window = window
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, seconds: float):
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = deque(maxlen=self.window)
+                self._samples[key] = samples
+            samples.append(seconds)
+
+    def count(self, key: str) -> int:
+        with self._lock:
+            return len(self._samples.get(key, ()))
+
+    def percentile(self, key: str, pct: float) -> Optional[float]:
+        """Nearest-rank percentile (pct in 0..1) of the window, None without samples"""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if not samples:
+            return None
+        rank = max(1, math.ceil(pct * len(samples)))
+        return samples[rank - 1]
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            keys = list(self._samples)
+        return {
+            key: {"count": self.count(key), "p50": self.percentile(key, 0.5), "p95": self.percentile(key, 0.95)}
+            for key in keys
+        }
+
+
+_tracker: Optional[LatencyTracker] = None
+_tracker_lock = threading.Lock()
+
+
+def get_latency_tracker() -> LatencyTracker:
+    global _tracker
+    if _tracker is None:
+        with _tracker_lock:
+            if _tracker is None:
+                _tracker = LatencyTracker()
+    return _tracker
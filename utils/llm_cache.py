@@ -0,0 +1,202 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from typing import Optional, Dict, Any, List
+
+from utils.cassette import CassetteConfig
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCacheConfig:
+    """Settings for the persistent LLM response cache"""
+    # Off by default while recording or replaying a cassette: cache hits would never reach the transport,
+    # leaving recorded cassettes incomplete and replays measuring the cache instead of the workflow
+    ENABLED = os.getenv("QREWS_RESPONSE_CACHE", "0" if CassetteConfig.MODE in ("record", "replay") else "1").lower() not in ("0", "off", "false", "no")
+    DB_PATH = os.getenv("QREWS_RESPONSE_CACHE_PATH", "llm_response_cache.db")
+    TTL_SECONDS = float(os.getenv("QREWS_RESPONSE_CACHE_TTL", str(7 * 24 * 3600)))
+    MAX_ENTRIES = int(os.getenv("QREWS_RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+    MAX_BYTES = int(os.getenv("QREWS_RESPONSE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+    # Seconds to wait for another process's write lock before giving up on a lookup or store
+    BUSY_TIMEOUT = float(os.getenv("QREWS_RESPONSE_CACHE_BUSY_TIMEOUT", "5"))
+    # Comma-separated agent names that always go to the model
+    BYPASS_AGENTS = [a.strip() for a in os.getenv("QREWS_RESPONSE_CACHE_BYPASS", "").split(",") if a.strip()]
+
+    @classmethod
+    def is_bypassed(cls, agent_name: str) -> bool:
+        return agent_name in cls.BYPASS_AGENTS
+
+
+class LLMResponseCache:
+    """Content-addressed cache of model responses in SQLite.
+
+    Keys hash everything that determines the output (model, generationConfig, safety
+    settings, tool declarations, prompt/contents). Entries expire after ttl_seconds and the
+    least recently used ones are evicted once max_entries or max_bytes is exceeded.
+    SQLite errors (a locked or corrupt file) are logged and counted, and the call goes on uncached."""
+    def __init__(self, db_path: str = ResponseCacheConfig.DB_PATH,
+                 ttl_seconds: float = ResponseCacheConfig.TTL_SECONDS,
+                 max_entries: int = ResponseCacheConfig.MAX_ENTRIES,
+                 max_bytes: int = ResponseCacheConfig.MAX_BYTES,
+                 busy_timeout: float = ResponseCacheConfig.BUSY_TIMEOUT):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0, "errors": 0}
+        self.conn = sqlite3.connect(self.db_path, timeout=busy_timeout, check_same_thread=False)
+        self.conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout * 1000)}")
+        # WAL lets readers in other processes proceed while one process writes
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS llm_response_cache (
+            cache_key TEXT PRIMARY KEY,
+            model_name TEXT,
+            response TEXT,
+            size INTEGER,
+            created_at REAL,
+            last_access REAL
+        )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_response_cache (last_access)")
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(model_name: str, generation_config: Optional[Dict[str, Any]], safety_settings: Optional[List[Dict[str, Any]]],
+                 tools: Optional[List[Dict[str, Any]]], prompt: str, contents: Optional[List[Dict[str, Any]]] = None) -> str:
+        material = {
+            "model": model_name,
+            "generationConfig": generation_config or {},
+            "safetySettings": safety_settings or [],
+            "tools": tools or [],
+            "prompt": prompt,
+            "contents": contents or [],
+        }
+        canonical = json.dumps(material, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            try:
+                row = self.conn.execute(
+                    "SELECT response, created_at FROM llm_response_cache WHERE cache_key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    self._stats["misses"] += 1
+                    return None
+                response, created_at = row
+                if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                    self.conn.execute("DELETE FROM llm_response_cache WHERE cache_key = ?", (key,))
+                    self.conn.commit()
+                    self._stats["expired"] += 1
+                    self._stats["misses"] += 1
+                    return None
+                self.conn.execute("UPDATE llm_response_cache SET last_access = ? WHERE cache_key = ?", (now, key))
+                self.conn.commit()
+                self._stats["hits"] += 1
+                return response
+            except sqlite3.Error as e:
+                self._on_error("lookup", e)
+                return None
+
+    def put(self, key: str, model_name: str, response: str):
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            try:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO llm_response_cache (cache_key, model_name, response, size, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, model_name, response, size, now, now)
+                )
+                self._evict(now)
+                self.conn.commit()
+                self._stats["stores"] += 1
+            except sqlite3.Error as e:
+                self._on_error("store", e)
+
+    def _on_error(self, operation: str, error: sqlite3.Error):
+        """Count and log a failed cache operation, and drop its open transaction (called with the lock held)"""
+        self._stats["errors"] += 1
+        logger.warning(f"LLM response cache {operation} failed, continuing uncached: {error}")
+        try:
+            self.conn.rollback()
+        except sqlite3.Error:
+            pass
+
+    def _evict(self, now: float):
+        if self.ttl_seconds:
+            cursor = self.conn.execute("DELETE FROM llm_response_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+            self._stats["expired"] += max(cursor.rowcount, 0)
+
+        count, total_bytes = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_response_cache").fetchone()
+        if count <= self.max_entries and total_bytes <= self.max_bytes:
+            return
+
+        evict_keys = []
+        for cache_key, size in self.conn.execute("SELECT cache_key, size FROM llm_response_cache ORDER BY last_access ASC"):
+            if count <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            evict_keys.append((cache_key,))
+            count -= 1
+            total_bytes -= size
+        self.conn.executemany("DELETE FROM llm_response_cache WHERE cache_key = ?", evict_keys)
+        self._stats["evictions"] += len(evict_keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            report = dict(self._stats)
+            entries, total_bytes = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_response_cache").fetchone()
+        lookups = report["hits"] + report["misses"]
+        report["entries"] = entries
+        report["bytes"] = total_bytes
+        report["hit_rate"] = report["hits"] / lookups if lookups else 0.0
+        return report
+
+    def clear(self):
+        with self._lock:
+            self.conn.execute("DELETE FROM llm_response_cache")
+            self.conn.commit()
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+def is_cacheable_response(response: Optional[str]) -> bool:
+    """Only keep real answers; errors and empty/blocked responses must be retried next time"""
+    if not response or response.startswith("Error:"):
+        return False
+    return "Response blocked by safety filters" not in response and not response.startswith("No response generated") \
+        and not response.startswith("No text response")
+
+
+_cache: Optional[LLMResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[LLMResponseCache]:
+    """Process-wide cache, or None when caching is disabled or the cache file can't be opened"""
+    global _cache
+    if not ResponseCacheConfig.ENABLED:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                try:
+                    _cache = LLMResponseCache()
+                except sqlite3.Error as e:
+                    logger.error(f"Could not open LLM response cache at {ResponseCacheConfig.DB_PATH}: {e}")
+                    ResponseCacheConfig.ENABLED = False
+                    return None
+    return _cache
+
+
+def response_cache_stats() -> Dict[str, Any]:
+    cache = get_response_cache()
+    return cache.stats() if cache else {"enabled": False}
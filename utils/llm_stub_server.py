@@ -0,0 +1,310 @@
+"""
+Local stand-in for the Gemini REST API and the local LLM servers, for load testing.
+
+Serves:
+  POST /v1beta/models/<model>:generateContent
+  POST /v1beta/models/<model>:streamGenerateContent   (?alt=sse for SSE, JSON array otherwise)
+  POST /v1/completions                                 (OpenAI-style, "stream": true for SSE)
+  POST /api/generate                                   (Ollama-style, NDJSON when streaming)
+  GET  /stats
+
+Point the agents at it with:
+  GEMINI_BASE_URL=http://127.0.0.1:8089/v1beta/models
+  QREWS_LOCAL_LLM_BASE_URL=http://127.0.0.1:8089/v1
+or, per model:
+  QREWS_LOCAL_MODEL_ENDPOINTS='{"deepseek-base": "http://127.0.0.1:8089/v1", ...}'
+
+Behaviour is scripted with a JSON file (python -m utils.llm_stub_server --script load.json):
+{
+  "latency": {"base": 1.5, "jitter": 0.5},        # seconds before the first byte
+  "tokens_per_second": 80,                        # pacing of streamed chunks
+  "errors": {"429": 0.05, "503": 0.02, "retry_after": 3},
+  "rpm": {"gemini-2.0-flash": 15},                # optional server-side quota, answered with 429
+  "models": {"gemini-1.5-pro-latest": {"latency": {"base": 4}}},   # per-model overrides
+  "responses": [                                  # first rule whose "match" is in the prompt wins
+    {"match": "ProjectAnalyzer", "text": "Final Answer: {\"project_type\": \"backend\"}"},
+    {"match": "write_file", "function_call": {"name": "write_file", "args": {"path": "a.py", "content": ""}}}
+  ],
+  "default_response": "```json\\n{\"status\": \"ok\"}\\n```"
+}
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from collections import deque, Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from typing import Optional, Dict, Any, List
+
+DEFAULT_SCRIPT = {
+    "latency": {"base": 0.5, "jitter": 0.2},
+    "tokens_per_second": 100,
+    "errors": {"429": 0.0, "503": 0.0, "retry_after": 2},
+    "rpm": {},
+    "models": {},
+    "responses": [],
+    "default_response": "```json\n{\"status\": \"ok\", \"source\": \"llm_stub_server\"}\n```",
+}
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, len(text or "") // 4)
+
+
+class StubBehaviour:
+    """Scripted latency, failures, quotas and canned answers shared by all handler threads"""
+    def __init__(self, script: Optional[Dict[str, Any]] = None, seed: Optional[int] = None):
+        self.script = dict(DEFAULT_SCRIPT)
+        self.script.update(script or {})
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._request_times: Dict[str, deque] = {}
+        self.stats = Counter()
+
+    def setting(self, model: str, name: str):
+        return self.script.get("models", {}).get(model, {}).get(name, self.script.get(name))
+
+    def latency(self, model: str) -> float:
+        latency = self.setting(model, "latency") or {}
+        base = latency.get("base", 0.0)
+        jitter = latency.get("jitter", 0.0)
+        with self._lock:
+            return max(0.0, base + self.random.uniform(-jitter, jitter))
+
+    def injected_error(self, model: str) -> Optional[int]:
+        """429 when the scripted RPM quota is exhausted, otherwise a random 429/503 per the error rates"""
+        rpm = (self.script.get("rpm") or {}).get(model)
+        now = time.monotonic()
+        with self._lock:
+            if rpm:
+                window = self._request_times.setdefault(model, deque())
+                while window and now - window[0] > 60:
+                    window.popleft()
+                if len(window) >= rpm:
+                    return 429
+                window.append(now)
+            errors = self.setting(model, "errors") or {}
+            roll = self.random.random()
+            if roll < errors.get("429", 0.0):
+                return 429
+            if roll < errors.get("429", 0.0) + errors.get("503", 0.0):
+                return 503
+        return None
+
+    def answer(self, prompt: str) -> Dict[str, Any]:
+        for rule in self.script.get("responses", []):
+            if rule.get("match", "") in prompt:
+                return rule
+        return {"text": self.script.get("default_response", "")}
+
+    def count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    behaviour: StubBehaviour = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    # --- plumbing ---
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b"{}"
+        try:
+            return json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            return {}
+
+    def _send_json(self, status: int, payload: Any, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_stream(self, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, data: str):
+        raw = data.encode("utf-8")
+        self.wfile.write(f"{len(raw):X}\r\n".encode("ascii") + raw + b"\r\n")
+        self.wfile.flush()
+
+    def _end_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _text_pieces(self, text: str) -> List[str]:
+        """Split text into ~8-token pieces for streaming"""
+        step = 32
+        return [text[i:i + step] for i in range(0, len(text), step)] or [""]
+
+    def _piece_delay(self, model: str, piece: str) -> float:
+        rate = self.behaviour.setting(model, "tokens_per_second") or 0
+        return estimate_tokens(piece) / rate if rate else 0.0
+
+    def _fail_if_scripted(self, model: str, gemini_format: bool) -> bool:
+        status = self.behaviour.injected_error(model)
+        if status is None:
+            return False
+        self.behaviour.count(f"injected_{status}")
+        retry_after = str((self.behaviour.setting(model, "errors") or {}).get("retry_after", 2))
+        if gemini_format:
+            payload = {"error": {"code": status, "message": "Injected by llm_stub_server",
+                                 "status": "RESOURCE_EXHAUSTED" if status == 429 else "UNAVAILABLE",
+                                 "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": f"{retry_after}s"}]}}
+        else:
+            payload = {"error": {"message": "Injected by llm_stub_server", "code": status}}
+        self._send_json(status, payload, headers={"Retry-After": retry_after})
+        return True
+
+    # --- routes ---
+
+    def do_GET(self):
+        if urlsplit(self.path).path == "/stats":
+            self._send_json(200, dict(self.behaviour.stats))
+        else:
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        parts = urlsplit(self.path)
+        request = self._read_json()
+        if ":generateContent" in parts.path or ":streamGenerateContent" in parts.path:
+            model = parts.path.rsplit("/", 1)[-1].split(":", 1)[0]
+            self._gemini(model, request, streaming=":streamGenerateContent" in parts.path,
+                         sse=parse_qs(parts.query).get("alt") == ["sse"])
+        elif parts.path.endswith("/completions"):
+            self._completions(request)
+        elif parts.path.endswith("/api/generate"):
+            self._ollama(request)
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown route {parts.path}"}})
+
+    def _gemini(self, model: str, request: Dict[str, Any], streaming: bool, sse: bool):
+        self.behaviour.count(f"{model}:{'stream' if streaming else 'generate'}")
+        time.sleep(self.behaviour.latency(model))
+        if self._fail_if_scripted(model, gemini_format=True):
+            return
+
+        contents = request.get("contents") or []
+        last_parts = contents[-1].get("parts", []) if contents else []
+        prompt = "\n".join(part.get("text", "") for turn in contents for part in turn.get("parts", []))
+        rule = self.behaviour.answer(prompt)
+        answered_tool = any("functionResponse" in part for part in last_parts)
+
+        if rule.get("function_call") and request.get("tools") and not answered_tool:
+            parts_out = [{"functionCall": rule["function_call"]}]
+            text = ""
+        else:
+            text = rule.get("text", self.behaviour.script.get("default_response", ""))
+            parts_out = [{"text": text}]
+        usage = {"promptTokenCount": estimate_tokens(prompt), "candidatesTokenCount": estimate_tokens(text)}
+        usage["totalTokenCount"] = usage["promptTokenCount"] + usage["candidatesTokenCount"]
+
+        if not streaming or not text:
+            self._send_json(200, {"candidates": [{"content": {"role": "model", "parts": parts_out}, "finishReason": "STOP"}],
+                                  "usageMetadata": usage})
+            return
+
+        self._start_stream("text/event-stream" if sse else "application/json")
+        pieces = self._text_pieces(text)
+        if not sse:
+            self._write_chunk("[")
+        for index, piece in enumerate(pieces):
+            time.sleep(self._piece_delay(model, piece))
+            event = {"candidates": [{"content": {"role": "model", "parts": [{"text": piece}]}}]}
+            if index == len(pieces) - 1:
+                event["candidates"][0]["finishReason"] = "STOP"
+                event["usageMetadata"] = usage
+            if sse:
+                self._write_chunk(f"data: {json.dumps(event)}\n\n")
+            else:
+                self._write_chunk(("," if index else "") + json.dumps(event))
+        if not sse:
+            self._write_chunk("]")
+        self._end_stream()
+
+    def _completions(self, request: Dict[str, Any]):
+        model = request.get("model", "local")
+        self.behaviour.count(f"{model}:completions")
+        time.sleep(self.behaviour.latency(model))
+        if self._fail_if_scripted(model, gemini_format=False):
+            return
+        text = self.behaviour.answer(request.get("prompt", "")).get("text", "")
+        if not request.get("stream"):
+            self._send_json(200, {"object": "text_completion", "model": model,
+                                  "choices": [{"index": 0, "text": text, "finish_reason": "stop"}]})
+            return
+        self._start_stream("text/event-stream")
+        for piece in self._text_pieces(text):
+            time.sleep(self._piece_delay(model, piece))
+            self._write_chunk(f"data: {json.dumps({'choices': [{'index': 0, 'text': piece}]})}\n\n")
+        self._write_chunk("data: [DONE]\n\n")
+        self._end_stream()
+
+    def _ollama(self, request: Dict[str, Any]):
+        model = request.get("model", "local")
+        self.behaviour.count(f"{model}:api_generate")
+        time.sleep(self.behaviour.latency(model))
+        if self._fail_if_scripted(model, gemini_format=False):
+            return
+        text = self.behaviour.answer(request.get("prompt", "")).get("text", "")
+        if not request.get("stream"):
+            self._send_json(200, {"model": model, "response": text, "done": True})
+            return
+        self._start_stream("application/x-ndjson")
+        for piece in self._text_pieces(text):
+            time.sleep(self._piece_delay(model, piece))
+            self._write_chunk(json.dumps({"model": model, "response": piece, "done": False}) + "\n")
+        self._write_chunk(json.dumps({"model": model, "response": "", "done": True}) + "\n")
+        self._end_stream()
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8089, script: Optional[Dict[str, Any]] = None,
+                seed: Optional[int] = None) -> ThreadingHTTPServer:
+    """Build (but don't start) a stub server; handy for starting it in a background thread from a test"""
+    behaviour = StubBehaviour(script, seed=seed)
+    handler = type("ScriptedStubHandler", (StubHandler,), {"behaviour": behaviour})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.behaviour = behaviour
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gemini/local-LLM compatible stub server for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--script", help="JSON file describing latency, errors, quotas and canned responses")
+    parser.add_argument("--seed", type=int, help="Seed for latency jitter and error injection")
+    args = parser.parse_args()
+
+    script = None
+    if args.script:
+        with open(args.script) as f:
+            script = json.load(f)
+    server = make_server(args.host, args.port, script, seed=args.seed)
+    print(f"llm_stub_server listening on http://{args.host}:{args.port} "
+          f"(GEMINI_BASE_URL=http://{args.host}:{args.port}/v1beta/models)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
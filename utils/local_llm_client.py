@@ -1,6 +1,9 @@
 import requests
+from utils import http_transport
+from utils.rate_limiter import get_rate_limiter
+from utils.stream_parser import IncrementalResponseParser, iter_sse_json
 import json
-from typing import Optional # Added for Optional type hint
+from typing import Optional, Tuple, Dict, Any # Added for Optional type hint
 
 # Define a placeholder for Logger if it's not available globally in this context
 # This helps if this file is tested standalone or if global logger setup is complex.
@@ -18,79 +21,112 @@ class LocalLLMClient:
             # Fallback to a basic print if no logger is passed
             print("LocalLLMClient initialized (no logger provided).")
 
-
-    def generate(self, base_api_url: str, prompt: str, model_name: str) -> str:
-        message = f"LocalLLMClient.generate called for model {model_name} at {base_api_url}."
+    def _log(self, message: str, level: str = "INFO"):
         if self.logger:
-            self.logger.log(message, "LocalLLMClient", level="INFO")
+            self.logger.log(message, "LocalLLMClient", level=level)
         else:
             print(message)
 
+    def _build_request(self, base_api_url: str, prompt: str, model_name: str, stream: bool = False) -> Tuple[str, Dict[str, Any]]:
+        # Basic Ollama-like API structure (adjust if different local LLM server)
+        payload = {
+            "model": model_name,
+            "prompt": prompt,
+            "stream": stream
+        }
+        # If base_api_url already contains /v1, assume an OpenAI-like completion server
+        # (the SubAgentLLMInvoker uses /completions for its local calls too).
+        # Otherwise, assume Ollama-like /api/generate.
+        if "/v1" in base_api_url: # More OpenAI-like
+            full_url = f"{base_api_url.rstrip('/')}/completions" # Or /chat/completions if using chat models
+        else: # Assume Ollama-like
+            full_url = f"{base_api_url.rstrip('/')}/api/generate"
+        return full_url, payload
+
+    @staticmethod
+    def _extract_text(response_data: Dict[str, Any]) -> str:
+        # Extract response based on common local LLM structures
+        if "response" in response_data: # Ollama typically has a "response" field for generate
+            return response_data["response"]
+        elif "choices" in response_data and response_data["choices"] and "text" in response_data["choices"][0]: # OpenAI API like completion
+            return response_data["choices"][0]["text"]
+        elif "choices" in response_data and response_data["choices"] and "message" in response_data["choices"][0] and "content" in response_data["choices"][0]["message"]: # OpenAI API like chat completion
+            return response_data["choices"][0]["message"]["content"]
+        else:
+            return json.dumps(response_data) # Fallback to returning full JSON
+
+    @staticmethod
+    def _extract_delta(event: Dict[str, Any]) -> str:
+        # Ollama NDJSON chunks carry "response"; OpenAI-style SSE chunks carry choices[0].text or .delta.content
+        if "response" in event:
+            return event.get("response") or ""
+        choices = event.get("choices") or []
+        if choices:
+            choice = choices[0]
+            if "text" in choice:
+                return choice.get("text") or ""
+            return (choice.get("delta") or {}).get("content") or ""
+        return ""
+
+    def _read_stream(self, response, early_stop: bool) -> str:
+        parser = IncrementalResponseParser()
+        try:
+            for event in iter_sse_json(response.iter_lines()):
+                parser.feed(self._extract_delta(event))
+                if parser.complete and early_stop:
+                    self._log(f"Structured payload ({parser.kind}) complete; stopping local stream early")
+                    break
+        finally:
+            response.close()
+        return parser.result_text()
+
+    def generate(self, base_api_url: str, prompt: str, model_name: str, stream: bool = False, early_stop: bool = True) -> str:
+        self._log(f"LocalLLMClient.generate called for model {model_name} at {base_api_url}.")
+
         # Placeholder: Attempt a simple request if base_api_url looks like a real endpoint
-        # This is a basic attempt and might need significant enhancement for actual local LLM interaction
         if base_api_url.startswith("http"):
+            full_url, payload = self._build_request(base_api_url, prompt, model_name, stream=stream)
             try:
-                # Basic Ollama-like API structure (adjust if different local LLM server)
-                payload = {
-                    "model": model_name,
-                    "prompt": prompt,
-                    "stream": False # Or True, depending on desired behavior
-                }
+                self._log(f"Attempting POST to {full_url} with model {model_name}")
                 headers = {"Content-Type": "application/json"}
-                # Common Ollama endpoint is /api/generate. Other local LLMs might use /v1/completions or similar.
-                # Providing a common default if not part of base_api_url.
-                # However, the current strategy_config.LOCAL_MODEL_ENDPOINTS seems to provide the full path.
-                # So, if base_api_url is "http://localhost:8081/v1", then appending "/api/generate" might be wrong.
-                # Let's assume base_api_url is the *base* and we append a common generation path like /api/generate or /generate
-                # For Ollama, it's /api/generate. For OpenAI-compatible, it's often /v1/completions or /v1/chat/completions.
-                # The SubAgentLLMInvoker uses /completions for its local calls.
-                # Let's make this flexible or assume a common endpoint structure for local LLMs.
-                # For now, using a common Ollama-like endpoint.
+                get_rate_limiter().acquire(model_name) # No-op unless the model has a quota in ModelConfig
+                response = http_transport.post(full_url, headers=headers, json=payload, timeout=60, stream=stream)
+                response.raise_for_status()
+                if stream:
+                    return self._read_stream(response, early_stop)
+                return self._extract_text(response.json())
 
-                # Updated logic: if base_api_url already contains /v1, assume OpenAI-like completion.
-                # Otherwise, assume Ollama-like /api/generate.
-                if "/v1" in base_api_url: # More OpenAI-like
-                    full_url = f"{base_api_url.rstrip('/')}/completions" # Or /chat/completions if using chat models
-                    # For OpenAI-like completion:
-                    # payload = {"model": model_name, "prompt": prompt, "max_tokens": 2048, "temperature": 0.7}
-                else: # Assume Ollama-like
-                    full_url = f"{base_api_url.rstrip('/')}/api/generate"
+            except requests.exceptions.RequestException as e:
+                error_msg = f"LocalLLMClient: API request to {base_api_url} (tried {full_url}) failed: {e}"
+                self._log(error_msg, level="ERROR")
+                return f"Error: {error_msg}"
+            except Exception as e:
+                error_msg = f"LocalLLMClient: Unexpected error during API call to {full_url}: {e}"
+                self._log(error_msg, level="ERROR")
+                return f"Error: {error_msg}"
 
+        return f"Placeholder response from LocalLLMClient for model {model_name}. Prompt: {prompt[:50]}..."
 
-                log_message = f"Attempting POST to {full_url} with model {model_name}"
-                if self.logger:
-                    self.logger.log(log_message, "LocalLLMClient")
-                else:
-                    print(log_message)
+    async def agenerate(self, base_api_url: str, prompt: str, model_name: str) -> str:
+        """Async counterpart of generate()"""
+        self._log(f"LocalLLMClient.agenerate called for model {model_name} at {base_api_url}.")
 
-                response = requests.post(full_url, headers=headers, json=payload, timeout=60)
+        if base_api_url.startswith("http"):
+            full_url, payload = self._build_request(base_api_url, prompt, model_name)
+            try:
+                headers = {"Content-Type": "application/json"}
+                await get_rate_limiter().aacquire(model_name)
+                response = await http_transport.apost(full_url, headers=headers, json=payload, timeout=60)
                 response.raise_for_status()
-
-                response_data = response.json()
-
-                # Extract response based on common local LLM structures
-                if "response" in response_data: # Ollama typically has a "response" field for generate
-                    return response_data["response"]
-                elif "choices" in response_data and response_data["choices"] and "text" in response_data["choices"][0]: # OpenAI API like completion
-                    return response_data["choices"][0]["text"]
-                elif "choices" in response_data and response_data["choices"] and "message" in response_data["choices"][0] and "content" in response_data["choices"][0]["message"]: # OpenAI API like chat completion
-                    return response_data["choices"][0]["message"]["content"]
-                else:
-                    return json.dumps(response_data) # Fallback to returning full JSON
+                return self._extract_text(response.json())
 
             except requests.exceptions.RequestException as e:
                 error_msg = f"LocalLLMClient: API request to {base_api_url} (tried {full_url}) failed: {e}"
-                if self.logger:
-                    self.logger.log(error_msg, "LocalLLMClient", level="ERROR")
-                else:
-                    print(error_msg)
+                self._log(error_msg, level="ERROR")
                 return f"Error: {error_msg}"
             except Exception as e:
                 error_msg = f"LocalLLMClient: Unexpected error during API call to {full_url}: {e}"
-                if self.logger:
-                    self.logger.log(error_msg, "LocalLLMClient", level="ERROR")
-                else:
-                    print(error_msg)
+                self._log(error_msg, level="ERROR")
                 return f"Error: {error_msg}"
 
         return f"Placeholder response from LocalLLMClient for model {model_name}. Prompt: {prompt[:50]}..."
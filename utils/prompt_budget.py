@@ -0,0 +1,81 @@
+import os
+import logging
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from configs.global_config import ModelConfig, GeminiConfig
+from utils.rate_limiter import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4 # Same heuristic as rate_limiter.estimate_tokens
+TRIM_MARKER = "\n[... {tokens} tokens trimmed to fit the model's context window ...]\n"
+
+
+class PromptBudgetConfig:
+    """Token budgeting applied to agent prompts before they are sent"""
+    ENABLED = os.getenv("QREWS_PROMPT_BUDGET", "1").lower() not in ("0", "off", "false", "no")
+    # Headroom for the token estimate being off and for tool declarations sent alongside the prompt
+    SAFETY_MARGIN_TOKENS = int(os.getenv("QREWS_PROMPT_SAFETY_MARGIN", "512"))
+    # Trimmed sections keep at least this much of their text
+    MIN_SECTION_TOKENS = int(os.getenv("QREWS_PROMPT_MIN_SECTION_TOKENS", "64"))
+    # prompt_context keys that may be shortened, lowest priority (trimmed first) first
+    TRIMMABLE_SECTIONS = ["memories", "project_summary", "error_report", "current_code_snippet", "plan", "architecture"]
+
+
+def count_tokens(text: str) -> int:
+    return estimate_tokens(text)
+
+
+def input_token_budget(model_name: str, agent_name: Optional[str] = None) -> int:
+    """Tokens available for the prompt: context window minus the reserved output tokens and margin"""
+    output_tokens = GeminiConfig.get_generation_config(agent_name).get("maxOutputTokens", 0) if model_name.startswith("gemini-") \
+        else ModelConfig.get_model_info(model_name).get("max_tokens", 0)
+    budget = ModelConfig.get_context_window(model_name) - output_tokens - PromptBudgetConfig.SAFETY_MARGIN_TOKENS
+    return max(budget, PromptBudgetConfig.MIN_SECTION_TOKENS)
+
+
+def trim_text(text: str, max_tokens: int) -> str:
+    """Shorten text to about max_tokens, keeping the beginning and the end (where summaries
+    and conclusions usually are) and marking the cut."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    removed = count_tokens(text) - max_tokens
+    keep_chars = max(0, max_tokens * CHARS_PER_TOKEN - len(TRIM_MARKER) - 8)
+    head = keep_chars * 2 // 3
+    tail = keep_chars - head
+    return text[:head] + TRIM_MARKER.format(tokens=removed) + (text[-tail:] if tail else "")
+
+
+def fit_prompt(render: Callable[[Dict[str, Any]], str], prompt_context: Dict[str, Any], budget_tokens: int,
+               sections: Optional[List[str]] = None) -> Tuple[str, Dict[str, int]]:
+    """Render prompt_context, trimming low-priority sections until the result fits budget_tokens.
+
+    Returns the prompt and {section: tokens removed}. If everything trimmable is already at
+    its minimum the over-budget prompt is returned and the caller decides what to do."""
+    sections = sections if sections is not None else PromptBudgetConfig.TRIMMABLE_SECTIONS
+    prompt = render(prompt_context)
+    overflow = count_tokens(prompt) - budget_tokens
+    trimmed: Dict[str, int] = {}
+    if overflow <= 0:
+        return prompt, trimmed
+
+    context = dict(prompt_context)
+    for section in sections:
+        value = context.get(section)
+        if not isinstance(value, str):
+            continue
+        size = count_tokens(value)
+        reducible = size - PromptBudgetConfig.MIN_SECTION_TOKENS
+        if reducible <= 0:
+            continue
+        target = size - min(reducible, overflow)
+        context[section] = trim_text(value, target)
+        trimmed[section] = size - count_tokens(context[section])
+        # Re-render: a section can appear more than once in a template
+        prompt = render(context)
+        overflow = count_tokens(prompt) - budget_tokens
+        if overflow <= 0:
+            break
+    if overflow > 0:
+        logger.warning(f"Prompt still {overflow} tokens over budget after trimming {list(trimmed)}")
+    return prompt, trimmed
@@ -0,0 +1,247 @@
+import os
+import re
+import time
+import random
+import asyncio
+import threading
+import logging
+from email.utils import parsedate_to_datetime
+from typing import Optional, Dict, Any
+
+from configs.global_config import ModelConfig
+from utils.cassette import CassetteConfig
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitConfig:
+    """Backoff settings shared by every LLM call path"""
+    # Replayed traffic never reaches the API, so quotas don't apply unless asked for
+    ENABLED = os.getenv("QREWS_RATE_LIMIT", "0" if CassetteConfig.MODE == "replay" else "1").lower() not in ("0", "off", "false", "no")
+    BACKOFF_BASE_SECONDS = float(os.getenv("QREWS_BACKOFF_BASE", "1.0"))
+    BACKOFF_MAX_SECONDS = float(os.getenv("QREWS_BACKOFF_MAX", "60"))
+    # Throttle hints longer than this are not waited out inline; the caller falls back instead
+    MAX_INLINE_WAIT_SECONDS = float(os.getenv("QREWS_MAX_INLINE_WAIT", "30"))
+    MAX_THROTTLE_RETRIES = int(os.getenv("QREWS_MAX_THROTTLE_RETRIES", "2"))
+
+
+def backoff_delay(attempt: int, base: float = None, cap: float = None) -> float:
+    """Exponential backoff with full jitter: uniform(0, min(cap, base * 2**attempt))"""
+    base = RateLimitConfig.BACKOFF_BASE_SECONDS if base is None else base
+    cap = RateLimitConfig.BACKOFF_MAX_SECONDS if cap is None else cap
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough prompt size for the TPM bucket (about 4 characters per token)"""
+    return max(1, len(text or "") // 4)
+
+
+def retry_after_seconds(response) -> Optional[float]:
+    """Server throttle hint from a 429/503 response, if any.
+
+    Checks the Retry-After header (seconds or HTTP date) and the google.rpc.RetryInfo
+    'retryDelay' that Gemini puts in 429 bodies."""
+    if response is None:
+        return None
+    header = None
+    try:
+        header = response.headers.get("Retry-After")
+    except AttributeError:
+        pass
+    if header:
+        try:
+            return max(0.0, float(header))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(header).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    try:
+        body = response.json()
+    except Exception:
+        body = None
+    if isinstance(body, dict):
+        for detail in body.get("error", {}).get("details", []) or []:
+            delay = detail.get("retryDelay") if isinstance(detail, dict) else None
+            if delay:
+                match = re.match(r"^\s*([\d.]+)s\s*$", str(delay))
+                if match:
+                    return float(match.group(1))
+    return None
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at capacity per 60 seconds"""
+    def __init__(self, capacity: float):
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.refill_per_second = self.capacity / 60.0
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+            self.updated_at = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until 'amount' is available (0 if available now). Oversized requests
+        only need a full bucket so they can't block forever."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_per_second
+
+    def take(self, amount: float, now: float):
+        self._refill(now)
+        self.tokens -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """Process-wide requests-per-minute and tokens-per-minute limiter, one pair of
+    buckets per model in ModelConfig.MODELS.
+
+    acquire() blocks until both buckets allow the call. report_throttle() records a 429/503
+    so every caller of that model waits out the same Retry-After instead of retrying at once."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets: Dict[str, Dict[str, Optional[TokenBucket]]] = {}
+        self._blocked_until: Dict[str, float] = {}
+        self._throttle_counts: Dict[str, int] = {}
+        self._waited_seconds: Dict[str, float] = {}
+
+    def _model_buckets(self, model_name: str) -> Dict[str, Optional[TokenBucket]]:
+        buckets = self._buckets.get(model_name)
+        if buckets is None:
+            limits = ModelConfig.get_rate_limits(model_name)
+            buckets = {
+                "rpm": TokenBucket(limits["rpm"]) if limits.get("rpm") else None,
+                "tpm": TokenBucket(limits["tpm"]) if limits.get("tpm") else None,
+            }
+            self._buckets[model_name] = buckets
+        return buckets
+
+    def _reserve(self, model_name: str, estimated_tokens: int) -> float:
+        """Take capacity if available now, otherwise return how long to wait"""
+        now = time.monotonic()
+        with self._lock:
+            blocked_for = self._blocked_until.get(model_name, 0.0) - now
+            if blocked_for > 0:
+                return blocked_for
+            buckets = self._model_buckets(model_name)
+            wait = 0.0
+            if buckets["rpm"]:
+                wait = max(wait, buckets["rpm"].wait_time(1, now))
+            if buckets["tpm"]:
+                wait = max(wait, buckets["tpm"].wait_time(estimated_tokens, now))
+            if wait > 0:
+                return wait
+            if buckets["rpm"]:
+                buckets["rpm"].take(1, now)
+            if buckets["tpm"]:
+                buckets["tpm"].take(estimated_tokens, now)
+            return 0.0
+
+    def _note_wait(self, model_name: str, seconds: float):
+        with self._lock:
+            self._waited_seconds[model_name] = self._waited_seconds.get(model_name, 0.0) + seconds
+
+    def acquire(self, model_name: str, estimated_tokens: int = 1) -> float:
+        """Block until the call may proceed. Returns the total seconds waited."""
+        if not RateLimitConfig.ENABLED:
+            return 0.0
+        waited = 0.0
+        while True:
+            wait = self._reserve(model_name, estimated_tokens)
+            if wait <= 0:
+                break
+            # Small jitter so callers released together don't hit the API in lockstep
+            wait += random.uniform(0, 0.05 * wait + 0.01)
+            time.sleep(wait)
+            waited += wait
+        if waited:
+            self._note_wait(model_name, waited)
+        return waited
+
+    async def aacquire(self, model_name: str, estimated_tokens: int = 1) -> float:
+        """Async acquire(); waits with asyncio.sleep."""
+        if not RateLimitConfig.ENABLED:
+            return 0.0
+        waited = 0.0
+        while True:
+            wait = self._reserve(model_name, estimated_tokens)
+            if wait <= 0:
+                break
+            wait += random.uniform(0, 0.05 * wait + 0.01)
+            await asyncio.sleep(wait)
+            waited += wait
+        if waited:
+            self._note_wait(model_name, waited)
+        return waited
+
+    def record_usage(self, model_name: str, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Correct the TPM bucket once usageMetadata reports the real token count"""
+        if not actual_tokens:
+            return
+        with self._lock:
+            bucket = self._model_buckets(model_name)["tpm"]
+            if bucket is None:
+                return
+            difference = actual_tokens - estimated_tokens
+            if difference > 0:
+                bucket.take(difference, time.monotonic())
+            elif difference < 0:
+                bucket.refund(-difference)
+
+    def report_throttle(self, model_name: str, response=None, attempt: int = 0) -> float:
+        """Record a 429/503 for model_name and block it for the server's hint, or a
+        jittered backoff when none is given. Returns the delay applied."""
+        delay = retry_after_seconds(response)
+        if delay is None:
+            delay = backoff_delay(attempt)
+        else:
+            delay += random.uniform(0, min(1.0, 0.1 * delay + 0.1))
+        with self._lock:
+            until = time.monotonic() + delay
+            self._blocked_until[model_name] = max(self._blocked_until.get(model_name, 0.0), until)
+            self._throttle_counts[model_name] = self._throttle_counts.get(model_name, 0) + 1
+            buckets = self._model_buckets(model_name)
+            # The server disagrees with our accounting; drain the request bucket
+            if buckets["rpm"]:
+                buckets["rpm"].tokens = 0.0
+                buckets["rpm"].updated_at = until
+        logger.warning(f"Rate limited on {model_name}; pausing calls for {delay:.1f}s")
+        return delay
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        now = time.monotonic()
+        with self._lock:
+            report = {}
+            for model_name, buckets in self._buckets.items():
+                report[model_name] = {
+                    "rpm_available": round(buckets["rpm"].tokens, 2) if buckets["rpm"] else None,
+                    "tpm_available": round(buckets["tpm"].tokens, 2) if buckets["tpm"] else None,
+                    "blocked_for": max(0.0, self._blocked_until.get(model_name, 0.0) - now),
+                    "throttled": self._throttle_counts.get(model_name, 0),
+                    "waited_seconds": round(self._waited_seconds.get(model_name, 0.0), 3),
+                }
+            return report
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide limiter"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter()
+    return _limiter
@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+import logging
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+
+class RunJournalConfig:
+    """Settings for the per-run workflow journal used by --resume"""
+    ENABLED = os.getenv("QREWS_RUN_JOURNAL", "1").lower() not in ("0", "off", "false", "no")
+    DIR = os.getenv("QREWS_RUN_JOURNAL_DIR", "runs")
+
+
+def context_fingerprint(step_name: str, context_data: Dict[str, Any]) -> str:
+    """Stable hash of what a step starts from: its name and the full input ProjectContext (model_dump())"""
+    payload = json.dumps({"step": step_name, "context": context_data}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RunJournal:
+    """Record of one workflow run, kept in <DIR>/<run_id>.json.
+
+    For every step it stores the completion status, the input fingerprint, the step's
+    workflow outputs and the ProjectContext it produced, so an interrupted run can be
+    resumed: steps that completed with the same input are restored instead of re-run."""
+    def __init__(self, run_id: str, data: Dict[str, Any], journal_dir: str = RunJournalConfig.DIR):
+        self.run_id = run_id
+        self.path = Path(journal_dir) / f"{run_id}.json"
+        self._data = data
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, user_input: str, journal_dir: str = RunJournalConfig.DIR) -> "RunJournal":
+        run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        now = time.time()
+        journal = cls(run_id, {
+            "run_id": run_id, "user_input": user_input, "status": "running",
+            "created_at": now, "updated_at": now, "resumed_at": [], "steps": {},
+        }, journal_dir)
+        journal._write()
+        return journal
+
+    @classmethod
+    def load(cls, run_id: str, journal_dir: str = RunJournalConfig.DIR) -> "RunJournal":
+        """Raises FileNotFoundError for an unknown run id"""
+        path = Path(journal_dir) / f"{run_id}.json"
+        with open(path, "r") as f:
+            data = json.load(f)
+        journal = cls(run_id, data, journal_dir)
+        with journal._lock:
+            journal._data["status"] = "running"
+            journal._data["resumed_at"].append(time.time())
+            journal._write()
+        return journal
+
+    @property
+    def user_input(self) -> str:
+        return self._data.get("user_input", "")
+
+    def completed_step(self, step_name: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """The journal entry of step_name if it completed from the same input, else None"""
+        with self._lock:
+            entry = self._data["steps"].get(step_name)
+        if entry and entry.get("status") == "complete" and entry.get("fingerprint") == fingerprint:
+            return entry
+        return None
+
+    def record_step(self, step_name: str, fingerprint: str, status: str, outputs: Dict[str, Any],
+                    context_data: Dict[str, Any], started_at: float):
+        with self._lock:
+            self._data["steps"][step_name] = {
+                "status": status, "fingerprint": fingerprint,
+                "started_at": started_at, "finished_at": time.time(),
+                "outputs": outputs, "context": context_data,
+            }
+            self._write()
+
+    def finish(self, status: str):
+        with self._lock:
+            self._data["status"] = status
+            self._write()
+
+    def summary(self) -> List[str]:
+        with self._lock:
+            return [f"{name}: {entry.get('status')}" for name, entry in self._data["steps"].items()]
+
+    def _write(self):
+        """Atomic rewrite of the journal file (caller holds the lock, or the journal is not shared yet)"""
+        self._data["updated_at"] = time.time()
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".json.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(self._data, f, indent=2, default=str)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning(f"Could not write run journal {self.path}: {e}")
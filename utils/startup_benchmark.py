@@ -0,0 +1,112 @@
+"""
+Startup benchmark for the entry point, based on `python -X importtime`.
+
+Imports a module in fresh interpreters, reports the import time and the slowest imports,
+and fails when startup exceeds a budget or pulls in modules that should load on first use.
+
+Usage:
+    python -m utils.startup_benchmark                    # import main, 5 runs
+    python -m utils.startup_benchmark --budget-ms 400 --top 15
+    python -m utils.startup_benchmark --module utils.job_queue --json
+"""
+import re
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from typing import Dict, Any, List, Tuple
+
+# Modules `import main` must not load; they are imported with the first agent, prompt or LLM call
+DEFAULT_FORBIDDEN = ("numpy", "requests", "httpx", "agents.base_agent", "prompts.general_prompts", "crews")
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)\s*$")
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """(module, self_us, cumulative_us, depth) for each line of -X importtime output"""
+    entries = []
+    for line in stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return entries
+
+
+def measure(module: str, cwd: str = ".") -> List[Tuple[str, int, int, int]]:
+    """Imports module in a fresh interpreter and returns its import timings"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        tail = "\n".join(line for line in proc.stderr.splitlines() if not line.startswith("import time:"))
+        raise RuntimeError(f"import {module} failed:\n{tail[-2000:]}")
+    return parse_importtime(proc.stderr)
+
+
+def run_benchmark(module: str = "main", runs: int = 5, top: int = 10,
+                  forbidden: Tuple[str, ...] = DEFAULT_FORBIDDEN, cwd: str = ".") -> Dict[str, Any]:
+    totals_ms = []
+    cumulative: Dict[str, List[int]] = {}
+    loaded = set()
+    for _ in range(max(1, runs)):
+        entries = measure(module, cwd)
+        # Top-level entries (depth 0) cover everything imported, nested imports included
+        totals_ms.append(sum(cum for _, _, cum, depth in entries if depth == 0) / 1000)
+        for name, _, cum, _ in entries:
+            cumulative.setdefault(name, []).append(cum)
+            loaded.add(name)
+    slowest = sorted(((name, statistics.median(values) / 1000) for name, values in cumulative.items()),
+                     key=lambda item: item[1], reverse=True)
+    return {
+        "module": module,
+        "runs": len(totals_ms),
+        "median_ms": round(statistics.median(totals_ms), 1),
+        "min_ms": round(min(totals_ms), 1),
+        "modules_loaded": len(loaded),
+        "slowest": [{"module": name, "cumulative_ms": round(ms, 1)} for name, ms in slowest[:top]],
+        "forbidden_loaded": sorted(name for name in loaded
+                                   if any(name == f or name.startswith(f + ".") for f in forbidden)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure how long importing the entry point takes")
+    parser.add_argument("--module", default="main", help="Module to import (default: main)")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to time; the median is reported")
+    parser.add_argument("--top", type=int, default=10, help="Slowest imports to list")
+    parser.add_argument("--budget-ms", type=float, help="Fail when the median import time exceeds this")
+    parser.add_argument("--forbid", default=",".join(DEFAULT_FORBIDDEN),
+                        help="Comma-separated modules that must not be imported at startup ('' to allow all)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    forbidden = tuple(m.strip() for m in args.forbid.split(",") if m.strip())
+    try:
+        report = run_benchmark(args.module, args.runs, args.top, forbidden)
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        sys.exit(2)
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"import {report['module']}: median {report['median_ms']} ms, min {report['min_ms']} ms "
+              f"over {report['runs']} runs, {report['modules_loaded']} modules")
+        for entry in report["slowest"]:
+            print(f"  {entry['cumulative_ms']:>9.1f} ms  {entry['module']}")
+
+    failures = []
+    if report["forbidden_loaded"]:
+        failures.append(f"loaded at startup: {', '.join(report['forbidden_loaded'])}")
+    if args.budget_ms is not None and report["median_ms"] > args.budget_ms:
+        failures.append(f"median {report['median_ms']} ms is over the {args.budget_ms} ms budget")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+import json
+from typing import Optional, Iterable, Iterator, Dict, Any
+
+
+class IncrementalResponseParser:
+    """Watches streamed model text for the structured payload the prompts ask for.
+
+    Recognises a fenced ```json block, or a JSON object/array following "Final Answer:".
+    feed() returns True as soon as that payload is complete, so the caller can stop reading."""
+    JSON_FENCE = "```json"
+    FENCE = "```"
+    FINAL_ANSWER_MARKER = "Final Answer:"
+
+    def __init__(self):
+        self._text = ""
+        self.payload: Optional[str] = None
+        self.kind: Optional[str] = None # "json_block" or "final_answer"
+        self.end_index: Optional[int] = None # Index just past the payload in text
+        self._fence_start = -1
+        self._scanned_upto = 0
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    @property
+    def complete(self) -> bool:
+        return self.payload is not None
+
+    def feed(self, chunk: str) -> bool:
+        if not chunk or self.complete:
+            return self.complete
+        self._text += chunk
+        self._scan()
+        return self.complete
+
+    def _scan(self):
+        text = self._text
+        if self._fence_start == -1:
+            # Re-check a few characters back in case the fence was split across chunks
+            self._fence_start = text.find(self.JSON_FENCE, max(0, self._scanned_upto - len(self.JSON_FENCE)))
+        if self._fence_start != -1:
+            body_start = self._fence_start + len(self.JSON_FENCE)
+            close = text.find(self.FENCE, max(body_start, self._scanned_upto - len(self.FENCE)))
+            if close != -1:
+                self.payload = text[body_start:close].strip()
+                self.kind = "json_block"
+                self.end_index = close + len(self.FENCE)
+            self._scanned_upto = len(text)
+            return
+
+        self._scanned_upto = len(text)
+        marker = text.rfind(self.FINAL_ANSWER_MARKER)
+        if marker == -1:
+            return
+        end = self._balanced_json_end(text, marker + len(self.FINAL_ANSWER_MARKER))
+        if end is not None:
+            start = marker + len(self.FINAL_ANSWER_MARKER)
+            self.payload = text[start:end].strip()
+            self.kind = "final_answer"
+            self.end_index = end
+
+    @staticmethod
+    def _balanced_json_end(text: str, start: int) -> Optional[int]:
+        """Index just past the JSON value starting at text[start:] (after whitespace), or None
+        if it has not closed yet or does not look like an object/array."""
+        i = start
+        while i < len(text) and text[i].isspace():
+            i += 1
+        if i >= len(text) or text[i] not in "{[":
+            return None
+        depth = 0
+        in_string = False
+        escaped = False
+        for j in range(i, len(text)):
+            ch = text[j]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif ch == "\\":
+                    escaped = True
+                elif ch == '"':
+                    in_string = False
+                continue
+            if ch == '"':
+                in_string = True
+            elif ch in "{[":
+                depth += 1
+            elif ch in "}]":
+                depth -= 1
+                if depth == 0:
+                    return j + 1
+        return None
+
+    def result_text(self) -> str:
+        """Text to hand to the agent's _parse_response: everything up to the end of the payload"""
+        if self.end_index is not None:
+            return self._text[:self.end_index]
+        return self._text
+
+
+def iter_sse_json(lines: Iterable) -> Iterator[Dict[str, Any]]:
+    """Decode JSON events from an SSE ("data: {...}") or newline-delimited JSON stream"""
+    for raw_line in lines:
+        if not raw_line:
+            continue
+        line = raw_line.decode("utf-8") if isinstance(raw_line, bytes) else raw_line
+        line = line.strip()
+        if line.startswith("data:"):
+            line = line[len("data:"):].strip()
+        if not line or line == "[DONE]" or line.startswith(":"):
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            continue
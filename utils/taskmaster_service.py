@@ -0,0 +1,281 @@
+"""
+Long-running TaskMaster service with a local HTTP API.
+
+Builds a pool of TaskMaster instances and all of their agents once at startup and keeps them
+warm; submitted requirements are queued (utils/job_queue.py) and run by the pool, each job in
+its own work directory.
+
+Serves:
+  POST /jobs                 {"requirements": "..."} -> 202 {"job_id": ..., "status": "queued"}
+  GET  /jobs                 recent jobs (?status=running)
+  GET  /jobs/<id>            job status and result summary
+  GET  /jobs/<id>/events     per-agent progress as server-sent events until the job ends (?since=<seq>)
+  GET  /jobs/<id>/output     the job's ProjectContext snapshot
+  GET  /health               workers and queue depth
+
+Run with:
+  python -m utils.taskmaster_service --port 8090 --workers 2
+"""
+import os
+import json
+import time
+import argparse
+import logging
+import threading
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs
+from typing import Optional, Dict, Any, List, Tuple
+
+from utils.job_queue import JobQueueConfig, get_job_queue, run_job, worker_id
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceConfig:
+    """Settings for the TaskMaster service"""
+    HOST = os.getenv("QREWS_SERVICE_HOST", "127.0.0.1")
+    PORT = int(os.getenv("QREWS_SERVICE_PORT", "8090"))
+    WORKERS = int(os.getenv("QREWS_SERVICE_WORKERS", "2"))
+    # Progress events are kept in memory for this many most recent jobs
+    EVENT_HISTORY_JOBS = int(os.getenv("QREWS_SERVICE_EVENT_HISTORY", "200"))
+
+
+class ProgressEvents:
+    """In-memory progress events per job, with blocking reads for streaming"""
+    def __init__(self, max_jobs: int = ServiceConfig.EVENT_HISTORY_JOBS):
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._cond = threading.Condition()
+
+    def _job(self, job_id: str) -> Dict[str, Any]:
+        entry = self._jobs.get(job_id)
+        if entry is None:
+            entry = self._jobs[job_id] = {"events": [], "done": False}
+            while len(self._jobs) > self.max_jobs:
+                self._jobs.popitem(last=False)
+        return entry
+
+    def publish(self, job_id: str, event: Dict[str, Any]):
+        with self._cond:
+            entry = self._job(job_id)
+            entry["events"].append({"seq": len(entry["events"]), **event})
+            self._cond.notify_all()
+
+    def close(self, job_id: str):
+        with self._cond:
+            self._job(job_id)["done"] = True
+            self._cond.notify_all()
+
+    def wait(self, job_id: str, since: int, timeout: float) -> Tuple[List[Dict[str, Any]], bool]:
+        """Events with seq >= since, waiting up to timeout for new ones; also whether the job's stream has ended"""
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                entry = self._jobs.get(job_id, {"events": [], "done": False})
+                if len(entry["events"]) > since or entry["done"]:
+                    return entry["events"][since:], entry["done"]
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return [], False
+                self._cond.wait(remaining)
+
+
+class TaskMasterService:
+    """A pool of warm TaskMaster instances working through the job queue on background threads"""
+    def __init__(self, workers: int = ServiceConfig.WORKERS, poll_interval: float = JobQueueConfig.POLL_INTERVAL):
+        from main import TaskMaster # Imported here so that importing this module doesn't build agents
+
+        self.queue = get_job_queue()
+        self.events = ProgressEvents()
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._active: Dict[str, Optional[str]] = {}
+        started = time.time()
+        self.taskmasters = [TaskMaster() for _ in range(max(1, workers))]
+        for taskmaster in self.taskmasters:
+            # TaskMaster builds agents on first use; build them now so the first job doesn't pay for it
+            taskmaster.agents.build_all()
+        logger.info(f"Warmed up {len(self.taskmasters)} TaskMaster instance(s) with {len(self.taskmasters[0].agents)} agents each "
+                    f"in {time.time() - started:.1f}s")
+        self._threads = [
+            threading.Thread(target=self._worker, args=(f"service-{i}", taskmaster), name=f"taskmaster-{i}", daemon=True)
+            for i, taskmaster in enumerate(self.taskmasters)
+        ]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        for taskmaster in self.taskmasters:
+            taskmaster.cleanup()
+        self.queue.close()
+
+    def submit(self, requirements: str) -> str:
+        job_id = self.queue.submit(requirements)
+        self.events.publish(job_id, {"event": "queued", "time": time.time()})
+        self._wake.set()
+        return job_id
+
+    def health(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self.taskmasters),
+            "busy": sum(1 for job_id in self._active.values() if job_id),
+            "queued": len(self.queue.list_jobs("queued")),
+        }
+
+    def _worker(self, name: str, taskmaster):
+        while not self._stop.is_set():
+            job = self.queue.claim(worker_id(name))
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            job_id = job["job_id"]
+            self._active[name] = job_id
+            taskmaster.event_listener = lambda event, job_id=job_id: self.events.publish(job_id, event)
+            try:
+                run_job(taskmaster, self.queue, job)
+            finally:
+                taskmaster.event_listener = None
+                self._active[name] = None
+                finished = self.queue.get(job_id) or {}
+                self.events.publish(job_id, {"event": "job_finished", "time": time.time(),
+                                             "status": finished.get("status"), "error": finished.get("error")})
+                self.events.close(job_id)
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    service: TaskMasterService = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    # --- plumbing ---
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b"{}"
+        try:
+            return json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            return {}
+
+    def _send_json(self, status: int, payload: Any):
+        body = json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _write_chunk(self, data: str):
+        raw = data.encode("utf-8")
+        self.wfile.write(f"{len(raw):X}\r\n".encode("ascii") + raw + b"\r\n")
+        self.wfile.flush()
+
+    # --- routes ---
+
+    def do_POST(self):
+        if urlsplit(self.path).path.rstrip("/") != "/jobs":
+            self._send_json(404, {"error": "Not found"})
+            return
+        requirements = str(self._read_json().get("requirements") or "").strip()
+        if not requirements:
+            self._send_json(400, {"error": "Body must be JSON with a non-empty 'requirements' string"})
+            return
+        self._send_json(202, {"job_id": self.service.submit(requirements), "status": "queued"})
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = parse_qs(parts.query)
+        segments = [s for s in parts.path.split("/") if s]
+        if segments == ["health"]:
+            self._send_json(200, self.service.health())
+        elif segments == ["jobs"]:
+            self._send_json(200, self.service.queue.list_jobs(query.get("status", [None])[0]))
+        elif len(segments) in (2, 3) and segments[0] == "jobs":
+            job = self.service.queue.get(segments[1])
+            if job is None:
+                self._send_json(404, {"error": f"No job {segments[1]}"})
+            elif len(segments) == 2:
+                self._send_json(200, job)
+            elif segments[2] == "events":
+                self._stream_events(job, int(query.get("since", ["0"])[0]))
+            elif segments[2] == "output":
+                self._send_output(job)
+            else:
+                self._send_json(404, {"error": "Not found"})
+        else:
+            self._send_json(404, {"error": "Not found"})
+
+    def _stream_events(self, job: Dict[str, Any], since: int):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        if job["status"] in ("completed", "error") and not self.service.events.wait(job["job_id"], since, 0)[0]:
+            # Finished before this service instance started (or its events were evicted): report the outcome only
+            self._write_chunk(f"data: {json.dumps({'event': 'job_finished', 'status': job['status'], 'error': job.get('error')})}\n\n")
+        else:
+            while True:
+                events, done = self.service.events.wait(job["job_id"], since, timeout=15)
+                if not events and not done:
+                    self._write_chunk(": keep-alive\n\n")
+                    continue
+                for event in events:
+                    self._write_chunk(f"id: {event['seq']}\ndata: {json.dumps(event, default=str)}\n\n")
+                since += len(events)
+                if done:
+                    break
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _send_output(self, job: Dict[str, Any]):
+        output_file = (job.get("result") or {}).get("output_file")
+        if not output_file or not Path(output_file).exists():
+            self._send_json(404, {"error": f"No snapshot output for job {job['job_id']} (status: {job['status']})"})
+            return
+        with open(output_file, "r") as f:
+            self._send_json(200, json.load(f))
+
+
+def make_server(service: TaskMasterService, host: str = ServiceConfig.HOST, port: int = ServiceConfig.PORT) -> ThreadingHTTPServer:
+    handler = type("BoundServiceHandler", (ServiceHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run TaskMaster as a service with a local HTTP API")
+    parser.add_argument("--host", default=ServiceConfig.HOST)
+    parser.add_argument("--port", type=int, default=ServiceConfig.PORT)
+    parser.add_argument("--workers", type=int, default=ServiceConfig.WORKERS, help="Warm TaskMaster instances (concurrent jobs)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s')
+    service = TaskMasterService(workers=args.workers)
+    service.start()
+    server = make_server(service, args.host, args.port)
+    print(f"TaskMaster service listening on http://{args.host}:{args.port} with {args.workers} worker(s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()